@@ -1,27 +1,152 @@
-from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
+import asyncio
+import threading
+from typing import AsyncIterator
 
-from ai.config import API_KEY
-from ai.tools import retrieve_from_knowledge_base
+from ai.config import API_KEY, OPENAI_BASE_URL
+from ai.metrics import get_callback_handler, span
 
-llm = ChatOpenAI(
-    model_name="gpt-4.1",
-    openai_api_key=API_KEY,
-    temperature=0,
+SYSTEM_PROMPT = (
+    "You are a helpful LLM agent that answers questions accurately and thoroughly. "
+    "You have access to a local knowledge base through the `retrieve_from_knowledge_base` tool. "
+    "Read the tool's description carefully to understand when it would be useful. "
+    "Use the tool when the question requires specific information that might be stored "
+    "in the knowledge base. If the question is about general knowledge you already know, "
+    "or if you're confident in your answer without needing stored documents, you can "
+    "answer directly. Always prioritize accuracy - if you're unsure or the question "
+    "seems to require specific stored information, use the tool to search the knowledge base."
 )
 
-kb_agent = create_agent(
-    model=llm,
-    tools=[retrieve_from_knowledge_base],
-    system_prompt=(
-        "You are a helpful LLM agent that answers questions accurately and thoroughly. "
-        "You have access to a local knowledge base through the `retrieve_from_knowledge_base` tool. "
-        "Read the tool's description carefully to understand when it would be useful. "
-        "Use the tool when the question requires specific information that might be stored "
-        "in the knowledge base. If the question is about general knowledge you already know, "
-        "or if you're confident in your answer without needing stored documents, you can "
-        "answer directly. Always prioritize accuracy - if you're unsure or the question "
-        "seems to require specific stored information, use the tool to search the knowledge base."
-    ),
+# The LLM client and agent graph are built on first use; importing LangChain is slow
+_llm = None
+_kb_agent = None
+_init_lock = threading.RLock()
+
+
+def get_llm():
+    """Return the chat model, creating it on first use."""
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+
+                _llm = ChatOpenAI(
+                    model_name="gpt-4.1",
+                    openai_api_key=API_KEY,
+                    openai_api_base=OPENAI_BASE_URL,
+                    temperature=0,
+                    # Report token usage for streamed responses too
+                    stream_usage=True,
+                )
+    return _llm
+
+
+def get_kb_agent():
+    """Return the knowledge base agent, building its graph on first use."""
+    global _kb_agent
+    if _kb_agent is None:
+        with _init_lock:
+            if _kb_agent is None:
+                from langchain.agents import create_agent
+
+                from ai.tools import retrieve_from_knowledge_base
+
+                _kb_agent = create_agent(
+                    model=get_llm(),
+                    tools=[retrieve_from_knowledge_base],
+                    system_prompt=SYSTEM_PROMPT,
+                )
+    return _kb_agent
+
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the existing summary with the new messages. Keep facts, names, numbers, "
+    "decisions and open questions the assistant may need later; drop pleasantries. "
+    "Reply with the updated summary only, in at most 300 words."
 )
 
+
+async def asummarize_conversation(previous_summary: str, messages: list) -> str:
+    """Fold messages into a rolling conversation summary."""
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    with span("summarize"):
+        result = await get_llm().ainvoke(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {
+                    "role": "user",
+                    "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}",
+                },
+            ],
+            config={"callbacks": [get_callback_handler()]},
+        )
+    return result.content
+
+
+def usage_from_messages(messages: list) -> dict:
+    """Sum the token usage reported on AI messages of an agent run."""
+    usage = {"input_tokens": 0, "output_tokens": 0, "llm_calls": 0}
+    for message in messages:
+        metadata = getattr(message, "usage_metadata", None)
+        if metadata:
+            usage["input_tokens"] += metadata.get("input_tokens", 0)
+            usage["output_tokens"] += metadata.get("output_tokens", 0)
+            usage["llm_calls"] += 1
+    return usage
+
+
+# Human-readable status shown to the user while a tool runs
+TOOL_STATUS_MESSAGES = {
+    "retrieve_from_knowledge_base": "Searching knowledge base…",
+}
+
+
+def _chunk_text(chunk) -> str:
+    """Extract the text of a streamed message chunk (content may be a list of blocks)."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+    )
+
+
+async def astream_answer(messages: list) -> AsyncIterator[dict]:
+    """Run the KB agent and yield its progress as events.
+
+    Yields ``{"type": "token", "text": ...}`` for every generated token,
+    ``{"type": "tool_start" | "tool_end", "tool": ..., "message": ...}`` around tool calls,
+    and finally ``{"type": "answer", "text": ..., "usage": ...}`` with the complete reply.
+    """
+    reply_parts = []
+    outputs = []
+    # The first call builds the agent, or waits for warm-up to finish building it
+    agent = await asyncio.to_thread(get_kb_agent)
+    async for event in agent.astream_events(
+        {"messages": messages},
+        config={"callbacks": [get_callback_handler()]},
+        context={"user_role": "expert"},
+        version="v2",
+    ):
+        kind = event["event"]
+        if kind == "on_chat_model_start":
+            # Only the last model call produces the final reply
+            reply_parts = []
+        elif kind == "on_chat_model_stream":
+            text = _chunk_text(event["data"]["chunk"])
+            if text:
+                reply_parts.append(text)
+                yield {"type": "token", "text": text}
+        elif kind == "on_chat_model_end":
+            outputs.append(event["data"]["output"])
+        elif kind in ("on_tool_start", "on_tool_end"):
+            tool_name = event["name"]
+            yield {
+                "type": "tool_start" if kind == "on_tool_start" else "tool_end",
+                "tool": tool_name,
+                "message": TOOL_STATUS_MESSAGES.get(tool_name, f"Running {tool_name}…"),
+            }
+
+    yield {"type": "answer", "text": "".join(reply_parts), "usage": usage_from_messages(outputs)}
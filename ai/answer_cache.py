@@ -0,0 +1,148 @@
+"""Semantic cache of agent answers for near-duplicate questions.
+
+Questions are embedded with the same cached query embeddings the retrieval tool uses,
+and an answer is reused when a previous question was similar enough. Each answer
+records the documents its retrieval returned; when the knowledge base changes, only the
+answers built on a changed document are evicted, found through the registry's change
+log. A document added later does not evict answers that never retrieved it. Callers
+must only use the cache for questions that don't depend on conversation history.
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import AbstractSet, FrozenSet, List, Optional
+
+import numpy as np
+
+from ai.config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY
+from ai.vector_store import aembed_query_cached, get_kb_changes_since, get_kb_version
+
+
+class SemanticAnswerCache:
+    """LRU cache of answers looked up by similarity of question embeddings.
+
+    Vectors live in one preallocated matrix, so a lookup is a single matrix-vector
+    product. Entries are valid at the knowledge base version the cache last synced to;
+    syncing replays the change log since then and evicts the entries whose source
+    documents changed, or all of them if the log was pruned or a change names no
+    document. Lookups and stores read the registry, so call them off the event loop.
+    """
+
+    def __init__(self, max_entries: int, threshold: float):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._matrix = None                  # (max_entries, dim) unit vectors
+        self._used = np.zeros(max(max_entries, 0), dtype=bool)
+        self._answers: List[Optional[str]] = [None] * max(max_entries, 0)
+        self._sources: List[FrozenSet[str]] = [frozenset()] * max(max_entries, 0)
+        self._lru = OrderedDict()            # slot -> None, least recently used first
+        self._version: Optional[int] = None  # knowledge base version the entries are valid at
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        values = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(values)
+        return values / norm if norm else values
+
+    @staticmethod
+    def _changed_since(version: int) -> Optional[set]:
+        """Return the documents written after version, or None if any may have changed."""
+        changes = get_kb_changes_since(version)
+        if changes is None or any(doc_hash is None for _, doc_hash in changes):
+            return None
+        return {doc_hash for _, doc_hash in changes}
+
+    def _free(self, slot: int) -> None:
+        self._used[slot] = False
+        self._answers[slot] = None
+        self._sources[slot] = frozenset()
+        self._lru.pop(slot, None)
+
+    def _sync(self) -> None:
+        """Evict entries built on documents written since the last sync. Call with the lock held."""
+        version = get_kb_version()
+        if self._version is not None and version != self._version and self._lru:
+            changed = self._changed_since(self._version)
+            for slot in list(self._lru):
+                if changed is None or self._sources[slot] & changed:
+                    self._free(slot)
+        self._version = version
+
+    def get(self, vector: List[float]) -> Optional[str]:
+        """Return the answer of the most similar cached question, if it is similar enough."""
+        with self._lock:
+            self._sync()
+            if self._matrix is None or not self._lru:
+                self.misses += 1
+                return None
+            similarities = self._matrix @ self._unit(vector)
+            similarities[~self._used] = -np.inf
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < self.threshold:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return self._answers[slot]
+
+    def put(self, vector: List[float], answer: str, sources: AbstractSet[str], kb_version: int) -> None:
+        """Cache an answer produced against kb_version from the given source documents."""
+        if self.max_entries <= 0:
+            return
+        sources = frozenset(sources)
+        with self._lock:
+            self._sync()
+            if kb_version != self._version:
+                # A source may have changed while the answer was being generated
+                changed = self._changed_since(kb_version)
+                if changed is None or sources & changed:
+                    return
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            # Reuse a free slot, else the least recently used one
+            free = np.flatnonzero(~self._used)
+            slot = int(free[0]) if len(free) else next(iter(self._lru))
+            self._lru.pop(slot, None)
+
+            self._matrix[slot] = self._unit(vector)
+            self._used[slot] = True
+            self._answers[slot] = answer
+            self._sources[slot] = sources
+            self._lru[slot] = None
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current number of entries."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "similarity_threshold": self.threshold,
+        }
+
+
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_MAX_ENTRIES, threshold=ANSWER_CACHE_SIMILARITY)
+
+
+async def alookup_answer(question: str) -> Optional[str]:
+    """Return a cached answer for a question similar to this one, if any."""
+    vector = await aembed_query_cached(question)
+    # The lookup replays the knowledge base change log from SQLite; keep that off the event loop
+    return await asyncio.to_thread(answer_cache.get, vector)
+
+
+async def astore_answer(question: str, answer: str, sources: AbstractSet[str], kb_version: int) -> None:
+    """Cache an answer produced against the given knowledge base version from the given documents."""
+    vector = await aembed_query_cached(question)
+    await asyncio.to_thread(answer_cache.put, vector, answer, sources, kb_version)
+
+
+def get_answer_cache_stats() -> dict:
+    return answer_cache.stats()
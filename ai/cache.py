@@ -0,0 +1,215 @@
+"""Caches used by the vector store to avoid repeated embedding work."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, List, Optional
+
+# Keep well below SQLite's bound-parameter limit
+_SQL_BATCH = 500
+
+# Other processes sharing the cache file insert too; recount its entries at least this often
+_RECOUNT_SECONDS = 60
+
+
+def _batched(items: list, size: int = _SQL_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed cache of chunk embeddings.
+
+    Entries are keyed by a hash of the embedding model name and the chunk text, and
+    vectors are stored in SQLite as float32 blobs. Once the cache holds more than
+    ``max_entries`` vectors, the least recently used ones are evicted.
+
+    Several workers can share the file. The entry count is taken from the table; the
+    hit and miss counters only cover this process's lookups.
+    """
+
+    def __init__(self, path: Path, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._counted_at = 0.0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Wait for other threads' and workers' writes instead of failing with "database is locked"
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._count(conn)
+            self._conn = conn
+        return self._conn
+
+    def _count(self, conn: sqlite3.Connection) -> int:
+        self._entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._counted_at = time.monotonic()
+        return self._entries
+
+    @staticmethod
+    def _key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return the cached vector for each text, or None where it is not cached."""
+        if not self.enabled:
+            self.misses += len(texts)
+            return [None] * len(texts)
+
+        keys = [self._key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for batch in _batched(list(dict.fromkeys(keys))):
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                conn.commit()
+
+            vectors = []
+            for key in keys:
+                blob = found.get(key)
+                if blob is None:
+                    vectors.append(None)
+                    self.misses += 1
+                else:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    vectors.append(vector.tolist())
+                    self.hits += 1
+        return vectors
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]) -> None:
+        """Store vectors for texts and evict least recently used entries if over capacity."""
+        if not self.enabled or not texts:
+            return
+
+        now = time.time()
+        rows = [
+            (self._key(model, text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            conn = self._connection()
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._entries += conn.total_changes - before
+            # The running count misses other processes' inserts and evictions
+            if self._entries > self.max_entries or time.monotonic() - self._counted_at > _RECOUNT_SECONDS:
+                self._count(conn)
+
+            overflow = self._entries - self.max_entries
+            if overflow > 0:
+                # Evict a little extra so we don't run an eviction on every insert
+                evict = overflow + self.max_entries // 20
+                cursor = conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (evict,),
+                )
+                self._entries -= cursor.rowcount
+            conn.commit()
+
+    def stats(self) -> dict:
+        """Return this process's hit/miss counters and the number of vectors in the shared cache."""
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                entries = self._count(self._connection())
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "pid": os.getpid(),
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None if it is missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current number of entries."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+        }
+
@@ -0,0 +1,164 @@
+"""Post-retrieval compaction of chunks before they are sent to the LLM.
+
+Retrieved chunks are compacted in four steps:
+
+1. hits further than ``RETRIEVAL_MAX_DISTANCE`` from the query are dropped
+2. neighbouring chunks of the same document are merged, and the text they share
+   because of the splitter's overlap is kept once
+3. maximal marginal relevance picks up to ``RETRIEVAL_K`` blocks, preferring blocks
+   that add new terms over ones that repeat a picked block (token Jaccard similarity)
+4. the picked blocks are trimmed to ``RETRIEVAL_TOKEN_BUDGET`` tokens
+"""
+
+from typing import List, Optional
+
+from ai.config import RETRIEVAL_K, RETRIEVAL_MAX_DISTANCE, RETRIEVAL_MMR_LAMBDA, RETRIEVAL_TOKEN_BUDGET
+from ai.lexical import tokenize
+from ai.tokens import count_tokens, truncate_tokens
+
+# The splitter overlaps neighbouring chunks by up to chunk_overlap characters; allow
+# some slack because overlaps start and end on separator boundaries
+MAX_OVERLAP_CHARS = 400
+
+# Shorter suffix/prefix matches are more likely coincidence than overlap
+MIN_OVERLAP_CHARS = 20
+
+# A block cut by the token budget is only kept if this many tokens of it fit
+MIN_TRUNCATED_TOKENS = 50
+
+
+def _chunk_index(chunk_id: str) -> Optional[int]:
+    """Return the position of a chunk in its document, from its '<doc_hash>_<index>' ID."""
+    _, _, index = chunk_id.rpartition("_")
+    return int(index) if index.isdigit() else None
+
+
+def _overlap_length(previous: str, following: str) -> int:
+    """Return the length of the text following repeats from the end of previous.
+
+    That is the longest suffix of previous that following starts with, if it is made
+    of whole words (the splitter overlaps whole splits), otherwise 0.
+    """
+    for length in range(min(len(previous), len(following), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if (
+            previous.endswith(following[:length])
+            and (length == len(previous) or previous[-length - 1].isspace())
+            and (length == len(following) or following[length].isspace())
+        ):
+            return length
+    return 0
+
+
+def _merge_neighbours(chunks: List[dict]) -> List[dict]:
+    """Merge chunks that are consecutive in the same document, keeping the best rank.
+
+    Blocks are returned in the order of their best-ranked chunk. Merged blocks list
+    the IDs of their chunks in ``chunk_ids``.
+    """
+    positions = {}
+    for rank, chunk in enumerate(chunks):
+        index = _chunk_index(chunk["chunk_id"])
+        if index is not None:
+            positions[(chunk["source"], index)] = rank
+
+    blocks = []
+    merged = set()
+    for rank, chunk in enumerate(chunks):
+        if rank in merged:
+            continue
+        index = _chunk_index(chunk["chunk_id"])
+        if index is None:
+            blocks.append(dict(chunk, chunk_ids=[chunk["chunk_id"]]))
+            continue
+
+        # Extend the run in both directions through retrieved neighbours
+        first = index
+        while (chunk["source"], first - 1) in positions and positions[(chunk["source"], first - 1)] not in merged:
+            first -= 1
+        last = index
+        while (chunk["source"], last + 1) in positions and positions[(chunk["source"], last + 1)] not in merged:
+            last += 1
+
+        run = [chunks[positions[(chunk["source"], i)]] for i in range(first, last + 1)]
+        merged.update(positions[(chunk["source"], i)] for i in range(first, last + 1))
+
+        content = run[0]["content"]
+        for following in run[1:]:
+            overlap = _overlap_length(content, following["content"])
+            # Without overlap the chunks were most likely split at a paragraph break
+            content += following["content"][overlap:] if overlap else "\n\n" + following["content"]
+
+        scores = [c["score"] for c in run if c.get("score") is not None]
+        blocks.append(dict(
+            chunk,
+            chunk_id=run[0]["chunk_id"],
+            chunk_ids=[c["chunk_id"] for c in run],
+            content=content,
+            score=min(scores) if scores else None,
+        ))
+    return blocks
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _mmr(blocks: List[dict], k: int, lambda_mult: float) -> List[dict]:
+    """Pick k blocks by maximal marginal relevance.
+
+    Relevance comes from the retrieval rank, so it works the same for vector, lexical
+    and fused results; redundancy is the token Jaccard similarity to picked blocks.
+    """
+    if len(blocks) <= 1:
+        return blocks[:k]
+    terms = [set(tokenize(block["content"])) for block in blocks]
+    relevance = [1 - rank / len(blocks) for rank in range(len(blocks))]
+
+    picked = []
+    remaining = list(range(len(blocks)))
+    while remaining and len(picked) < k:
+        best = max(
+            remaining,
+            key=lambda i: lambda_mult * relevance[i]
+            - (1 - lambda_mult) * max((_jaccard(terms[i], terms[j]) for j in picked), default=0.0),
+        )
+        picked.append(best)
+        remaining.remove(best)
+    return [blocks[i] for i in picked]
+
+
+def _apply_budget(blocks: List[dict], token_budget: int) -> List[dict]:
+    """Keep blocks in order until token_budget is spent, truncating the one that overflows."""
+    kept = []
+    remaining = token_budget
+    for block in blocks:
+        tokens = count_tokens(block["content"])
+        if tokens <= remaining:
+            kept.append(block)
+            remaining -= tokens
+            continue
+        # Always return some context, even if the best block alone exceeds the budget
+        if remaining >= MIN_TRUNCATED_TOKENS or not kept:
+            kept.append(dict(block, content=truncate_tokens(block["content"], remaining), truncated=True))
+        break
+    return kept
+
+
+def compact(
+    chunks: List[dict],
+    k: int = RETRIEVAL_K,
+    max_distance: Optional[float] = RETRIEVAL_MAX_DISTANCE,
+    lambda_mult: float = RETRIEVAL_MMR_LAMBDA,
+    token_budget: Optional[int] = RETRIEVAL_TOKEN_BUDGET,
+) -> List[dict]:
+    """Compact search results (best first) into at most k blocks within token_budget tokens.
+
+    Lexical-only hits have no distance and are never dropped by max_distance. Pass None
+    as max_distance or token_budget to skip that step.
+    """
+    if max_distance is not None:
+        chunks = [chunk for chunk in chunks if chunk.get("score") is None or chunk["score"] <= max_distance]
+    blocks = _mmr(_merge_neighbours(chunks), k, lambda_mult)
+    if token_budget is not None:
+        blocks = _apply_budget(blocks, token_budget)
+    return blocks
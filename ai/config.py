@@ -6,3 +6,59 @@ load_dotenv()
 
 API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Base URL of an OpenAI-compatible API, e.g. a local stub server for load tests
+# (unset: the official OpenAI endpoint)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+
+# Chroma client/server mode, for running several API worker processes: start one server
+# with `python -m ai.vector_server` and set CHROMA_SERVER_HOST in every worker. Unset,
+# each process opens vector_db/ itself, which is only safe for a single process.
+CHROMA_SERVER_HOST = os.getenv("CHROMA_SERVER_HOST") or None
+CHROMA_SERVER_PORT = int(os.getenv("CHROMA_SERVER_PORT", "8001"))
+
+# Embedding provider: 'openai' (API) or 'local' (sentence-transformers on CPU, needs the
+# local-embeddings extra). EMBEDDING_MODEL defaults to the provider's default model.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL") or None
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+
+# Maximum number of chunk embeddings kept in the on-disk embedding cache (0 disables it)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# In-process LRU caches for query embeddings and top-k search results
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+
+# Embedding request packing for ingestion: at most this many chunks / characters per
+# API call, with up to EMBEDDING_CONCURRENCY calls in flight
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+EMBEDDING_BATCH_MAX_CHARS = int(os.getenv("EMBEDDING_BATCH_MAX_CHARS", "400000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+# Chunks per collection.add call and chunks buffered before embedding during ingestion
+CHROMA_WRITE_BATCH_SIZE = int(os.getenv("CHROMA_WRITE_BATCH_SIZE", "5000"))
+INGEST_WINDOW_CHUNKS = int(os.getenv("INGEST_WINDOW_CHUNKS", "4096"))
+
+# Retrieval mode used by the agent's knowledge base tool: 'vector', 'lexical', 'hybrid'
+# or 'auto' (lexical only when the query is an identifier with a clear match, else hybrid)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "auto")
+
+# Compaction of the tool's retrieved chunks (see ai/compaction.py): RETRIEVAL_CANDIDATES
+# chunks are searched and compacted into at most RETRIEVAL_K blocks. Hits with a cosine
+# distance above RETRIEVAL_MAX_DISTANCE are dropped; the useful value depends on the
+# embedding model, so there is no cutoff unless it is set. RETRIEVAL_MMR_LAMBDA trades
+# relevance (1.0) for diversity, and RETRIEVAL_TOKEN_BUDGET caps the tool output (0: no cap)
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+RETRIEVAL_MAX_DISTANCE = float(os.getenv("RETRIEVAL_MAX_DISTANCE", "") or "inf")
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1500")) or None
+
+# Emit one structured JSON log line per instrumented request (stage timings, tokens)
+METRICS_LOG_REQUESTS = os.getenv("METRICS_LOG_REQUESTS", "").lower() in ("1", "true", "yes")
+
+# Semantic answer cache: capacity and minimum cosine similarity for a question to match
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
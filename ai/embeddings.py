@@ -0,0 +1,77 @@
+"""Embedding providers for the vector store.
+
+``openai`` calls the OpenAI embeddings API. ``local`` runs a sentence-transformers
+model in-process on the CPU, so ingestion and queries need no network round trip
+and are not rate limited. The provider and model are chosen with EMBEDDING_PROVIDER
+and EMBEDDING_MODEL; the pair is recorded on the collection, because vectors from
+different models cannot be compared.
+"""
+
+import threading
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from ai.config import API_KEY, OPENAI_BASE_URL
+
+PROVIDERS = ("openai", "local")
+
+DEFAULT_MODELS = {
+    # The model OpenAIEmbeddings used before the provider was configurable
+    "openai": "text-embedding-ada-002",
+    "local": "sentence-transformers/all-MiniLM-L6-v2",
+}
+
+
+class EmbeddingModelMismatchError(RuntimeError):
+    """The collection was built with a different embedding model than the configured one."""
+
+
+def embedding_identity(provider: str, model: str) -> str:
+    """Return the identifier recorded on a collection for vectors from this provider and model."""
+    return f"{provider}/{model}"
+
+
+class LocalEmbeddings(Embeddings):
+    """In-process sentence-transformers embeddings, encoded in vectorized batches."""
+
+    def __init__(self, model: str, device: str = "cpu", batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_PROVIDER=local needs sentence-transformers: poetry install --extras local-embeddings"
+            ) from e
+
+        self.model = model
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model, device=device)
+        # The model already uses every core; concurrent encode calls only contend
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        with self._lock:
+            vectors = self._model.encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def create_embeddings(provider: str, model: str, device: str = "cpu", batch_size: int = 64) -> Embeddings:
+    """Create the embeddings client for a provider."""
+    if provider == "openai":
+        from ai.openai_embeddings import TiktokenTolerantOpenAIEmbeddings
+
+        return TiktokenTolerantOpenAIEmbeddings(model=model, openai_api_key=API_KEY, openai_api_base=OPENAI_BASE_URL)
+    if provider == "local":
+        return LocalEmbeddings(model, device=device, batch_size=batch_size)
+    raise ValueError(f"Unknown embedding provider '{provider}', expected one of {PROVIDERS}")
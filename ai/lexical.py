@@ -0,0 +1,106 @@
+"""In-process BM25 index over knowledge base chunks.
+
+Only term statistics are held in memory; chunk text stays in ChromaDB and is fetched
+by ID for the hits that are returned. Chunk IDs have the form ``{doc_hash}_{index}``,
+which lets a whole document be removed without a lookup table per chunk.
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# Words, numbers and identifiers such as ERR-4012, v2.3.1 or snake_case names
+_TOKEN_RE = re.compile(r"\w+(?:[-.]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.casefold() for token in _TOKEN_RE.findall(text)]
+
+
+def identifier_terms(text: str) -> List[str]:
+    """Return tokens that look like identifiers: codes, versions, names with digits or separators."""
+    return [
+        token.casefold()
+        for token in _TOKEN_RE.findall(text)
+        if any(c.isdigit() or c in "-._" for c in token) or (token.isupper() and len(token) > 1)
+    ]
+
+
+def _doc_hash_of(chunk_id: str) -> str:
+    return chunk_id.rsplit("_", 1)[0]
+
+
+class BM25Index:
+    """Incrementally maintained Okapi BM25 index."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}  # term -> {chunk_id: term frequency}
+        self._terms: Dict[str, Tuple[str, ...]] = {}     # chunk_id -> distinct terms
+        self._lengths: Dict[str, int] = {}               # chunk_id -> token count
+        self._by_doc: Dict[str, List[str]] = {}          # doc_hash -> chunk_ids
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, ids: Iterable[str], documents: Iterable[str]) -> None:
+        """Index chunks, replacing any chunk already indexed under the same ID."""
+        with self._lock:
+            for chunk_id, text in zip(ids, documents):
+                if chunk_id in self._lengths:
+                    self._remove_chunk(chunk_id)
+                counts = Counter(tokenize(text))
+                for term, frequency in counts.items():
+                    self._postings.setdefault(term, {})[chunk_id] = frequency
+                self._terms[chunk_id] = tuple(counts)
+                length = sum(counts.values())
+                self._lengths[chunk_id] = length
+                self._total_length += length
+                self._by_doc.setdefault(_doc_hash_of(chunk_id), []).append(chunk_id)
+
+    def _remove_chunk(self, chunk_id: str) -> None:
+        for term in self._terms.pop(chunk_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+
+    def remove_document(self, doc_hash: str) -> None:
+        """Remove all chunks of a document from the index."""
+        with self._lock:
+            for chunk_id in self._by_doc.pop(doc_hash, []):
+                self._remove_chunk(chunk_id)
+
+    def contains_all(self, chunk_id: str, terms: Iterable[str]) -> bool:
+        """Check whether a chunk contains every one of the given (tokenized) terms."""
+        with self._lock:
+            chunk_terms = self._terms.get(chunk_id, ())
+        return all(term in chunk_terms for term in terms)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Return up to k (chunk_id, score) pairs, best first."""
+        with self._lock:
+            total = len(self._lengths)
+            if total == 0:
+                return []
+            average_length = self._total_length / total
+
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
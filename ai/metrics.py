@@ -0,0 +1,202 @@
+"""Per-stage latency, token and tool-call metrics.
+
+Code wraps each stage of answering a question in ``span(stage)``. Every span is
+observed in the ``rag_stage_seconds`` Prometheus histogram and, when it runs inside
+``track_request``, also added to that request's breakdown. At the end of the request
+the totals go to the request histogram and, if ``METRICS_LOG_REQUESTS`` is set, to one
+structured JSON log line. LLM calls, token counts and tool calls are recorded by
+``MetricsCallbackHandler``, passed to the agent as a callback.
+
+prometheus_client is optional. Without it spans still feed the request log line, and
+``render_metrics`` reports that Prometheus export is unavailable.
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from uuid import UUID
+
+from ai.config import METRICS_LOG_REQUESTS
+
+try:
+    import prometheus_client
+except ImportError:  # optional dependency
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Stages range from sub-millisecond cache lookups to multi-second LLM calls
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+if prometheus_client is not None:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        "rag_stage_seconds", "Time spent in one stage of answering a request", ["stage"], buckets=_BUCKETS
+    )
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        "rag_request_seconds", "End-to-end time of instrumented requests", ["endpoint"], buckets=_BUCKETS
+    )
+    REQUESTS = prometheus_client.Counter(
+        "rag_requests_total", "Instrumented requests by outcome", ["endpoint", "outcome"]
+    )
+    LLM_CALLS = prometheus_client.Counter("rag_llm_calls_total", "Chat model calls")
+    LLM_TOKENS = prometheus_client.Counter("rag_llm_tokens_total", "Chat model tokens", ["kind"])
+    TOOL_CALLS = prometheus_client.Counter("rag_tool_calls_total", "Agent tool calls", ["tool"])
+
+
+class RequestMetrics:
+    """Stage timings and counters collected while handling one request."""
+
+    __slots__ = ("endpoint", "started", "stages", "llm_calls", "input_tokens", "output_tokens", "tool_calls", "fields")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.tool_calls = 0
+        self.fields: Dict[str, Any] = {}
+
+    def as_dict(self, seconds: float, outcome: str) -> dict:
+        return {
+            "event": "request",
+            "endpoint": self.endpoint,
+            "outcome": outcome,
+            "ms": round(seconds * 1000, 1),
+            "stages_ms": {stage: round(value * 1000, 1) for stage, value in self.stages.items()},
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "tool_calls": self.tool_calls,
+            **self.fields,
+        }
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("rag_request_metrics", default=None)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration measured by the caller."""
+    if prometheus_client is not None:
+        STAGE_SECONDS.labels(stage).observe(seconds)
+    request = _current.get()
+    if request is not None:
+        request.stages[stage] = request.stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block as one occurrence of a stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def annotate(**fields) -> None:
+    """Attach extra fields (e.g. chat_id, cached) to the current request's log line."""
+    request = _current.get()
+    if request is not None:
+        request.fields.update(fields)
+
+
+def record_llm_call(input_tokens: int, output_tokens: int) -> None:
+    if prometheus_client is not None:
+        LLM_CALLS.inc()
+        LLM_TOKENS.labels("input").inc(input_tokens)
+        LLM_TOKENS.labels("output").inc(output_tokens)
+    request = _current.get()
+    if request is not None:
+        request.llm_calls += 1
+        request.input_tokens += input_tokens
+        request.output_tokens += output_tokens
+
+
+def record_tool_call(tool: str) -> None:
+    if prometheus_client is not None:
+        TOOL_CALLS.labels(tool).inc()
+    request = _current.get()
+    if request is not None:
+        request.tool_calls += 1
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[RequestMetrics]:
+    """Collect the spans of the enclosed block as one request to endpoint."""
+    request = RequestMetrics(endpoint)
+    token = _current.set(request)
+    outcome = "error"
+    try:
+        yield request
+        outcome = "ok"
+    finally:
+        _current.reset(token)
+        seconds = time.perf_counter() - request.started
+        if prometheus_client is not None:
+            REQUEST_SECONDS.labels(endpoint).observe(seconds)
+            REQUESTS.labels(endpoint, outcome).inc()
+        if METRICS_LOG_REQUESTS:
+            logger.info(json.dumps(request.as_dict(seconds, outcome)))
+
+
+def render_metrics() -> Optional[tuple[bytes, str]]:
+    """Return the Prometheus exposition (body, content type), or None if unavailable."""
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+_callback_handler = None
+
+
+def get_callback_handler():
+    """Return a LangChain callback handler that records LLM calls, tokens and tool calls."""
+    global _callback_handler
+    if _callback_handler is None:
+        _callback_handler = _make_callback_handler()
+    return _callback_handler
+
+
+def _make_callback_handler():
+    # LangChain is imported here so that importing this module stays cheap
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class MetricsCallbackHandler(BaseCallbackHandler):
+        """Times chat model and tool runs by run ID and records their usage."""
+
+        # Run in the caller's thread and context, so spans reach the current request
+        run_inline = True
+
+        def __init__(self):
+            self._started: Dict[UUID, float] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+            self._started[run_id] = time.perf_counter()
+
+        def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs) -> None:
+            self._started[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                record_stage("llm", time.perf_counter() - started)
+            input_tokens = output_tokens = 0
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+            record_llm_call(input_tokens, output_tokens)
+
+        def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+            self._started.pop(run_id, None)
+
+        def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs) -> None:
+            record_tool_call((serialized or {}).get("name") or kwargs.get("name") or "unknown")
+
+    return MetricsCallbackHandler()
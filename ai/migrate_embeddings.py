@@ -0,0 +1,110 @@
+"""Re-embed the knowledge base collection with another embedding provider or model.
+
+Chunks are copied page by page into a new collection, embedded with the target model
+(reusing the on-disk embedding cache), and the new collection then replaces the old
+one. Chunk IDs, text and metadata are unchanged, so the document registry and the
+BM25 index stay valid. Stop the API server first: the vector store is opened by a
+single process at a time.
+
+    python -m ai.migrate_embeddings --provider local --model sentence-transformers/all-MiniLM-L6-v2
+
+Afterwards set EMBEDDING_PROVIDER and EMBEDDING_MODEL to the same values.
+"""
+
+import argparse
+import time
+
+from ai import vector_store
+from ai.config import EMBEDDING_DEVICE, LOCAL_EMBEDDING_BATCH_SIZE
+from ai.embeddings import DEFAULT_MODELS, PROVIDERS, create_embeddings, embedding_identity
+
+PAGE_SIZE = 2000
+
+
+def migrate(provider: str, model: str, keep_backup: bool = False) -> dict:
+    """Re-embed every chunk with provider/model and swap the new collection in."""
+    target_identity = embedding_identity(provider, model)
+    client = vector_store.get_chroma_client()
+    source = client.get_or_create_collection(vector_store.COLLECTION_NAME, metadata={"hnsw:space": "cosine"})
+    # Unlabelled collections predate the setting and were built with the OpenAI default
+    source_identity = (source.metadata or {}).get("embedding_model") or embedding_identity(
+        "openai", DEFAULT_MODELS["openai"]
+    )
+    if source_identity == target_identity:
+        return {"chunks": 0, "seconds": 0.0, "from": source_identity, "to": target_identity, "backup": None}
+
+    # A leftover from an interrupted run is discarded and rebuilt
+    staging_name = f"{vector_store.COLLECTION_NAME}_migrating"
+    if staging_name in [collection.name for collection in client.list_collections()]:
+        client.delete_collection(staging_name)
+    staging = client.create_collection(
+        staging_name, metadata={"hnsw:space": "cosine", "embedding_model": target_identity}
+    )
+
+    # _embed_chunks batches, parallelizes and caches through the module-level client
+    vector_store._embeddings = create_embeddings(
+        provider, model, device=EMBEDDING_DEVICE, batch_size=LOCAL_EMBEDDING_BATCH_SIZE
+    )
+    write_batch = min(PAGE_SIZE, client.get_max_batch_size())
+
+    started = time.perf_counter()
+    total = source.count()
+    offset = 0
+    while True:
+        page = source.get(include=["documents", "metadatas"], limit=PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            break
+        vectors = vector_store._embed_chunks(page["documents"])
+        for start in range(0, len(page["ids"]), write_batch):
+            end = start + write_batch
+            staging.add(
+                ids=page["ids"][start:end],
+                embeddings=vectors[start:end],
+                documents=page["documents"][start:end],
+                metadatas=page["metadatas"][start:end],
+            )
+        offset += len(page["ids"])
+        print(f"Re-embedded {offset}/{total} chunks")
+
+    if staging.count() != total:
+        raise RuntimeError(f"Copied {staging.count()} of {total} chunks; the original collection was left in place")
+
+    backup_name = f"{vector_store.COLLECTION_NAME}_backup_{int(time.time())}"
+    source.modify(name=backup_name)
+    staging.modify(name=vector_store.COLLECTION_NAME)
+    if not keep_backup:
+        client.delete_collection(backup_name)
+        backup_name = None
+
+    return {
+        "chunks": total,
+        "seconds": time.perf_counter() - started,
+        "from": source_identity,
+        "to": target_identity,
+        "backup": backup_name,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--provider", choices=PROVIDERS, required=True)
+    parser.add_argument("--model", help="defaults to the provider's default model")
+    parser.add_argument("--keep-backup", action="store_true", help="keep the old collection under a backup name")
+    args = parser.parse_args()
+
+    model = args.model or DEFAULT_MODELS[args.provider]
+    result = migrate(args.provider, model, keep_backup=args.keep_backup)
+    if result["from"] == result["to"]:
+        print(f"Collection already uses {result['to']}; nothing to do")
+        return
+    print(
+        f"Re-embedded {result['chunks']} chunks from {result['from']} "
+        f"to {result['to']} in {result['seconds']:.1f}s"
+    )
+    if result["backup"]:
+        print(f"Previous collection kept as '{result['backup']}'")
+    print(f"Now set EMBEDDING_PROVIDER={args.provider} EMBEDDING_MODEL={model}")
+
+
+if __name__ == "__main__":
+    main()
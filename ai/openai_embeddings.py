@@ -0,0 +1,33 @@
+"""OpenAI embeddings client that keeps working while tiktoken can't load its encoding.
+
+OpenAIEmbeddings tokenizes every input with tiktoken to split texts longer than the
+model's context. tiktoken downloads the encoding on first use, so offline every embedding
+call failed. While the encoding is unavailable, texts are split on approximate token
+counts (ai.tokens) and sent as raw text; the download is retried by ai.tokens.load_encoding.
+"""
+
+import tiktoken
+from langchain_openai import OpenAIEmbeddings
+
+from ai.tokens import APPROXIMATE_ENCODING, load_encoding
+
+
+class TiktokenTolerantOpenAIEmbeddings(OpenAIEmbeddings):
+    def _tokenize(self, texts, chunk_size):
+        model_name = self.tiktoken_model_name or self.model
+        try:
+            encoding_name = tiktoken.encoding_name_for_model(model_name)
+        except KeyError:
+            encoding_name = "cl100k_base"
+        if not self.tiktoken_enabled or load_encoding(encoding_name) is not None:
+            return super()._tokenize(texts, chunk_size)
+
+        tokens, indices, token_counts = [], [], []
+        for i, text in enumerate(texts):
+            pieces = APPROXIMATE_ENCODING.encode(text)
+            for j in range(0, len(pieces), self.embedding_ctx_length):
+                window = pieces[j:j + self.embedding_ctx_length]
+                tokens.append(APPROXIMATE_ENCODING.decode(window))
+                indices.append(i)
+                token_counts.append(len(window))
+        return range(0, len(tokens), chunk_size), tokens, indices, token_counts
@@ -0,0 +1,242 @@
+"""Document-level registry kept alongside the ChromaDB collection.
+
+The registry stores one row per document (hash, file name, chunk count, size and
+ingestion time), so listing documents and existence checks don't have to scan chunk
+metadata. Writes follow the vector store: a document is marked ``pending`` before its
+chunks are written and ``ready`` afterwards, and ``deleting`` before its chunks are
+removed. Rows left in ``pending`` or ``deleting`` by a crash are repaired on startup.
+
+Ready rows also record a fingerprint of the chunking and embedding configuration they
+were ingested with, so re-adding unchanged content can be skipped.
+
+Every completed write is appended to a ``changes`` log. Its latest entry is the
+knowledge base version, shared by all processes using the same directory, and
+processes that keep derived in-memory state (the BM25 index) replay the entries they
+have not seen yet.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, TypedDict
+
+# Columns that listings may be sorted by
+SORT_FIELDS = ("ingested_at", "file_name", "chunk_count", "size_bytes", "doc_hash")
+
+# Entries kept in the change log; a process further behind rebuilds its state instead
+CHANGE_LOG_RETAIN = 10000
+
+
+class DocumentRecord(TypedDict):
+    doc_hash: str
+    file_name: str
+    chunk_count: int
+    size_bytes: int
+    ingested_at: float
+
+
+class DocumentRegistry:
+    """SQLite-backed registry of documents in the vector store."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_hash TEXT PRIMARY KEY,
+                    file_name TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL DEFAULT 0,
+                    size_bytes INTEGER NOT NULL DEFAULT 0,
+                    ingested_at REAL NOT NULL,
+                    state TEXT NOT NULL,          -- 'pending', 'ready' or 'deleting'
+                    fingerprint TEXT              -- ingestion config of the chunks, NULL if unknown
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "fingerprint" not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN fingerprint TEXT")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS changes (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_hash TEXT                 -- NULL if any document may have changed
+                )
+                """
+            )
+            for field in SORT_FIELDS[:-1]:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_documents_{field} ON documents ({field})")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> DocumentRecord:
+        return DocumentRecord(
+            doc_hash=row["doc_hash"],
+            file_name=row["file_name"],
+            chunk_count=row["chunk_count"],
+            size_bytes=row["size_bytes"],
+            ingested_at=row["ingested_at"],
+        )
+
+    def get(self, doc_hash: str) -> Optional[DocumentRecord]:
+        """Return the record of a fully ingested document, or None."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT * FROM documents WHERE doc_hash = ? AND state = 'ready'", (doc_hash,)
+            ).fetchone()
+        return self._to_record(row) if row else None
+
+    def exists(self, doc_hash: str) -> bool:
+        return self.get(doc_hash) is not None
+
+    def is_current(self, doc_hash: str, fingerprint: str) -> bool:
+        """Check whether a document is ingested with the given configuration fingerprint."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT 1 FROM documents WHERE doc_hash = ? AND state = 'ready' AND fingerprint = ?",
+                (doc_hash, fingerprint),
+            ).fetchone()
+        return row is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM documents WHERE state = 'ready'"
+            ).fetchone()[0]
+
+    def list(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort_by: str = "ingested_at",
+        descending: bool = True,
+    ) -> List[DocumentRecord]:
+        """Return a page of ready documents ordered by sort_by."""
+        if sort_by not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort documents by '{sort_by}', expected one of {SORT_FIELDS}")
+        direction = "DESC" if descending else "ASC"
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT * FROM documents WHERE state = 'ready' "
+                f"ORDER BY {sort_by} {direction}, doc_hash {direction} LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def mark_pending(self, documents: Iterable[Tuple[str, str, int]]) -> None:
+        """Record (doc_hash, file_name, size_bytes) documents whose chunks are about to be written."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                """
+                INSERT INTO documents (doc_hash, file_name, size_bytes, ingested_at, state)
+                VALUES (?, ?, ?, ?, 'pending')
+                ON CONFLICT (doc_hash) DO UPDATE SET
+                    file_name = excluded.file_name,
+                    size_bytes = excluded.size_bytes,
+                    state = 'pending'
+                """,
+                [(doc_hash, file_name, size, now) for doc_hash, file_name, size in documents],
+            )
+            conn.commit()
+
+    def mark_ready(self, chunk_counts: Iterable[Tuple[str, int]], fingerprint: Optional[str] = None) -> None:
+        """Mark documents as ingested with their (doc_hash, chunk_count) and configuration fingerprint."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE documents SET state = 'ready', chunk_count = ?, ingested_at = ?, fingerprint = ? "
+                "WHERE doc_hash = ?",
+                [(count, now, fingerprint, doc_hash) for doc_hash, count in chunk_counts],
+            )
+            conn.commit()
+
+    def mark_deleting(self, doc_hash: str) -> Optional[DocumentRecord]:
+        """Flag a ready document for deletion and return its record, or None if it doesn't exist."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT * FROM documents WHERE doc_hash = ? AND state = 'ready'", (doc_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE documents SET state = 'deleting' WHERE doc_hash = ?", (doc_hash,))
+            conn.commit()
+        return self._to_record(row)
+
+    def remove(self, doc_hash: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+            conn.commit()
+
+    def unfinished(self) -> List[str]:
+        """Return hashes of documents left mid-write or mid-delete."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT doc_hash FROM documents WHERE state != 'ready'"
+            ).fetchall()
+        return [row["doc_hash"] for row in rows]
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM documents LIMIT 1").fetchone() is None
+
+    def record_changes(self, doc_hashes: Iterable[Optional[str]]) -> int:
+        """Log completed writes of the given documents (None: unknown) and return the new version."""
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT INTO changes (doc_hash) VALUES (?)", [(h,) for h in doc_hashes])
+            version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM changes").fetchone()[0]
+            conn.execute("DELETE FROM changes WHERE version <= ?", (version - CHANGE_LOG_RETAIN,))
+            conn.commit()
+        return version
+
+    def get_version(self) -> int:
+        """Return the version of the latest logged change, 0 if there is none."""
+        with self._lock:
+            return self._connection().execute("SELECT COALESCE(MAX(version), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, version: int) -> Optional[List[Tuple[int, Optional[str]]]]:
+        """Return the (version, doc_hash) changes after version, oldest first.
+
+        Returns None if some of them were already pruned from the log.
+        """
+        with self._lock:
+            conn = self._connection()
+            oldest = conn.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+            rows = conn.execute(
+                "SELECT version, doc_hash FROM changes WHERE version > ? ORDER BY version", (version,)
+            ).fetchall()
+        if rows and oldest > version + 1:
+            return None
+        return [(row["version"], row["doc_hash"]) for row in rows]
+
+    def rebuild(self, records: Iterable[DocumentRecord]) -> None:
+        """Replace the registry contents with records derived from the collection."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM documents")
+            conn.executemany(
+                "INSERT INTO documents (doc_hash, file_name, chunk_count, size_bytes, ingested_at, state) "
+                "VALUES (?, ?, ?, ?, ?, 'ready')",
+                [
+                    (r["doc_hash"], r["file_name"], r["chunk_count"], r["size_bytes"], r["ingested_at"])
+                    for r in records
+                ],
+            )
+            conn.commit()
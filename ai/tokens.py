@@ -0,0 +1,83 @@
+"""Token counting with the tokenizer of the chat model.
+
+tiktoken downloads its encodings on first use and caches them under ``TIKTOKEN_CACHE_DIR``.
+While an encoding can't be loaded (no network and no cached copy), counts fall back to
+an approximation of about four characters per token and the download is retried every
+``TIKTOKEN_RETRY_SECONDS``, so a transient failure does not skew budgets for the life
+of the process.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+CHAT_ENCODING = "o200k_base"
+
+TIKTOKEN_RETRY_SECONDS = float(os.getenv("TIKTOKEN_RETRY_SECONDS", "60"))
+
+# Runs of up to four non-space characters, each with its leading whitespace
+_APPROXIMATE_TOKEN_PATTERN = re.compile(r"\s*\S{1,4}|\s+")
+
+
+class ApproximateEncoding:
+    """Stand-in for a tiktoken encoding whose tokens are short slices of the text."""
+
+    def encode(self, text: str, disallowed_special=()) -> List[str]:
+        return _APPROXIMATE_TOKEN_PATTERN.findall(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+APPROXIMATE_ENCODING = ApproximateEncoding()
+
+_load_lock = threading.Lock()
+_encodings: Dict[str, tiktoken.Encoding] = {}
+# Encoding name -> monotonic time before which a failed load is not retried
+_retry_at: Dict[str, float] = {}
+
+
+def load_encoding(name: str) -> Optional[tiktoken.Encoding]:
+    """Return the tiktoken encoding, or None while it can't be loaded.
+
+    A failed load is logged and retried once TIKTOKEN_RETRY_SECONDS have passed.
+    """
+    encoding = _encodings.get(name)
+    if encoding is not None:
+        return encoding
+    with _load_lock:
+        if name not in _encodings and time.monotonic() >= _retry_at.get(name, 0.0):
+            try:
+                _encodings[name] = tiktoken.get_encoding(name)
+                _retry_at.pop(name, None)
+            except Exception as e:
+                _retry_at[name] = time.monotonic() + TIKTOKEN_RETRY_SECONDS
+                logger.warning(
+                    "Could not load the %s encoding, approximating token counts for %ss: %s",
+                    name, TIKTOKEN_RETRY_SECONDS, e,
+                )
+        return _encodings.get(name)
+
+
+def _encoding():
+    return load_encoding(CHAT_ENCODING) or APPROXIMATE_ENCODING
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest prefix of text that is at most max_tokens tokens long."""
+    encoding = _encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(max_tokens, 0)])
@@ -1,9 +1,22 @@
-from langchain_core.tools import tool
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Set
 
-from ai.vector_store import search
+from langchain_core.tools import StructuredTool
 
+from ai.compaction import compact
+from ai.config import RETRIEVAL_CANDIDATES, RETRIEVAL_K, SEARCH_MODE
+from ai.metrics import annotate, span
+from ai.tokens import count_tokens
+from ai.vector_store import asearch, search
 
-@tool(description=(
+logger = logging.getLogger(__name__)
+
+# Documents retrieved by the tool in the current request, if collect_retrieved_sources is active
+_retrieved_sources: ContextVar[Optional[Set[str]]] = ContextVar("retrieved_sources", default=None)
+
+RETRIEVE_DESCRIPTION = (
     "Search the local knowledge base for information relevant to a question. "
     "Use this tool when you need to find specific information that might be stored "
     "in the knowledge base, such as facts, details, or context about topics that "
@@ -12,11 +25,10 @@ from ai.vector_store import search
     "that you already know well, or if it's a simple question that doesn't require "
     "specific stored information, you may not need to use this tool. "
     "Input: the user's question or a search query related to what information is needed."
-))
-def retrieve_from_knowledge_base(question: str) -> str:
-    """Retrieve relevant documents from the knowledge base using semantic search."""
-    results = search(query=question, k=5)
-    
+)
+
+
+def _format_results(results: List[dict]) -> str:
     if not results:
         return "No relevant information found in the knowledge base. The knowledge base may be empty or the question doesn't match any stored content."
     
@@ -30,3 +42,58 @@ def retrieve_from_knowledge_base(question: str) -> str:
     
     return "\n\n---\n\n".join(formatted_results)
 
+
+@contextmanager
+def collect_retrieved_sources() -> Iterator[Set[str]]:
+    """Collect the doc hashes of every chunk the tool retrieves within the enclosed block."""
+    sources: Set[str] = set()
+    token = _retrieved_sources.set(sources)
+    try:
+        yield sources
+    finally:
+        _retrieved_sources.reset(token)
+
+
+def _compacted_output(results: List[dict]) -> str:
+    """Compact retrieved chunks and format them, logging the output size before and after.
+
+    "Before" is what the tool returned without compaction: the top RETRIEVAL_K chunks,
+    not all RETRIEVAL_CANDIDATES searched for compaction.
+    """
+    sources = _retrieved_sources.get()
+    if sources is not None:
+        sources.update(chunk["source"] for chunk in results if chunk.get("source"))
+    with span("compact"):
+        blocks = compact(results)
+        output = _format_results(blocks)
+    baseline = results[:RETRIEVAL_K]
+    before_tokens = count_tokens(_format_results(baseline))
+    after_tokens = count_tokens(output)
+    logger.info(
+        "Retrieval compacted to %d blocks (%d tokens) from %d candidates; "
+        "the top %d chunks uncompacted would be %d tokens",
+        len(blocks), after_tokens, len(results), len(baseline), before_tokens,
+    )
+    annotate(retrieval_tokens_before=before_tokens, retrieval_tokens_after=after_tokens)
+    return output
+
+
+def _retrieve(question: str) -> str:
+    """Retrieve relevant documents from the knowledge base using semantic search."""
+    with span("retrieve"):
+        return _compacted_output(search(query=question, k=RETRIEVAL_CANDIDATES, mode=SEARCH_MODE))
+
+
+async def _aretrieve(question: str) -> str:
+    """Retrieve relevant documents without blocking the event loop."""
+    with span("retrieve"):
+        return _compacted_output(await asearch(query=question, k=RETRIEVAL_CANDIDATES, mode=SEARCH_MODE))
+
+
+# Both implementations are registered so the agent works with invoke() and ainvoke()
+retrieve_from_knowledge_base = StructuredTool.from_function(
+    func=_retrieve,
+    coroutine=_aretrieve,
+    name="retrieve_from_knowledge_base",
+    description=RETRIEVE_DESCRIPTION,
+)
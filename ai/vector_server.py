@@ -0,0 +1,41 @@
+"""Run the Chroma server that API worker processes share in multi-process deployments.
+
+The server is the only process that opens the collection on disk: it serializes writes
+and serves reads concurrently, so backend.app can run with several workers without
+each one holding and writing its own copy of the index. It serves the same directory
+the embedded client uses, so existing data is picked up as is.
+
+    python -m ai.vector_server
+    CHROMA_SERVER_HOST=127.0.0.1 uvicorn backend.app:app --workers 4
+
+The registry, embedding cache and manifest next to the collection stay plain SQLite
+and JSON files that the workers open directly, so the server and the workers must
+share VECTOR_DB_DIR (run them on one host).
+"""
+
+import argparse
+
+from ai.config import CHROMA_SERVER_HOST, CHROMA_SERVER_PORT
+from ai.vector_store import VECTOR_DB_DIR
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=CHROMA_SERVER_HOST or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=CHROMA_SERVER_PORT)
+    parser.add_argument("--path", default=str(VECTOR_DB_DIR), help="persistence directory")
+    args = parser.parse_args()
+
+    # The entry point of the `chroma run` command
+    import chromadb_rust_bindings
+
+    print(f"Serving {args.path} on {args.host}:{args.port}; "
+          f"set CHROMA_SERVER_HOST={args.host} CHROMA_SERVER_PORT={args.port} in the API workers")
+    try:
+        chromadb_rust_bindings.cli(["chroma", "run", "--path", args.path, "--host", args.host, "--port", str(args.port)])
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,274 @@
-"""Vector store for RAG using ChromaDB and OpenAI embeddings."""
+"""Vector store for RAG: a ChromaDB collection of knowledge base chunks.
 
+Chunks are embedded by the configured provider (OpenAI or a local sentence-transformers
+model, see ai.embeddings), with an on-disk cache of chunk embeddings and an in-memory
+cache of query embeddings. Search runs against the vectors, an in-process BM25 index
+of the same chunks, or both fused by reciprocal rank (``hybrid``/``auto``). Documents
+are ingested whole or streamed from disk in windows of chunks, so large uploads are
+never held in memory; the document registry tracks their state and the knowledge
+base version.
+"""
+
+import asyncio
 import hashlib
+import heapq
+import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-# Disable ChromaDB telemetry before importing
+# Disable ChromaDB telemetry before it is imported
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
 
-import chromadb
-from chromadb.config import Settings
-from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-from ai.config import API_KEY
+from ai.cache import EmbeddingCache, TTLCache
+from ai.lexical import BM25Index, identifier_terms
+from ai.metrics import span
+from ai.registry import DocumentRecord, DocumentRegistry
+from ai.config import (
+    CHROMA_SERVER_HOST,
+    CHROMA_SERVER_PORT,
+    CHROMA_WRITE_BATCH_SIZE,
+    EMBEDDING_BATCH_MAX_CHARS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_DEVICE,
+    EMBEDDING_MODEL,
+    EMBEDDING_PROVIDER,
+    INGEST_WINDOW_CHUNKS,
+    LOCAL_EMBEDDING_BATCH_SIZE,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_TTL_SECONDS,
+)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 KNOWLEDGE_DIR = BASE_DIR / "knowledge"
-VECTOR_DB_DIR = BASE_DIR / "vector_db"
+VECTOR_DB_DIR = Path(os.getenv("VECTOR_DB_DIR", BASE_DIR / "vector_db"))
+MANIFEST_PATH = VECTOR_DB_DIR / "manifest.json"
+EMBEDDING_CACHE_PATH = VECTOR_DB_DIR / "embedding_cache.sqlite3"
+REGISTRY_PATH = VECTOR_DB_DIR / "registry.sqlite3"
+MAINTENANCE_LOCK_PATH = VECTOR_DB_DIR / "maintenance.lock"
 
-# Initialize embeddings
-embeddings = OpenAIEmbeddings(openai_api_key=API_KEY)
+# Persist the manifest every N processed files so an interrupted startup keeps its progress
+MANIFEST_SAVE_EVERY = 50
 
-# Initialize ChromaDB client
-chroma_client = chromadb.PersistentClient(
-    path=str(VECTOR_DB_DIR),
-    settings=Settings(anonymized_telemetry=False)
-)
+COLLECTION_NAME = "knowledge_base"
 
-# Get or create collection
-collection = chroma_client.get_or_create_collection(
-    name="knowledge_base",
-    metadata={"hnsw:space": "cosine"}
-)
+SEARCH_MODES = ("vector", "lexical", "hybrid", "auto")
 
-# Text splitter configuration
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200,
-    length_function=len,
-)
+# Reciprocal-rank fusion constant and candidates fetched per retriever (k * factor)
+RRF_K = 60
+HYBRID_CANDIDATES_FACTOR = 4
+
+# In 'auto' mode, lexical results are trusted when the top BM25 score beats the
+# runner-up by this factor
+LEXICAL_CONFIDENCE_RATIO = 1.5
+
+# Streamed documents are split once this many characters are buffered; the last
+# STREAM_SPLIT_HOLDBACK chunks of each split are re-split with the text that follows
+STREAM_SPLIT_BUFFER_CHARS = 1 << 20
+STREAM_SPLIT_HOLDBACK = 2
+
+# Retry policy for embedding calls rejected with HTTP 429
+EMBEDDING_MAX_ATTEMPTS = 6
+EMBEDDING_MAX_BACKOFF_SECONDS = 60.0
+
+# Part of the ingestion fingerprint; bump when the chunk IDs or metadata written for a
+# document change, so existing documents are re-ingested when they are added again
+INGEST_FORMAT_VERSION = 1
+
+# Heavy clients are created on first use by the get_* accessors below, so importing
+# this module stays cheap
+_embeddings = None
+_chroma_client = None
+_collection = None
+_text_splitter = None
+_init_lock = threading.RLock()
+
+# Chunk embeddings are cached on disk by (model, chunk text)
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+
+# Query embeddings and top-k results are cached in memory; result keys include the
+# knowledge base version, so any add/delete makes older results unreachable
+query_embedding_cache = TTLCache(QUERY_CACHE_MAX_ENTRIES, ttl=QUERY_CACHE_TTL_SECONDS)
+search_result_cache = TTLCache(QUERY_CACHE_MAX_ENTRIES, ttl=QUERY_CACHE_TTL_SECONDS)
+
+# Document-level registry: listing and existence checks without scanning chunks
+_registry = DocumentRegistry(REGISTRY_PATH)
+_registry_synced = False
+_registry_sync_lock = threading.Lock()
+
+# Documents being ingested in this process, by hash: concurrent adds of the same
+# document wait for the first one instead of writing the same chunks again
+_ingesting: Dict[str, Future] = {}
+_ingesting_lock = threading.Lock()
+
+# BM25 index over the same chunks, built from the collection on first use. With a
+# shared Chroma server, other processes write too: the index then follows the registry's
+# change log instead, and _lexical_version is the last change applied to it
+_lexical_index = None
+_lexical_index_lock = threading.Lock()
+_lexical_version = 0
+
+# Set once this process has tried to take the maintenance lock (see is_maintenance_owner)
+_maintenance_owner = None
+_maintenance_lock_file = None
+
+def get_embedding_identity() -> str:
+    """Return the configured embedding provider and model, as recorded on the collection."""
+    from ai.embeddings import DEFAULT_MODELS, embedding_identity
+
+    return embedding_identity(EMBEDDING_PROVIDER, EMBEDDING_MODEL or DEFAULT_MODELS.get(EMBEDDING_PROVIDER, ""))
+
+
+def get_embeddings():
+    """Return the embeddings client of the configured provider, creating it on first use."""
+    global _embeddings
+    if _embeddings is None:
+        with _init_lock:
+            if _embeddings is None:
+                from ai.embeddings import DEFAULT_MODELS, create_embeddings
+
+                _embeddings = create_embeddings(
+                    EMBEDDING_PROVIDER,
+                    EMBEDDING_MODEL or DEFAULT_MODELS.get(EMBEDDING_PROVIDER, ""),
+                    device=EMBEDDING_DEVICE,
+                    batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+                )
+    return _embeddings
+
+
+def is_shared_store() -> bool:
+    """Whether the collection lives in a Chroma server shared with other processes."""
+    return CHROMA_SERVER_HOST is not None
+
+
+def get_chroma_client():
+    """Return the ChromaDB client, opening the database on first use.
+
+    Connects to the Chroma server at CHROMA_SERVER_HOST if it is set (see
+    ai/vector_server.py), otherwise opens VECTOR_DB_DIR in this process.
+    """
+    global _chroma_client
+    if _chroma_client is None:
+        with _init_lock:
+            if _chroma_client is None:
+                import chromadb
+                from chromadb.config import Settings
+
+                if is_shared_store():
+                    _chroma_client = chromadb.HttpClient(
+                        host=CHROMA_SERVER_HOST,
+                        port=CHROMA_SERVER_PORT,
+                        settings=Settings(anonymized_telemetry=False)
+                    )
+                else:
+                    _chroma_client = chromadb.PersistentClient(
+                        path=str(VECTOR_DB_DIR),
+                        settings=Settings(anonymized_telemetry=False)
+                    )
+    return _chroma_client
+
+
+def is_maintenance_owner() -> bool:
+    """Whether this process repairs the registry and reconciles the knowledge directory.
+
+    Several API workers can share one store; the first to ask takes an exclusive lock on
+    MAINTENANCE_LOCK_PATH and keeps it until it exits, so startup repair, knowledge
+    directory sync and job resumption run once rather than racing each other.
+    """
+    global _maintenance_owner, _maintenance_lock_file
+    if _maintenance_owner is None:
+        with _init_lock:
+            if _maintenance_owner is None:
+                try:
+                    import fcntl
+                except ImportError:
+                    # No flock (Windows): only single-process deployments are supported
+                    _maintenance_owner = True
+                    return _maintenance_owner
+                MAINTENANCE_LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+                lock_file = open(MAINTENANCE_LOCK_PATH, "a")
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    lock_file.close()
+                    _maintenance_owner = False
+                else:
+                    _maintenance_lock_file = lock_file
+                    _maintenance_owner = True
+    return _maintenance_owner
+
+
+def get_collection():
+    """Return the knowledge base collection, creating it if needed.
+
+    Raises EmbeddingModelMismatchError if the collection holds vectors from a different
+    embedding model than the configured one.
+    """
+    global _collection
+    if _collection is None:
+        with _init_lock:
+            if _collection is None:
+                identity = get_embedding_identity()
+                collection = get_chroma_client().get_or_create_collection(
+                    name=COLLECTION_NAME,
+                    metadata={"hnsw:space": "cosine", "embedding_model": identity}
+                )
+                _check_embedding_model(collection, identity)
+                _collection = collection
+    return _collection
+
+
+def _check_embedding_model(collection, identity: str) -> None:
+    """Refuse a collection built with another embedding model; stamp unlabelled ones."""
+    from ai.embeddings import DEFAULT_MODELS, EmbeddingModelMismatchError, embedding_identity
+
+    metadata = dict(collection.metadata or {})
+    recorded = metadata.get("embedding_model")
+    if recorded is None:
+        # Collections created before the model was recorded were built with the
+        # original OpenAI default; an empty one can take any model
+        recorded = identity if collection.count() == 0 else embedding_identity("openai", DEFAULT_MODELS["openai"])
+        if recorded == identity:
+            # The distance function can't be passed to modify(); it is kept as created
+            metadata = {key: value for key, value in metadata.items() if not key.startswith("hnsw:")}
+            collection.modify(metadata={**metadata, "embedding_model": identity})
+    if recorded != identity:
+        raise EmbeddingModelMismatchError(
+            f"The '{collection.name}' collection was built with embedding model '{recorded}', "
+            f"but '{identity}' is configured. Set EMBEDDING_PROVIDER/EMBEDDING_MODEL back, or "
+            f"re-embed the collection: python -m ai.migrate_embeddings --provider ... --model ..."
+        )
+
+
+def get_text_splitter():
+    """Return the text splitter used to chunk documents."""
+    global _text_splitter
+    if _text_splitter is None:
+        with _init_lock:
+            if _text_splitter is None:
+                from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+                _text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=1000,
+                    chunk_overlap=200,
+                    length_function=len,
+                )
+    return _text_splitter
+
+
+def warm_up() -> None:
+    """Create all clients and build the in-memory indexes ahead of the first request."""
+    get_embeddings()
+    get_text_splitter()
+    get_collection()
+    _get_registry()
+    _get_lexical_index()
 
 
 def _get_content_hash(content: str) -> str:
@@ -47,115 +276,1043 @@ def _get_content_hash(content: str) -> str:
     return hashlib.md5(content.encode('utf-8')).hexdigest()
 
 
+def _pack_batches(texts: List[str]) -> List[List[str]]:
+    """Pack texts into embedding requests bounded by item count and total characters."""
+    batches, batch, batch_chars = [], [], 0
+    for text in texts:
+        if batch and (len(batch) >= EMBEDDING_BATCH_SIZE or batch_chars + len(text) > EMBEDDING_BATCH_MAX_CHARS):
+            batches.append(batch)
+            batch, batch_chars = [], 0
+        batch.append(text)
+        batch_chars += len(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _embed_batch_with_backoff(batch: List[str]) -> List[List[float]]:
+    """Embed one batch, retrying with jittered exponential backoff on rate limiting."""
+    import openai
+
+    delay = 1.0
+    for attempt in range(1, EMBEDDING_MAX_ATTEMPTS + 1):
+        try:
+            return get_embeddings().embed_documents(batch)
+        except openai.RateLimitError:
+            if attempt == EMBEDDING_MAX_ATTEMPTS:
+                raise
+            time.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, EMBEDDING_MAX_BACKOFF_SECONDS)
+
+
+def _embed_many(texts: List[str]) -> List[List[float]]:
+    """Embed texts in packed batches with bounded concurrency, preserving order."""
+    batches = _pack_batches(texts)
+    if len(batches) == 1:
+        return _embed_batch_with_backoff(batches[0])
+
+    with ThreadPoolExecutor(max_workers=min(EMBEDDING_CONCURRENCY, len(batches))) as executor:
+        results = executor.map(_embed_batch_with_backoff, batches)
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+
+def _embed_chunks(chunks: List[str]) -> List[List[float]]:
+    """Embed chunks, sending only cache misses to the embedding API."""
+    model = get_embeddings().model
+    vectors = embedding_cache.get_many(model, chunks)
+
+    # Deduplicate misses so repeated chunks are embedded once
+    missing = list(dict.fromkeys(chunk for chunk, vector in zip(chunks, vectors) if vector is None))
+    if missing:
+        fresh = _embed_many(missing)
+        embedding_cache.put_many(model, missing, fresh)
+        fresh_by_chunk = dict(zip(missing, fresh))
+        vectors = [
+            vector if vector is not None else fresh_by_chunk[chunk]
+            for chunk, vector in zip(chunks, vectors)
+        ]
+
+    return vectors
+
+
+def get_ingest_fingerprint() -> str:
+    """Return a hash of the configuration that determines a document's chunks and vectors."""
+    splitter = get_text_splitter()
+    config = {
+        "format": INGEST_FORMAT_VERSION,
+        "splitter": type(splitter).__name__,
+        "chunk_size": splitter._chunk_size,
+        "chunk_overlap": splitter._chunk_overlap,
+        "separators": getattr(splitter, "_separators", None),
+        "embedding_model": get_embedding_identity(),
+    }
+    return hashlib.md5(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _claim_document(doc_hash: str) -> Tuple[Future, bool]:
+    """Register this thread as the one writing doc_hash, to ingest or delete it.
+
+    Returns (future, True) if the caller now owns the document and must pass the future
+    to _release_document, or the owner's (future, False) if it is already being written.
+    """
+    with _ingesting_lock:
+        future = _ingesting.get(doc_hash)
+        if future is not None:
+            return future, False
+        future = _ingesting[doc_hash] = Future()
+        return future, True
+
+
+def _release_document(doc_hash: str, future: Future, error: Optional[BaseException] = None) -> None:
+    """Finish an ingestion claimed with _claim_document and wake up the threads waiting for it."""
+    with _ingesting_lock:
+        if _ingesting.get(doc_hash) is future:
+            del _ingesting[doc_hash]
+    if error is None:
+        future.set_result(doc_hash)
+    else:
+        future.set_exception(error)
+
+
+def get_kb_version() -> int:
+    """Return a counter that changes whenever the knowledge base content changes.
+
+    The counter is kept in the registry, so it also moves on writes by other processes.
+    """
+    return _registry.get_version()
+
+
+def get_kb_changes_since(version: int) -> Optional[List[Tuple[int, Optional[str]]]]:
+    """Return the (version, doc_hash) writes after version, oldest first.
+
+    doc_hash is None for a write that may have changed any document. Returns None if
+    the change log no longer reaches back to version.
+    """
+    return _registry.changes_since(version)
+
+
+def _bump_kb_version(doc_hashes: Iterable[str] = ()) -> None:
+    """Invalidate cached search results. Call after a write of doc_hashes has completed."""
+    _registry.record_changes(list(doc_hashes) or [None])
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+def embed_query_cached(query: str) -> List[float]:
+    """Embed a search query, reusing the embedding of a normalized-identical query."""
+    key = (get_embeddings().model, _normalize_query(query))
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        with span("embed_query"):
+            vector = get_embeddings().embed_query(query)
+        query_embedding_cache.set(key, vector)
+    return vector
+
+
+async def aembed_query_cached(query: str) -> List[float]:
+    """Async variant of embed_query_cached."""
+    # Creating the client (or waiting for warm-up to create it) blocks; keep it off the loop
+    embeddings = await asyncio.to_thread(get_embeddings)
+    key = (embeddings.model, _normalize_query(query))
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        with span("embed_query"):
+            vector = await embeddings.aembed_query(query)
+        query_embedding_cache.set(key, vector)
+    return vector
+
+
+def embed_queries_cached(queries: List[str]) -> List[List[float]]:
+    """Embed many search queries, sending only cache misses to the embedding API in batches."""
+    model = get_embeddings().model
+    keys = [(model, _normalize_query(query)) for query in queries]
+    vectors = [query_embedding_cache.get(key) for key in keys]
+
+    # Normalized-identical queries are embedded once
+    missing = {}
+    for key, query, vector in zip(keys, queries, vectors):
+        if vector is None:
+            missing.setdefault(key, query)
+    if missing:
+        with span("embed_query"):
+            fresh = _embed_many(list(missing.values()))
+        fresh_by_key = dict(zip(missing, fresh))
+        for key, vector in fresh_by_key.items():
+            query_embedding_cache.set(key, vector)
+        vectors = [vector if vector is not None else fresh_by_key[key] for key, vector in zip(keys, vectors)]
+    return vectors
+
+
+def get_cache_stats() -> dict:
+    """Return hit/miss statistics of the vector store caches."""
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "search_result_cache": search_result_cache.stats(),
+        "kb_version": get_kb_version(),
+    }
+
+
+def _delete_chunks_for(doc_hashes: List[str]) -> bool:
+    """Delete all chunks of the given documents by scanning metadata. Returns True if any existed.
+
+    Only used to repair documents the registry can't vouch for; normal deletes go by ID.
+    """
+    deleted = False
+    for start in range(0, len(doc_hashes), 500):
+        batch = doc_hashes[start:start + 500]
+        where = {"doc_hash": batch[0]} if len(batch) == 1 else {"doc_hash": {"$in": batch}}
+        existing = get_collection().get(where=where, include=[])
+        if existing["ids"]:
+            get_collection().delete(ids=existing["ids"])
+            deleted = True
+    return deleted
+
+
+def _delete_ids(ids: List[str]) -> None:
+    """Delete chunks by ID in batches ChromaDB accepts."""
+    batch_size = get_chroma_client().get_max_batch_size()
+    for start in range(0, len(ids), batch_size):
+        get_collection().delete(ids=ids[start:start + batch_size])
+
+
+def _chunk_ids(doc_hash: str, chunk_count: int) -> List[str]:
+    return [f"{doc_hash}_{i}" for i in range(chunk_count)]
+
+
+def _scan_collection_documents() -> List[DocumentRecord]:
+    """Derive document records from chunk metadata. Used once to build a missing registry."""
+    records = {}
+    now = time.time()
+    offset = 0
+    while True:
+        page = get_collection().get(include=["metadatas"], limit=10000, offset=offset)
+        if not page["ids"]:
+            break
+        for metadata in page["metadatas"]:
+            if not metadata or "doc_hash" not in metadata:
+                continue
+            doc_hash = metadata["doc_hash"]
+            record = records.setdefault(doc_hash, DocumentRecord(
+                doc_hash=doc_hash,
+                file_name=metadata.get("file_name", f"doc_{doc_hash[:8]}.txt"),
+                chunk_count=0,
+                size_bytes=0,  # unknown for documents ingested before the registry existed
+                ingested_at=now,
+            ))
+            record["chunk_count"] += 1
+        offset += len(page["ids"])
+    return list(records.values())
+
+
+def _build_lexical_index() -> BM25Index:
+    index = BM25Index()
+    offset = 0
+    while True:
+        page = get_collection().get(include=["documents"], limit=10000, offset=offset)
+        if not page["ids"]:
+            break
+        index.add(page["ids"], page["documents"])
+        offset += len(page["ids"])
+    return index
+
+
+def _get_lexical_index() -> BM25Index:
+    """Return the BM25 index, building it from the collection on first use.
+
+    With a shared store, writes logged by any process since the last call are applied
+    first.
+    """
+    global _lexical_index, _lexical_version
+    if _lexical_index is None:
+        with _lexical_index_lock:
+            if _lexical_index is None:
+                # Changes logged while the collection is scanned are replayed later
+                _lexical_version = _registry.get_version()
+                _lexical_index = _build_lexical_index()
+    elif is_shared_store() and _registry.get_version() != _lexical_version:
+        with _lexical_index_lock:
+            _resync_lexical_index()
+    return _lexical_index
+
+
+def _resync_lexical_index() -> None:
+    """Apply changes from the registry's change log to the BM25 index. Hold _lexical_index_lock."""
+    global _lexical_index, _lexical_version
+    changes = _registry.changes_since(_lexical_version)
+    if changes is None:
+        # The log was pruned past our version: rebuild, replaying changes logged meanwhile later
+        _lexical_version = _registry.get_version()
+        _lexical_index = _build_lexical_index()
+        return
+    if not changes:
+        return
+    if any(doc_hash is None for _, doc_hash in changes):
+        _lexical_version = changes[-1][0]
+        _lexical_index = _build_lexical_index()
+        return
+
+    doc_hashes = list(dict.fromkeys(doc_hash for _, doc_hash in changes))
+    ids = []
+    for doc_hash in doc_hashes:
+        _lexical_index.remove_document(doc_hash)
+        record = _registry.get(doc_hash)
+        if record:  # None if deleted, or being rewritten and logged again when done
+            ids.extend(_chunk_ids(doc_hash, record["chunk_count"]))
+    batch_size = get_chroma_client().get_max_batch_size()
+    for start in range(0, len(ids), batch_size):
+        page = get_collection().get(ids=ids[start:start + batch_size], include=["documents"])
+        _lexical_index.add(page["ids"], page["documents"])
+    _lexical_version = changes[-1][0]
+
+
+def _update_lexical_index(
+    removed_docs: Iterable[str] = (),
+    ids: Iterable[str] = (),
+    documents: Iterable[str] = (),
+) -> None:
+    """Apply a completed ChromaDB write to the BM25 index, if it has been built.
+
+    With a shared store the index is updated from the change log instead.
+    """
+    with _lexical_index_lock:
+        if _lexical_index is None or is_shared_store():
+            return
+        for doc_hash in removed_docs:
+            _lexical_index.remove_document(doc_hash)
+        _lexical_index.add(ids, documents)
+
+
+def _get_registry() -> DocumentRegistry:
+    """Return the document registry, repairing or bootstrapping it on first use."""
+    global _registry_synced
+    if not _registry_synced:
+        with _registry_sync_lock:
+            if not _registry_synced:
+                # Only one process repairs; to the others, unfinished rows may be
+                # writes still in progress elsewhere
+                if is_maintenance_owner():
+                    # Documents interrupted mid-write or mid-delete are removed entirely
+                    unfinished = _registry.unfinished()
+                    if unfinished:
+                        _delete_chunks_for(unfinished)
+                        for doc_hash in unfinished:
+                            _registry.remove(doc_hash)
+                        _update_lexical_index(removed_docs=unfinished)
+                        _bump_kb_version(unfinished)
+
+                    if _registry.is_empty() and get_collection().count() > 0:
+                        _registry.rebuild(_scan_collection_documents())
+                        _bump_kb_version()
+                _registry_synced = True
+    return _registry
+
+
+def _write_chunks(ids: List[str], chunks: List[str], metadatas: List[dict]) -> Tuple[float, float]:
+    """Embed chunks and write them to ChromaDB in large batches.
+
+    Returns the seconds spent embedding and writing.
+    """
+    embed_started = time.perf_counter()
+    chunk_embeddings = _embed_chunks(chunks)
+    embed_seconds = time.perf_counter() - embed_started
+
+    write_started = time.perf_counter()
+    write_batch_size = min(CHROMA_WRITE_BATCH_SIZE, get_chroma_client().get_max_batch_size())
+    for start in range(0, len(ids), write_batch_size):
+        end = start + write_batch_size
+        # Upsert, so re-ingesting a document replaces its chunks without a window where
+        # they are missing
+        get_collection().upsert(
+            ids=ids[start:end],
+            embeddings=chunk_embeddings[start:end],
+            documents=chunks[start:end],
+            metadatas=metadatas[start:end],
+        )
+    return embed_seconds, time.perf_counter() - write_started
+
+
+def add_documents(documents: Iterable[Tuple[str, ...]]) -> dict:
+    """Add many (content, file_name) or (content, file_name, doc_hash) documents to the vector store.
+
+    doc_hash, if the caller already has it, must be the MD5 of content; it saves hashing
+    the content again. Chunks from many documents are packed into shared embedding
+    requests, which run concurrently, and written to ChromaDB in large batches.
+
+    A document already ingested with the current configuration (get_ingest_fingerprint)
+    is skipped, and one that another thread is ingesting is waited for instead of
+    ingested twice; both count as ``unchanged`` in the returned statistics. If the other
+    thread was deleting it, it is ingested once the delete is done. Chunks of a
+    re-ingested document are replaced.
+    """
+    started = time.perf_counter()
+    stats = {"documents": 0, "unchanged": 0, "chunks": 0, "embed_seconds": 0.0, "write_seconds": 0.0}
+    doc_hashes = []
+    seen = set()
+    written = []
+
+    registry = _get_registry()
+    fingerprint = get_ingest_fingerprint()
+    # Futures of documents this call ingests, and of documents other threads ingest
+    claimed: Dict[str, Future] = {}
+    waiting: List[Tuple[Future, Tuple[str, Optional[str], str]]] = []
+    # (doc_hash, file_name, size_bytes, chunk_count) of documents in the current window
+    pending_docs, ids, chunks, metadatas = [], [], [], []
+
+    def flush():
+        if pending_docs:
+            previous = [registry.get(doc_hash) for doc_hash, _, _, _ in pending_docs]
+            registry.mark_pending((doc_hash, name, size) for doc_hash, name, size, _ in pending_docs)
+            written.extend(doc_hash for doc_hash, _, _, _ in pending_docs)
+        if chunks:
+            embed_seconds, write_seconds = _write_chunks(ids, chunks, metadatas)
+            stats["embed_seconds"] += embed_seconds
+            stats["write_seconds"] += write_seconds
+            stats["chunks"] += len(chunks)
+        if pending_docs:
+            # Chunks past the new end of a re-ingested document were not overwritten
+            stale_ids = [
+                f"{record['doc_hash']}_{i}"
+                for record, (_, _, _, count) in zip(previous, pending_docs) if record
+                for i in range(count, record["chunk_count"])
+            ]
+            if stale_ids:
+                _delete_ids(stale_ids)
+        _update_lexical_index(
+            removed_docs=[doc_hash for doc_hash, _, _, _ in pending_docs],
+            ids=ids,
+            documents=chunks,
+        )
+        if pending_docs:
+            registry.mark_ready(((doc_hash, count) for doc_hash, _, _, count in pending_docs), fingerprint)
+            for doc_hash, _, _, _ in pending_docs:
+                _release_document(doc_hash, claimed.pop(doc_hash))
+        pending_docs.clear()
+        ids.clear()
+        chunks.clear()
+        metadatas.clear()
+
+    try:
+        for document in documents:
+            content, file_name = document[0], document[1]
+            doc_hash = (document[2] if len(document) > 2 else None) or _get_content_hash(content)
+            doc_hashes.append(doc_hash)
+            if doc_hash in seen:
+                continue
+            seen.add(doc_hash)
+            stats["documents"] += 1
+
+            future, owner = _claim_document(doc_hash)
+            if not owner:
+                waiting.append((future, (content, file_name, doc_hash)))
+                stats["unchanged"] += 1
+                continue
+            claimed[doc_hash] = future
+            # Checked after claiming, so a concurrent ingest can't finish in between
+            if registry.is_current(doc_hash, fingerprint):
+                _release_document(doc_hash, claimed.pop(doc_hash))
+                stats["unchanged"] += 1
+                continue
+
+            doc_chunks = get_text_splitter().split_text(content)
+            display_name = file_name or f"doc_{doc_hash[:8]}.txt"
+            pending_docs.append((doc_hash, display_name, len(content.encode("utf-8")), len(doc_chunks)))
+            ids.extend(_chunk_ids(doc_hash, len(doc_chunks)))
+            chunks.extend(doc_chunks)
+            metadatas.extend(
+                {
+                    "doc_hash": doc_hash,
+                    "file_name": display_name,
+                    "chunk_index": i,
+                }
+                for i in range(len(doc_chunks))
+            )
+
+            if len(chunks) >= INGEST_WINDOW_CHUNKS:
+                flush()
+        flush()
+    except BaseException as e:
+        for doc_hash, future in claimed.items():
+            _release_document(doc_hash, future, e)
+        raise
+    finally:
+        if written:
+            _bump_kb_version(written)
+
+    # Waiting only after releasing everything claimed here can't deadlock
+    deleted = []
+    for future, document in waiting:
+        future.result()
+        # The other thread may have deleted the document rather than ingested it
+        if not registry.is_current(document[2], fingerprint):
+            deleted.append(document)
+    if deleted:
+        retried = add_documents(deleted)
+        stats["unchanged"] -= len(deleted) - retried["unchanged"]
+        for key in ("chunks", "embed_seconds", "write_seconds"):
+            stats[key] += retried[key]
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["chunks_per_second"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["doc_hashes"] = doc_hashes
+    return stats
+
+
 def add_document(content: str, file_name: str = None) -> str:
     """Add a document to the vector store after chunking.
     
     Returns the content hash that identifies this document.
     """
-    # Generate content hash as the document identifier
-    doc_hash = _get_content_hash(content)
-    
-    # Check if document with this hash already exists
-    existing = collection.get(where={"doc_hash": doc_hash})
-    if existing["ids"]:
-        # Delete old chunks for this document
-        collection.delete(ids=existing["ids"])
-    
-    # Split document into chunks
-    chunks = text_splitter.split_text(content)
-    
-    if not chunks:
-        return doc_hash
-    
-    # Generate embeddings for all chunks
-    chunk_embeddings = embeddings.embed_documents(chunks)
-    
-    # Prepare data for ChromaDB
-    ids = [f"{doc_hash}_{i}" for i in range(len(chunks))]
-    metadatas = [
-        {
-            "doc_hash": doc_hash,
-            "file_name": file_name or f"doc_{doc_hash[:8]}.txt",
-            "chunk_index": i,
-        }
-        for i in range(len(chunks))
-    ]
-    
-    # Add to collection
-    collection.add(
-        ids=ids,
-        embeddings=chunk_embeddings,
-        documents=chunks,
-        metadatas=metadatas
-    )
-    
-    return doc_hash
+    return add_documents([(content, file_name)])["doc_hashes"][0]
 
 
-def search(query: str, k: int = 3) -> List[dict]:
-    """Search the vector store for relevant chunks."""
-    if collection.count() == 0:
-        return []
-    
-    # Generate query embedding
-    query_embedding = embeddings.embed_query(query)
-    
-    # Search in ChromaDB
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=min(k, collection.count())
-    )
-    
-    # Format results
+def split_stream(pieces: Iterable[str]) -> Iterator[str]:
+    """Split text arriving in pieces into chunks, without holding the whole text.
+
+    Text is buffered up to STREAM_SPLIT_BUFFER_CHARS and split; chunks near the end of
+    the buffer, which may change once more text arrives, are held back and the buffer
+    restarts at the first of them. Chunks match split_text except near these seams,
+    where boundaries can shift slightly; no text is lost and overlap is kept, since a
+    held-back chunk starts with the overlap of the chunk emitted before it.
+    """
+    splitter = get_text_splitter()
+    overlap = splitter._chunk_overlap
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) < STREAM_SPLIT_BUFFER_CHARS:
+            continue
+        chunks = splitter.split_text(buffer)
+        if len(chunks) <= STREAM_SPLIT_HOLDBACK:
+            continue
+        # Locate the first held-back chunk the way the splitter computes start indexes
+        emit = len(chunks) - STREAM_SPLIT_HOLDBACK
+        start = previous_length = 0
+        for chunk in chunks[:emit + 1]:
+            start = buffer.find(chunk, max(0, start + previous_length - overlap))
+            previous_length = len(chunk)
+        if start < 0:
+            continue  # not found (cannot happen with the default splitter); keep buffering
+        yield from chunks[:emit]
+        buffer = buffer[start:]
+    if buffer:
+        yield from splitter.split_text(buffer)
+
+
+def add_document_stream(pieces: Iterable[str], doc_hash: str, file_name: str, size_bytes: int) -> dict:
+    """Add one document whose text arrives in pieces, with memory bounded by the window size.
+
+    The caller supplies the content hash, computed while the text was received. Chunks
+    are embedded and written every INGEST_WINDOW_CHUNKS chunks. Like add_documents, an
+    already ingested or concurrently ingesting document is not written again. Returns
+    ingestion statistics like add_documents.
+    """
+    started = time.perf_counter()
+    stats = {"documents": 1, "unchanged": 0, "chunks": 0, "embed_seconds": 0.0, "write_seconds": 0.0}
+
+    registry = _get_registry()
+    fingerprint = get_ingest_fingerprint()
+    future, owner = _claim_document(doc_hash)
+    while not owner:
+        future.result()
+        # The other thread may have deleted the document rather than ingested it
+        if registry.is_current(doc_hash, fingerprint):
+            stats["unchanged"] = 1
+            break
+        future, owner = _claim_document(doc_hash)
+    if owner:
+        try:
+            if registry.is_current(doc_hash, fingerprint):
+                stats["unchanged"] = 1
+            else:
+                _ingest_stream(pieces, doc_hash, file_name, size_bytes, fingerprint, stats)
+        except BaseException as e:
+            _release_document(doc_hash, future, e)
+            raise
+        _release_document(doc_hash, future)
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["chunks_per_second"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["doc_hashes"] = [doc_hash]
+    return stats
+
+
+def _ingest_stream(
+    pieces: Iterable[str], doc_hash: str, file_name: str, size_bytes: int, fingerprint: str, stats: dict
+) -> None:
+    """Write the chunks of a streamed document, adding to stats. Called by add_document_stream."""
+    registry = _get_registry()
+    previous = registry.get(doc_hash)
+    registry.mark_pending([(doc_hash, file_name, size_bytes)])
+    if previous:
+        _update_lexical_index(removed_docs=[doc_hash])
+
+    ids, chunks, metadatas = [], [], []
+
+    def flush():
+        embed_seconds, write_seconds = _write_chunks(ids, chunks, metadatas)
+        stats["embed_seconds"] += embed_seconds
+        stats["write_seconds"] += write_seconds
+        _update_lexical_index(ids=ids, documents=chunks)
+        ids.clear()
+        chunks.clear()
+        metadatas.clear()
+
+    for index, chunk in enumerate(split_stream(pieces)):
+        ids.append(f"{doc_hash}_{index}")
+        chunks.append(chunk)
+        metadatas.append({"doc_hash": doc_hash, "file_name": file_name, "chunk_index": index})
+        stats["chunks"] += 1
+        if len(chunks) >= INGEST_WINDOW_CHUNKS:
+            flush()
+    if chunks:
+        flush()
+
+    # Chunks past the new end of a re-ingested document were not overwritten
+    if previous and previous["chunk_count"] > stats["chunks"]:
+        _delete_ids([f"{doc_hash}_{i}" for i in range(stats["chunks"], previous["chunk_count"])])
+    registry.mark_ready([(doc_hash, stats["chunks"])], fingerprint)
+    _bump_kb_version([doc_hash])
+
+
+def _format_query_results(results: dict, query_index: int = 0) -> List[dict]:
+    """Convert one query of a ChromaDB query result into a list of chunk dicts."""
+    i = query_index
     retrieved_chunks = []
-    if results["documents"] and results["documents"][0]:
-        for i, doc in enumerate(results["documents"][0]):
-            metadata = results["metadatas"][0][i] if results["metadatas"] and results["metadatas"][0] else {}
+    if results["documents"] and results["documents"][i]:
+        for j, doc in enumerate(results["documents"][i]):
+            metadata = results["metadatas"][i][j] if results["metadatas"] and results["metadatas"][i] else {}
             retrieved_chunks.append({
+                "chunk_id": results["ids"][i][j],
                 "content": doc,
                 "source": metadata.get("doc_hash", "unknown"),
-                "score": results["distances"][0][i] if results["distances"] and results["distances"][0] else None
+                "score": results["distances"][i][j] if results["distances"] and results["distances"][i] else None
             })
-    
     return retrieved_chunks
 
 
-def load_existing_files() -> None:
-    """Load all existing .txt files from knowledge directory into vector store."""
-    if not KNOWLEDGE_DIR.exists():
-        KNOWLEDGE_DIR.mkdir(parents=True, exist_ok=True)
-        return
-    
-    for file_path in KNOWLEDGE_DIR.glob("*.txt"):
-        try:
-            content = file_path.read_text(encoding="utf-8")
-            add_document(content, file_name=file_path.name)
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
+def _get_chunks_by_id(chunk_ids: Iterable[str], where: Optional[dict] = None) -> dict:
+    """Load chunks from ChromaDB as {chunk_id: (text, metadata)}, keeping only those matching where."""
+    chunk_ids = list(chunk_ids)
+    if not chunk_ids:
+        return {}
+    with span("chroma_get"):
+        fetched = get_collection().get(ids=chunk_ids, where=where, include=["documents", "metadatas"])
+    return {
+        chunk_id: (doc, metadata or {})
+        for chunk_id, doc, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+    }
+
+
+def _fetch_chunks(hits: List[Tuple[str, float]], by_id: Optional[dict] = None) -> List[dict]:
+    """Load the text of lexical (chunk_id, score) hits from ChromaDB, keeping hit order.
+
+    by_id can pass chunks already loaded with _get_chunks_by_id.
+    """
+    if not hits:
+        return []
+    if by_id is None:
+        by_id = _get_chunks_by_id(chunk_id for chunk_id, _ in hits)
+    retrieved_chunks = []
+    for chunk_id, lexical_score in hits:
+        if chunk_id not in by_id:
+            continue  # deleted since it was indexed
+        doc, metadata = by_id[chunk_id]
+        retrieved_chunks.append({
+            "chunk_id": chunk_id,
+            "content": doc,
+            "source": metadata.get("doc_hash", "unknown"),
+            "score": None,
+            "lexical_score": lexical_score,
+        })
+    return retrieved_chunks
+
+
+def _fuse(
+    vector_results: List[dict],
+    lexical_hits: List[Tuple[str, float]],
+    k: int,
+    lexical_chunks: Optional[dict] = None,
+) -> List[dict]:
+    """Combine vector and lexical rankings with reciprocal-rank fusion.
+
+    lexical_chunks can pass the lexical hits' chunks already loaded with _get_chunks_by_id.
+    """
+    scores = {}
+    for rank, chunk in enumerate(vector_results):
+        scores[chunk["chunk_id"]] = scores.get(chunk["chunk_id"], 0.0) + 1 / (RRF_K + rank + 1)
+    for rank, (chunk_id, _) in enumerate(lexical_hits):
+        scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (RRF_K + rank + 1)
+
+    top_ids = heapq.nlargest(k, scores, key=scores.get)
+    by_id = {chunk["chunk_id"]: chunk for chunk in vector_results}
+    lexical_scores = dict(lexical_hits)
+    by_id.update(
+        (chunk["chunk_id"], chunk)
+        for chunk in _fetch_chunks(
+            [(chunk_id, lexical_scores[chunk_id]) for chunk_id in top_ids if chunk_id not in by_id],
+            lexical_chunks,
+        )
+    )
+
+    fused = []
+    for chunk_id in top_ids:
+        if chunk_id not in by_id:
+            continue
+        chunk = dict(by_id[chunk_id])
+        chunk["rrf_score"] = scores[chunk_id]
+        if chunk_id in lexical_scores:
+            chunk["lexical_score"] = lexical_scores[chunk_id]
+        fused.append(chunk)
+    return fused
+
+
+def _lexical_confident(query: str, hits: List[Tuple[str, float]]) -> bool:
+    """Decide whether lexical hits alone answer an identifier-style query."""
+    terms = identifier_terms(query)
+    if not hits or not terms:
+        return False
+    if not _get_lexical_index().contains_all(hits[0][0], terms):
+        return False
+    return len(hits) == 1 or hits[0][1] >= LEXICAL_CONFIDENCE_RATIO * hits[1][1]
+
+
+def _search_without_embedding(query: str, k: int, mode: str) -> Tuple[int, list, Optional[List[dict]]]:
+    """Run the parts of a search that need no query embedding.
+
+    Returns the collection size, the lexical hits, and the final results if the search
+    can be answered without vector retrieval (otherwise None).
+    """
+    total = get_collection().count()
+    if total == 0:
+        return total, [], []
+
+    hits = []
+    if mode != "vector":
+        candidates = k if mode == "lexical" else k * HYBRID_CANDIDATES_FACTOR
+        with span("bm25"):
+            hits = _get_lexical_index().search(query, candidates)
+        if mode == "lexical" or (mode == "auto" and _lexical_confident(query, hits)):
+            return total, hits, _fetch_chunks(hits[:k])
+    return total, hits, None
+
+
+def _search_with_embedding(query_embedding: List[float], k: int, mode: str, total: int, hits: list) -> List[dict]:
+    """Run the vector query and, for hybrid modes, fuse it with the lexical hits."""
+    candidates = k if mode == "vector" else k * HYBRID_CANDIDATES_FACTOR
+    with span("chroma_query"):
+        results = get_collection().query(
+            query_embeddings=[query_embedding],
+            n_results=min(candidates, total)
+        )
+    vector_results = _format_query_results(results)
+    if mode == "vector":
+        return vector_results
+    return _fuse(vector_results, hits, k)
+
+
+def search(query: str, k: int = 3, mode: str = "vector") -> List[dict]:
+    """Search the vector store for relevant chunks.
+
+    mode is 'vector' (semantic search), 'lexical' (BM25 only, no embedding call),
+    'hybrid' (both, fused by reciprocal rank) or 'auto' (lexical when it is confident,
+    hybrid otherwise).
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+    cache_key = (get_kb_version(), _normalize_query(query), k, mode)
+    cached = search_result_cache.get(cache_key)
+    if cached is not None:
+        return [dict(chunk) for chunk in cached]
+
+    total, hits, retrieved_chunks = _search_without_embedding(query, k, mode)
+    if retrieved_chunks is None:
+        query_embedding = embed_query_cached(query)
+        retrieved_chunks = _search_with_embedding(query_embedding, k, mode, total, hits)
+
+    search_result_cache.set(cache_key, retrieved_chunks)
+    return [dict(chunk) for chunk in retrieved_chunks]
+
+
+async def asearch(query: str, k: int = 3, mode: str = "vector") -> List[dict]:
+    """Async variant of search that keeps the event loop free.
+
+    The query is embedded with the async OpenAI client and the ChromaDB calls,
+    which are blocking, run in a worker thread.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+    cache_key = (await asyncio.to_thread(get_kb_version), _normalize_query(query), k, mode)
+    cached = search_result_cache.get(cache_key)
+    if cached is not None:
+        return [dict(chunk) for chunk in cached]
+
+    total, hits, retrieved_chunks = await asyncio.to_thread(_search_without_embedding, query, k, mode)
+    if retrieved_chunks is None:
+        query_embedding = await aembed_query_cached(query)
+        retrieved_chunks = await asyncio.to_thread(
+            _search_with_embedding, query_embedding, k, mode, total, hits
+        )
+
+    search_result_cache.set(cache_key, retrieved_chunks)
+    return [dict(chunk) for chunk in retrieved_chunks]
+
+
+def search_many(
+    queries: List[str],
+    k: int = 3,
+    mode: str = "vector",
+    where: Optional[dict] = None,
+) -> List[List[dict]]:
+    """Search for many queries at once; returns one result list per query, in order.
+
+    Gives the same results as calling search() per query, but the collection is counted
+    once, the queries missing from the embedding cache are embedded in batched requests,
+    and all vector lookups go to ChromaDB as one multi-embedding query, so the cost grows
+    with the number of batches rather than the number of queries.
+
+    where is a ChromaDB metadata filter such as {"doc_hash": "..."} or
+    {"file_name": {"$in": [...]}}. It applies to lexical candidates too, which are
+    filtered before fusion, so a filtered lexical search may return fewer than k chunks.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+    # Unfiltered searches share the cache with search()
+    kb_version = get_kb_version()
+    where_key = json.dumps(where, sort_keys=True) if where else None
+    cache_keys = [
+        (kb_version, _normalize_query(query), k, mode) + ((where_key,) if where_key else ())
+        for query in queries
+    ]
+    results = [search_result_cache.get(cache_key) for cache_key in cache_keys]
+    pending = [i for i, cached in enumerate(results) if cached is None]
+
+    if pending:
+        total = get_collection().count()
+        hits = {i: [] for i in pending}
+        lexical_chunks = {}
+        if total and mode != "vector":
+            candidates = k if mode == "lexical" else k * HYBRID_CANDIDATES_FACTOR
+            with span("bm25"):
+                index = _get_lexical_index()
+                hits = {i: index.search(queries[i], candidates) for i in pending}
+            # One ChromaDB read loads (and filters) the candidates of every query
+            lexical_chunks = _get_chunks_by_id(
+                dict.fromkeys(chunk_id for query_hits in hits.values() for chunk_id, _ in query_hits), where
+            )
+            hits = {
+                i: [hit for hit in query_hits if hit[0] in lexical_chunks]
+                for i, query_hits in hits.items()
+            }
+
+        needs_vector = []
+        for i in pending:
+            if not total:
+                results[i] = []
+            elif mode == "lexical" or (mode == "auto" and _lexical_confident(queries[i], hits[i])):
+                results[i] = _fetch_chunks(hits[i][:k], lexical_chunks)
+            else:
+                needs_vector.append(i)
+
+        if needs_vector:
+            query_embeddings = embed_queries_cached([queries[i] for i in needs_vector])
+            candidates = k if mode == "vector" else k * HYBRID_CANDIDATES_FACTOR
+            with span("chroma_query"):
+                query_results = get_collection().query(
+                    query_embeddings=query_embeddings,
+                    n_results=min(candidates, total),
+                    where=where,
+                )
+            for query_index, i in enumerate(needs_vector):
+                vector_results = _format_query_results(query_results, query_index)
+                results[i] = vector_results if mode == "vector" else _fuse(vector_results, hits[i], k, lexical_chunks)
+
+        for i in pending:
+            search_result_cache.set(cache_keys[i], results[i])
+
+    return [[dict(chunk) for chunk in chunks] for chunks in results]
+
+
+def _load_manifest() -> dict:
+    """Load the knowledge directory manifest (file name -> size, mtime, doc_hash)."""
+    try:
+        return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Error reading manifest {MANIFEST_PATH}: {e}")
+        return {}
+
+
+def _save_manifest(manifest: dict) -> None:
+    """Atomically write the manifest next to the vector database."""
+    VECTOR_DB_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_name(MANIFEST_PATH.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+# Progress of the startup reconciliation, reported by GET /knowledge/ingestion_status
+_ingestion_status = {
+    "state": "idle",  # 'idle', 'running', 'done' or 'failed'
+    "total": 0,
+    "processed": 0,
+    "added": 0,
+    "updated": 0,
+    "unchanged": 0,
+    "removed": 0,
+    "errors": 0,
+    "started_at": None,
+    "finished_at": None,
+}
+_ingestion_status_lock = threading.Lock()
+_ingestion_run_lock = threading.Lock()
+
+
+def _update_ingestion_status(**fields) -> None:
+    with _ingestion_status_lock:
+        _ingestion_status.update(fields)
+
+
+def get_ingestion_status() -> dict:
+    """Return a snapshot of the startup reconciliation progress."""
+    with _ingestion_status_lock:
+        return dict(_ingestion_status)
+
+
+def load_existing_files() -> dict:
+    """Reconcile .txt files in the knowledge directory with the vector store.
+
+    Only new or changed files are embedded, and vectors of files that were removed
+    from the directory are deleted. A manifest of size, mtime and content hash per
+    file is used to skip unchanged files without reading them. Safe to run in a
+    background thread; concurrent calls return the status of the running pass.
+    """
+    if not _ingestion_run_lock.acquire(blocking=False):
+        return get_ingestion_status()
+
+    try:
+        if not KNOWLEDGE_DIR.exists():
+            KNOWLEDGE_DIR.mkdir(parents=True, exist_ok=True)
+
+        files = sorted(KNOWLEDGE_DIR.glob("*.txt"))
+        manifest = _load_manifest()
+        new_manifest = {}
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "errors": 0}
+
+        _update_ingestion_status(
+            state="running",
+            total=len(files),
+            processed=0,
+            started_at=time.time(),
+            finished_at=None,
+            **counts,
+        )
+
+        for processed, file_path in enumerate(files, start=1):
+            name = file_path.name
+            entry = manifest.get(name)
+            try:
+                stat = file_path.stat()
+                if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                    new_manifest[name] = entry
+                    counts["unchanged"] += 1
+                else:
+                    content = file_path.read_text(encoding="utf-8")
+                    doc_hash = _get_content_hash(content)
+                    if entry and entry["doc_hash"] == doc_hash:
+                        counts["unchanged"] += 1
+                    elif entry is None and document_exists(doc_hash):
+                        # Already embedded before the manifest existed
+                        counts["unchanged"] += 1
+                    else:
+                        add_documents([(content, name, doc_hash)])
+                        counts["updated" if entry else "added"] += 1
+                    new_manifest[name] = {
+                        "size": stat.st_size,
+                        "mtime": stat.st_mtime_ns,
+                        "doc_hash": doc_hash,
+                    }
+            except Exception as e:
+                print(f"Error loading {file_path}: {e}")
+                counts["errors"] += 1
+                if entry:
+                    # Keep the old entry so its vectors are not treated as orphaned
+                    new_manifest[name] = entry
+
+            _update_ingestion_status(processed=processed, **counts)
+            if processed % MANIFEST_SAVE_EVERY == 0:
+                _save_manifest({**manifest, **new_manifest})
+
+        # Remove vectors of deleted or changed files, unless another file still has the same content
+        live_hashes = {entry["doc_hash"] for entry in new_manifest.values()}
+        stale_hashes = {entry["doc_hash"] for entry in manifest.values()} - live_hashes
+        for doc_hash in stale_hashes:
+            try:
+                if delete_document(doc_hash):
+                    counts["removed"] += 1
+            except Exception as e:
+                print(f"Error removing document {doc_hash}: {e}")
+                counts["errors"] += 1
+
+        _save_manifest(new_manifest)
+        _update_ingestion_status(state="done", finished_at=time.time(), **counts)
+    except Exception as e:
+        print(f"Error reconciling knowledge directory: {e}")
+        _update_ingestion_status(state="failed", finished_at=time.time())
+    finally:
+        _ingestion_run_lock.release()
+
+    return get_ingestion_status()
 
 
 def delete_document(doc_hash: str) -> bool:
     """Delete a document and all its chunks from the vector store by hash."""
-    existing = collection.get(where={"doc_hash": doc_hash})
-    if existing["ids"]:
-        collection.delete(ids=existing["ids"])
+    registry = _get_registry()
+    # Take the same claim as ingestion, so chunks an in-flight ingest of this document is
+    # still writing can't outlive its registry row
+    future, owner = _claim_document(doc_hash)
+    while not owner:
+        try:
+            future.result()
+        except Exception:
+            pass  # the ingest failed; whatever it left is handled below or by startup repair
+        future, owner = _claim_document(doc_hash)
+    try:
+        record = registry.mark_deleting(doc_hash)
+        if record is None:
+            return False
+        _delete_ids(_chunk_ids(doc_hash, record["chunk_count"]))
+        registry.remove(doc_hash)
+        _update_lexical_index(removed_docs=[doc_hash])
+        _bump_kb_version([doc_hash])
         return True
-    return False
+    finally:
+        # Threads waiting on the claim check the registry for the outcome themselves
+        _release_document(doc_hash, future)
 
 
 def document_exists(doc_hash: str) -> bool:
     """Check if a document with the given hash exists."""
-    existing = collection.get(where={"doc_hash": doc_hash})
-    return len(existing["ids"]) > 0
+    return _get_registry().exists(doc_hash)
 
 
 def list_documents() -> List[str]:
     """List all unique document hashes in the vector store."""
-    all_docs = collection.get()
-    unique_hashes = set()
-    if all_docs["metadatas"]:
-        for metadata in all_docs["metadatas"]:
-            if metadata and "doc_hash" in metadata:
-                unique_hashes.add(metadata["doc_hash"])
-    return sorted(list(unique_hashes))
+    return [record["doc_hash"] for record in _get_registry().list(sort_by="doc_hash", descending=False)]
+
 
+def list_document_records(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    sort_by: str = "ingested_at",
+    descending: bool = True,
+) -> Tuple[List[DocumentRecord], int]:
+    """Return a page of document records and the total number of documents."""
+    registry = _get_registry()
+    return registry.list(limit=limit, offset=offset, sort_by=sort_by, descending=descending), registry.count()
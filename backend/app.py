@@ -1,8 +1,29 @@
-from fastapi import FastAPI
+import logging
+import os
+import threading
+import time
+
+from fastapi import FastAPI, Response
 from backend.routers.chat import chat_router
 from backend.routers.knowledge import knowledge_router
-from backend.db import init_db
-from ai.vector_store import load_existing_files
+from backend.db import (
+    CHAT_ARCHIVE_AFTER_DAYS,
+    CHAT_ARCHIVE_INTERVAL_SECONDS,
+    archive_idle_sessions,
+    close_session_cache,
+    init_db,
+)
+from backend.jobs import resume_jobs
+from ai.agents import get_kb_agent
+from ai.metrics import render_metrics
+from ai.vector_store import get_ingestion_status, is_maintenance_owner, load_existing_files, warm_up
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Q&A Agent API")
 
@@ -10,10 +31,71 @@ app = FastAPI(title="Q&A Agent API")
 app.include_router(chat_router)
 app.include_router(knowledge_router)
 
+# Warm-up progress reported by GET /ready
+_readiness = {"ready": False, "error": None, "warmup_seconds": None}
+
+
+def _warm_up_and_reconcile() -> None:
+    """Create clients and indexes ahead of the first request, then reconcile knowledge files."""
+    started = time.perf_counter()
+    try:
+        warm_up()
+        get_kb_agent()
+        _readiness.update(ready=True, warmup_seconds=time.perf_counter() - started)
+    except Exception as e:
+        print(f"Error warming up: {e}")
+        _readiness["error"] = str(e)
+    if is_maintenance_owner():
+        load_existing_files()
+
+
+def _archive_idle_sessions_periodically() -> None:
+    """Move idle chat sessions to the archive every CHAT_ARCHIVE_INTERVAL_SECONDS."""
+    while True:
+        try:
+            archived = archive_idle_sessions()
+            if archived:
+                logger.info("Archived %d chat sessions idle for %g days", archived, CHAT_ARCHIVE_AFTER_DAYS)
+        except Exception:
+            logger.exception("Archiving idle chat sessions failed")
+        time.sleep(CHAT_ARCHIVE_INTERVAL_SECONDS)
+
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database and load knowledge files on startup."""
+    """Initialize database, resume ingestion jobs, then warm up and reconcile knowledge files in the background.
+
+    With several workers, only the one holding the vector store's maintenance lock
+    resumes jobs, reconciles knowledge files and archives idle chat sessions.
+    """
     init_db()
-    load_existing_files()
+    if is_maintenance_owner():
+        resume_jobs()
+        if CHAT_ARCHIVE_AFTER_DAYS > 0:
+            threading.Thread(target=_archive_idle_sessions_periodically, name="chat-archiver", daemon=True).start()
+    # Warm-up and reconciliation can take a while; serve traffic meanwhile
+    threading.Thread(target=_warm_up_and_reconcile, name="warm-up", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Write chat messages still waiting in the session cache."""
+    close_session_cache()
+
+
+@app.get("/ready")
+def readiness(response: Response):
+    """Report whether warm-up has finished. Returns 503 until it has."""
+    if not _readiness["ready"]:
+        response.status_code = 503
+    return {**_readiness, "ingestion": get_ingestion_status()["state"]}
+
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: per-stage latency histograms, request, token and tool-call counters."""
+    rendered = render_metrics()
+    if rendered is None:
+        return Response("prometheus_client is not installed\n", status_code=503, media_type="text/plain")
+    body, content_type = rendered
+    return Response(body, media_type=content_type)
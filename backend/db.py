@@ -1,16 +1,72 @@
+"""Chat sessions, messages and ingestion jobs in SQLite.
+
+Messages of recently used sessions are also kept in an in-memory LRU
+(``CHAT_CACHE_SESSIONS``): reads of a cached session never touch SQLite, and new
+messages are appended in memory and stored by a background writer in batched
+transactions, at most ``CHAT_FLUSH_INTERVAL_SECONDS`` later. IDs for those messages
+come from blocks reserved in ``sqlite_sequence``, so they are final as soon as the
+message is added. ``close_session_cache`` stores whatever is still pending; it is
+called on shutdown and at interpreter exit.
+
+The cache belongs to one process: with several API workers, a chat served by more
+than one of them would read stale history and get message IDs out of order. It is
+therefore off by default when a multi-worker setup is configured (a shared Chroma
+server, or ``WEB_CONCURRENCY`` above 1); without it SQLite is read and written directly.
+"""
+
+import atexit
+import bisect
+import json
+import logging
+import os
 import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from pathlib import Path
-from typing import Literal, TypedDict, List
+from typing import Literal, Optional, TypedDict, List
+
+logger = logging.getLogger(__name__)
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "chat_history.db"
+DB_PATH = Path(os.getenv("CHAT_DB_PATH", BASE_DIR / "chat_history.db"))
+
+# Sessions without activity for this many days are moved to the archive (0 disables)
+CHAT_ARCHIVE_AFTER_DAYS = float(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "30"))
+CHAT_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("CHAT_ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# Several worker processes share the chat database
+_MULTI_WORKER = bool(os.getenv("CHROMA_SERVER_HOST")) or int(os.getenv("WEB_CONCURRENCY", "1")) > 1
+
+# Sessions whose messages are kept in memory (0 disables the cache)
+CHAT_CACHE_SESSIONS = int(os.getenv("CHAT_CACHE_SESSIONS", "0" if _MULTI_WORKER else "1000"))
+# Longest a new message waits in memory before it is written
+CHAT_FLUSH_INTERVAL_SECONDS = float(os.getenv("CHAT_FLUSH_INTERVAL_SECONDS", "0.2"))
+# A flush starts early once this many messages are waiting
+CHAT_FLUSH_BATCH_SIZE = 500
+
+# Message IDs reserved from SQLite at a time for messages added through the cache
+MESSAGE_ID_BLOCK = 1000
+
+_local = threading.local()
 
 
 def get_connection() -> sqlite3.Connection:
-    """Return a SQLite connection, creating the DB file if needed."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Return this thread's SQLite connection, creating the DB file if needed.
+
+    Connections are reused per thread and use WAL journaling, so readers don't block
+    the writer. Use as ``with get_connection() as conn:`` to commit or roll back.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.path = DB_PATH
     return conn
 
 
@@ -21,10 +77,22 @@ def init_db() -> None:
             """
             CREATE TABLE IF NOT EXISTS sessions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_active_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             """
         )
+        # Databases created before sessions tracked their last activity
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(sessions)")}
+        if "last_active_at" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN last_active_at TIMESTAMP")
+            conn.execute(
+                """
+                UPDATE sessions SET last_active_at = COALESCE(
+                    (SELECT MAX(created_at) FROM messages WHERE session_id = sessions.id), created_at
+                )
+                """
+            )
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS messages (
@@ -37,13 +105,71 @@ def init_db() -> None:
             )
             """
         )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,         -- 'queued', 'running', 'done' or 'failed'
+                payload_path TEXT NOT NULL,
+                documents INTEGER NOT NULL DEFAULT 0,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                doc_hashes TEXT,             -- JSON list, set when done
+                error TEXT,
+                embed_seconds REAL,
+                write_seconds REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner TEXT,                  -- worker running the job, "<pid>-<random>"
+                heartbeat_at REAL            -- last time the owner reported it alive
+            )
+            """
+        )
+        # Databases created before running jobs recorded their owner
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(ingestion_jobs)")}
+        if "owner" not in columns:
+            conn.execute("ALTER TABLE ingestion_jobs ADD COLUMN owner TEXT")
+            conn.execute("ALTER TABLE ingestion_jobs ADD COLUMN heartbeat_at REAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_summaries (
+                session_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                summarized_upto_id INTEGER NOT NULL,  -- last message ID folded into the summary
+                summarized_tokens INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archived_sessions (
+                session_id INTEGER PRIMARY KEY,
+                message_count INTEGER NOT NULL,
+                payload BLOB NOT NULL,       -- zlib-compressed JSON of the messages and summary
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id, id)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions (created_at)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_last_active_at ON sessions (last_active_at)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_state ON ingestion_jobs (state, created_at)"
+        )
         conn.commit()
 
 
 def create_session() -> int:
     """Start a new chat session and return its ID."""
     with get_connection() as conn:
-        cursor = conn.execute("INSERT INTO sessions DEFAULT VALUES")
+        cursor = conn.execute("INSERT INTO sessions (last_active_at) VALUES (CURRENT_TIMESTAMP)")
         conn.commit()
         return int(cursor.lastrowid)
 
@@ -53,14 +179,31 @@ Role = Literal["user", "assistant"]
 
 def add_message(session_id: int, role: Role, content: str) -> None:
     """Persist a single message for a session. Auto-creates the session if it doesn't exist."""
+    add_messages(session_id, [(role, content)])
+
+
+def add_messages(session_id: int, messages: List[tuple[Role, str]]) -> None:
+    """Persist several (role, content) messages for a session in one transaction.
+
+    Auto-creates the session if it doesn't exist, and restores it if it was archived.
+    With the session cache the messages are stored by its background writer.
+    """
+    cache = _get_session_cache()
+    if cache is not None:
+        cache.append(session_id, messages)
+        return
     with get_connection() as conn:
-        # Auto-create session if it doesn't exist (check in same connection to avoid extra query)
-        cursor = conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,))
-        if cursor.fetchone() is None:
-            conn.execute("INSERT INTO sessions (id) VALUES (?)", (session_id,))
+        _restore_session(conn, session_id)
         conn.execute(
+            """
+            INSERT INTO sessions (id, last_active_at) VALUES (?, CURRENT_TIMESTAMP)
+            ON CONFLICT (id) DO UPDATE SET last_active_at = excluded.last_active_at
+            """,
+            (session_id,),
+        )
+        conn.executemany(
             "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
-            (session_id, role, content),
+            [(session_id, role, content) for role, content in messages],
         )
         conn.commit()
 
@@ -70,15 +213,99 @@ class Message(TypedDict):
     content: str
 
 
-def get_messages(session_id: int) -> list[Message]:
-    """Load all messages for a given session, ordered by time."""
+class StoredMessage(Message):
+    id: int
+
+
+def get_messages(
+    session_id: int, limit: Optional[int] = None, before_id: Optional[int] = None
+) -> list[StoredMessage]:
+    """Load messages of a session, ordered by time.
+
+    With a limit, only the most recent ``limit`` messages are returned; pass the ID of
+    the first one as before_id to get the page of messages before it.
+    """
+    cache = _get_session_cache()
+    if cache is not None:
+        return cache.get_messages(session_id, limit, before_id)
+    query = "SELECT id, role, content FROM messages WHERE session_id = ?"
+    params: list = [session_id]
+    if before_id is not None:
+        query += " AND id < ?"
+        params.append(before_id)
+    with get_connection() as conn:
+        _restore_session(conn, session_id)
+        if limit is None:
+            rows = conn.execute(query + " ORDER BY id ASC", params).fetchall()
+        else:
+            # Newest first to use the index for the limit, then back to chronological order
+            rows = conn.execute(query + " ORDER BY id DESC LIMIT ?", params + [limit]).fetchall()[::-1]
+    return [StoredMessage(id=row["id"], role=row["role"], content=row["content"]) for row in rows]
+
+
+def get_messages_after(session_id: int, after_id: int = 0) -> list[StoredMessage]:
+    """Load messages of a session with an ID greater than after_id, ordered by time."""
+    cache = _get_session_cache()
+    if cache is not None:
+        return cache.get_messages_after(session_id, after_id)
     with get_connection() as conn:
+        _restore_session(conn, session_id)
         cursor = conn.execute(
-            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id ASC",
-            (session_id,),
+            "SELECT id, role, content FROM messages WHERE session_id = ? AND id > ? ORDER BY id ASC",
+            (session_id, after_id),
         )
         rows = cursor.fetchall()
-    return [Message(role=row["role"], content=row["content"]) for row in rows]
+    return [StoredMessage(id=row["id"], role=row["role"], content=row["content"]) for row in rows]
+
+
+class Summary(TypedDict):
+    summary: str
+    summarized_upto_id: int
+    summarized_tokens: int
+
+
+def get_summary(session_id: int) -> Summary | None:
+    """Return the rolling summary of a session's older messages, if any."""
+    cache = _get_session_cache()
+    if cache is not None:
+        return cache.get_summary(session_id)
+    with get_connection() as conn:
+        _restore_session(conn, session_id)
+        row = conn.execute(
+            "SELECT summary, summarized_upto_id, summarized_tokens FROM session_summaries WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+    if row is None:
+        return None
+    return Summary(
+        summary=row["summary"],
+        summarized_upto_id=row["summarized_upto_id"],
+        summarized_tokens=row["summarized_tokens"],
+    )
+
+
+def save_summary(session_id: int, summary: str, summarized_upto_id: int, summarized_tokens: int) -> None:
+    """Store the rolling summary covering all messages up to summarized_upto_id."""
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO session_summaries (session_id, summary, summarized_upto_id, summarized_tokens, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (session_id) DO UPDATE SET
+                summary = excluded.summary,
+                summarized_upto_id = excluded.summarized_upto_id,
+                summarized_tokens = excluded.summarized_tokens,
+                updated_at = excluded.updated_at
+            """,
+            (session_id, summary, summarized_upto_id, summarized_tokens),
+        )
+        conn.commit()
+    cache = _get_session_cache()
+    if cache is not None:
+        cache.set_summary(
+            session_id,
+            Summary(summary=summary, summarized_upto_id=summarized_upto_id, summarized_tokens=summarized_tokens),
+        )
 
 
 class Session(TypedDict):
@@ -86,13 +313,23 @@ class Session(TypedDict):
     created_at: str
 
 
-def list_sessions() -> List[Session]:
-    """Return all chat sessions."""
+def list_sessions(limit: Optional[int] = None, before: Optional[tuple[str, int]] = None) -> List[Session]:
+    """Return chat sessions, newest first.
+
+    With a limit, only the first ``limit`` sessions are returned; pass the (created_at,
+    id) of the last one as before to get the next page.
+    """
+    query = "SELECT id, created_at FROM sessions"
+    params: list = []
+    if before is not None:
+        query += " WHERE (created_at, id) < (?, ?)"
+        params.extend(before)
+    query += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
     with get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT id, created_at FROM sessions ORDER BY created_at DESC"
-        )
-        rows = cursor.fetchall()
+        rows = conn.execute(query, params).fetchall()
     return [Session(id=row["id"], created_at=row["created_at"]) for row in rows]
 
 
@@ -105,11 +342,432 @@ def session_exists(session_id: int) -> bool:
 
 def delete_session(session_id: int) -> bool:
     """Delete a chat session and all its messages. Returns True if session or messages existed."""
+    cache = _get_session_cache()
+    # Drop cached and pending messages first, so the writer can't store them afterwards
+    discarded = cache.discard(session_id) if cache is not None else False
     with get_connection() as conn:
         # Delete messages first (cascade), then session
         msg_cursor = conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
+        archive_cursor = conn.execute("DELETE FROM archived_sessions WHERE session_id = ?", (session_id,))
         session_cursor = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
         conn.commit()
         # Return True if either messages or session existed
-        return msg_cursor.rowcount > 0 or session_cursor.rowcount > 0
+        return discarded or msg_cursor.rowcount > 0 or archive_cursor.rowcount > 0 or session_cursor.rowcount > 0
+
+
+def _archive_session(conn: sqlite3.Connection, session_id: int, idle_days: float) -> bool:
+    """Move a session's messages and summary into the archive, if it is still idle.
+
+    Runs in its own immediate transaction, so a message added concurrently either
+    lands before the idle check (and the session is kept) or restores it afterwards.
+    """
+    # Messages written next to an existing archive (by an older version) are merged first
+    _restore_session(conn, session_id)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        idle = conn.execute(
+            "SELECT 1 FROM sessions WHERE id = ? AND last_active_at < datetime('now', ?)",
+            (session_id, f"-{idle_days} days"),
+        ).fetchone()
+        rows = conn.execute(
+            "SELECT id, role, content, created_at FROM messages WHERE session_id = ? ORDER BY id ASC",
+            (session_id,),
+        ).fetchall() if idle else []
+        if not rows:
+            conn.rollback()
+            return False
+        summary = conn.execute(
+            "SELECT summary, summarized_upto_id, summarized_tokens FROM session_summaries WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        payload = {
+            "messages": [[row["id"], row["role"], row["content"], row["created_at"]] for row in rows],
+            "summary": dict(summary) if summary is not None else None,
+        }
+        conn.execute(
+            "INSERT INTO archived_sessions (session_id, message_count, payload) VALUES (?, ?, ?)",
+            (session_id, len(rows), zlib.compress(json.dumps(payload).encode("utf-8"))),
+        )
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
+        conn.commit()
+        return True
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _restore_session(conn: sqlite3.Connection, session_id: int) -> None:
+    """Move an archived session back into the hot tables, keeping its message IDs.
+
+    Called before every read or write of a session's messages, so archival is
+    invisible to callers. Costs one primary-key lookup for sessions that aren't archived.
+    """
+    if conn.execute("SELECT 1 FROM archived_sessions WHERE session_id = ?", (session_id,)).fetchone() is None:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another connection may have restored it meanwhile
+        row = conn.execute("SELECT payload FROM archived_sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is not None:
+            payload = json.loads(zlib.decompress(row["payload"]))
+            conn.executemany(
+                "INSERT INTO messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(id_, session_id, role, content, created_at) for id_, role, content, created_at in payload["messages"]],
+            )
+            if payload["summary"] is not None:
+                # A summary saved since, while the session was served from the cache, is newer
+                conn.execute(
+                    """
+                    INSERT OR IGNORE INTO session_summaries (session_id, summary, summarized_upto_id, summarized_tokens)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (session_id, payload["summary"]["summary"], payload["summary"]["summarized_upto_id"],
+                     payload["summary"]["summarized_tokens"]),
+                )
+            conn.execute("DELETE FROM archived_sessions WHERE session_id = ?", (session_id,))
+            # Restarts the idle clock, so a chat being read isn't archived again right away
+            conn.execute("UPDATE sessions SET last_active_at = CURRENT_TIMESTAMP WHERE id = ?", (session_id,))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def archive_idle_sessions(idle_days: float = CHAT_ARCHIVE_AFTER_DAYS) -> int:
+    """Archive the messages of sessions without activity for idle_days. Returns how many were archived.
+
+    Archived sessions keep their row in ``sessions``, so they are still listed, and are
+    restored on their next access. Their messages are stored compressed in
+    ``archived_sessions``, which keeps the ``messages`` table and its index, and so the
+    pages SQLite caches, down to recently active chats. Pending messages are written
+    first, and sessions are dropped from the session cache before they are archived;
+    sessions with messages added meanwhile are skipped.
+    """
+    cache = _get_session_cache()
+    if cache is not None:
+        cache.flush()
+    with get_connection() as conn:
+        session_ids = [
+            row["id"]
+            for row in conn.execute(
+                """
+                SELECT id FROM sessions
+                WHERE last_active_at < datetime('now', ?)
+                AND EXISTS (SELECT 1 FROM messages WHERE session_id = sessions.id)
+                """,
+                (f"-{idle_days} days",),
+            )
+        ]
+        return sum(
+            _archive_session(conn, session_id, idle_days)
+            for session_id in session_ids
+            if cache is None or cache.evict(session_id)
+        )
+
+
+def _reserve_message_ids(count: int) -> int:
+    """Reserve count message IDs in SQLite's AUTOINCREMENT counter. Returns the first one.
+
+    Inserts without an explicit ID, in this or another process, continue after the
+    reserved range.
+    """
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'messages'").fetchone()
+            if row is None:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('messages', ?)", (count,))
+                first = 1
+            else:
+                conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'messages'", (row["seq"] + count,))
+                first = row["seq"] + 1
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return first
+
+
+def _read_session(session_id: int) -> tuple[list[StoredMessage], Summary | None]:
+    """Load all messages and the summary of a session from SQLite, restoring it if archived."""
+    with get_connection() as conn:
+        _restore_session(conn, session_id)
+        rows = conn.execute(
+            "SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id ASC", (session_id,)
+        ).fetchall()
+        summary = conn.execute(
+            "SELECT summary, summarized_upto_id, summarized_tokens FROM session_summaries WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+    messages = [StoredMessage(id=row["id"], role=row["role"], content=row["content"]) for row in rows]
+    return messages, Summary(**summary) if summary is not None else None
+
+
+def _write_messages(pending: list[tuple]) -> None:
+    """Store (id, session_id, role, content, created_at, queued_at) messages in one transaction."""
+    last_active = {}
+    for _, session_id, _, _, created_at, _ in pending:
+        last_active[session_id] = created_at
+    with get_connection() as conn:
+        # New messages of an archived session join its history instead of starting a new one
+        for session_id in last_active:
+            _restore_session(conn, session_id)
+        conn.executemany(
+            """
+            INSERT INTO sessions (id, created_at, last_active_at) VALUES (?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET last_active_at = excluded.last_active_at
+            """,
+            [(session_id, created_at, created_at) for session_id, created_at in last_active.items()],
+        )
+        conn.executemany(
+            "INSERT INTO messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            [message[:5] for message in pending],
+        )
+        conn.commit()
+
+
+class _CachedSession:
+    __slots__ = ("messages", "summary")
+
+    def __init__(self, messages: list[StoredMessage], summary: Summary | None):
+        self.messages = messages
+        self.summary = summary
+
+
+class SessionCache:
+    """LRU of hot sessions' messages and summaries, with write-behind of new messages.
+
+    New messages are appended to the cached session, if it is cached, and queued for
+    the writer thread, which stores them in one transaction per batch. A session loaded
+    while some of its messages are still queued gets them merged in, so eviction never
+    hides an unwritten message.
+    """
+
+    def __init__(self, max_sessions: int, flush_interval: float = CHAT_FLUSH_INTERVAL_SECONDS):
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.last_flush_lag = 0.0
+        self.max_flush_lag = 0.0
+        self._sessions: OrderedDict[int, _CachedSession] = OrderedDict()
+        # (id, session_id, role, content, created_at, queued_at), in ID order
+        self._pending: list[tuple] = []
+        self._next_id = 0
+        self._reserved_until = -1
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Held while a batch is written and while a session is loaded, so a load never
+        # misses messages that are neither pending nor visible in SQLite yet
+        self._flush_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _session(self, session_id: int) -> _CachedSession:
+        with self._lock:
+            cached = self._sessions.get(session_id)
+            if cached is not None:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        with self._flush_lock:
+            messages, summary = _read_session(session_id)
+            with self._lock:
+                cached = self._sessions.get(session_id)
+                if cached is not None:  # loaded by another thread meanwhile
+                    return cached
+                stored = {message["id"] for message in messages}
+                messages.extend(
+                    StoredMessage(id=id_, role=role, content=content)
+                    for id_, pending_session_id, role, content, _, _ in self._pending
+                    if pending_session_id == session_id and id_ not in stored
+                )
+                cached = self._sessions[session_id] = _CachedSession(messages, summary)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                return cached
+
+    def get_messages(
+        self, session_id: int, limit: Optional[int] = None, before_id: Optional[int] = None
+    ) -> list[StoredMessage]:
+        cached = self._session(session_id)
+        with self._lock:
+            messages = cached.messages
+            end = len(messages) if before_id is None else bisect.bisect_left(messages, before_id, key=_message_id)
+            start = 0 if limit is None else max(0, end - limit)
+            return messages[start:end]
+
+    def get_messages_after(self, session_id: int, after_id: int) -> list[StoredMessage]:
+        cached = self._session(session_id)
+        with self._lock:
+            return cached.messages[bisect.bisect_right(cached.messages, after_id, key=_message_id):]
+
+    def get_summary(self, session_id: int) -> Summary | None:
+        return self._session(session_id).summary
+
+    def set_summary(self, session_id: int, summary: Summary) -> None:
+        with self._lock:
+            cached = self._sessions.get(session_id)
+            if cached is not None:
+                cached.summary = summary
+
+    def append(self, session_id: int, messages: List[tuple[Role, str]]) -> None:
+        """Add messages to the session in memory and queue them for the writer.
+
+        Once the cache is closed, messages are written right away instead.
+        """
+        created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        queued_at = time.monotonic()
+        with self._lock:
+            # IDs are taken under the lock, so they grow in the order messages are added
+            if self._next_id + len(messages) - 1 > self._reserved_until:
+                count = max(MESSAGE_ID_BLOCK, len(messages))
+                self._next_id = _reserve_message_ids(count)
+                self._reserved_until = self._next_id + count - 1
+            batch = []
+            for role, content in messages:
+                batch.append((self._next_id, session_id, role, content, created_at, queued_at))
+                self._next_id += 1
+            cached = self._sessions.get(session_id)
+            if cached is not None:
+                cached.messages.extend(
+                    StoredMessage(id=id_, role=role, content=content) for id_, _, role, content, _, _ in batch
+                )
+            if not self._closed:
+                self._pending.extend(batch)
+                self._start_writer()
+                self._wakeup.notify()
+                return
+        _write_messages(batch)
+
+    def evict(self, session_id: int) -> bool:
+        """Drop a session from the cache, unless it has pending messages. Returns True if dropped."""
+        with self._lock:
+            if any(message[1] == session_id for message in self._pending):
+                return False
+            self._sessions.pop(session_id, None)
+            return True
+
+    def discard(self, session_id: int) -> bool:
+        """Forget a session's cached and pending messages. Returns True if it had pending ones."""
+        with self._flush_lock, self._lock:
+            self._sessions.pop(session_id, None)
+            kept = [message for message in self._pending if message[1] != session_id]
+            discarded = len(kept) < len(self._pending)
+            self._pending = kept
+            return discarded
+
+    def flush(self) -> int:
+        """Write all pending messages in one transaction. Returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+            _write_messages(batch)
+            with self._lock:
+                # Messages are only appended or discarded (under _flush_lock) meanwhile
+                del self._pending[:len(batch)]
+                lag = time.monotonic() - batch[0][5]
+                self.last_flush_lag = lag
+                self.max_flush_lag = max(self.max_flush_lag, lag)
+                self.flushes += 1
+                self.flushed_messages += len(batch)
+            return len(batch)
+
+    def _start_writer(self) -> None:
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._run_writer, name="chat-writer", daemon=True)
+            self._writer.start()
+
+    def _run_writer(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                # Give the batch until the oldest message is due to fill up
+                while len(self._pending) < CHAT_FLUSH_BATCH_SIZE and not self._closed:
+                    remaining = self._pending[0][5] + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing %d chat messages failed, retrying", len(self._pending))
+                time.sleep(self.flush_interval)
+
+    def close(self) -> None:
+        """Stop the writer and write whatever is still pending. Later appends are written directly."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            writer = self._writer
+        if writer is not None and writer is not threading.current_thread():
+            writer.join()
+        written = self.flush()
+        if written:
+            logger.info("Wrote %d pending chat messages on shutdown", written)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters, the number of cached sessions and the write-behind lag."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "pending_messages": len(self._pending),
+                # Age of the oldest message not written yet
+                "flush_lag_seconds": time.monotonic() - self._pending[0][5] if self._pending else 0.0,
+                "last_flush_lag_seconds": self.last_flush_lag,
+                "max_flush_lag_seconds": self.max_flush_lag,
+                "flushes": self.flushes,
+                "flushed_messages": self.flushed_messages,
+            }
+
+
+def _message_id(message: StoredMessage) -> int:
+    return message["id"]
+
+
+_session_cache: Optional[SessionCache] = None
+_session_cache_lock = threading.Lock()
+
+
+def _get_session_cache() -> Optional[SessionCache]:
+    """Return the process's session cache, creating it on first use, or None if disabled."""
+    global _session_cache
+    if _session_cache is None and CHAT_CACHE_SESSIONS > 0:
+        with _session_cache_lock:
+            if _session_cache is None:
+                _session_cache = SessionCache(CHAT_CACHE_SESSIONS)
+                atexit.register(_session_cache.close)
+    return _session_cache
+
+
+def close_session_cache() -> None:
+    """Write pending messages and drop the session cache. Safe to call more than once."""
+    global _session_cache
+    with _session_cache_lock:
+        cache, _session_cache = _session_cache, None
+    if cache is not None:
+        cache.close()
+
 
+def get_session_cache_stats() -> dict:
+    """Return the session cache's statistics, or only ``enabled: False`` if it is disabled."""
+    cache = _get_session_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -0,0 +1,90 @@
+"""Token-budgeted conversation history with rolling summaries.
+
+The most recent messages of a session are sent to the agent verbatim as long as they
+fit in ``HISTORY_TOKEN_BUDGET``. Older messages are folded into a per-session summary
+stored in the ``session_summaries`` table. The summary is updated incrementally: only
+messages newer than the last folded message are ever read or summarized.
+"""
+
+import asyncio
+import logging
+import os
+
+from ai.agents import asummarize_conversation
+from ai.metrics import span
+from ai.tokens import count_tokens
+from backend.db import get_messages_after, get_summary, save_summary
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+
+# When history overflows, fold old messages until the verbatim part fits in this share
+# of the budget, so the summary isn't regenerated on every turn
+HISTORY_KEEP_RATIO = 0.5
+
+# Approximate per-message overhead of the chat format
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + _MESSAGE_OVERHEAD_TOKENS
+
+
+async def build_history(session_id: int) -> tuple[list[dict], dict]:
+    """Return the messages to send as history for a session, plus token statistics."""
+    with span("get_messages"):
+        stored_summary = await asyncio.to_thread(get_summary, session_id)
+        summary = stored_summary["summary"] if stored_summary else ""
+        upto_id = stored_summary["summarized_upto_id"] if stored_summary else 0
+        summarized_tokens = stored_summary["summarized_tokens"] if stored_summary else 0
+
+        messages = await asyncio.to_thread(get_messages_after, session_id, upto_id)
+    tokens = [_message_tokens(message) for message in messages]
+    verbatim_tokens = sum(tokens)
+
+    if verbatim_tokens > HISTORY_TOKEN_BUDGET:
+        keep_budget = int(HISTORY_TOKEN_BUDGET * HISTORY_KEEP_RATIO)
+        cut = 0
+        while cut < len(messages) - 1 and verbatim_tokens > keep_budget:
+            verbatim_tokens -= tokens[cut]
+            cut += 1
+
+        folded = messages[:cut]
+        summary = await asummarize_conversation(summary, folded)
+        summarized_tokens += sum(tokens[:cut])
+        with span("sqlite_write"):
+            await asyncio.to_thread(save_summary, session_id, summary, folded[-1]["id"], summarized_tokens)
+        messages = messages[cut:]
+
+    history = []
+    summary_tokens = 0
+    if summary:
+        history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        summary_tokens = _message_tokens(history[0])
+    history.extend({"role": message["role"], "content": message["content"]} for message in messages)
+
+    stats = {
+        "history_tokens": summary_tokens + verbatim_tokens,
+        "summary_tokens": summary_tokens,
+        "verbatim_tokens": verbatim_tokens,
+        "full_history_tokens": summarized_tokens + verbatim_tokens,
+        "verbatim_messages": len(messages),
+    }
+    return history, stats
+
+
+def log_token_usage(session_id: int, history_stats: dict, usage: dict) -> None:
+    """Log the history size and the tokens the agent consumed for one request."""
+    logger.info(
+        "chat tokens session=%s history=%d (summary=%d verbatim=%d, full=%d) "
+        "input=%d output=%d llm_calls=%d",
+        session_id,
+        history_stats["history_tokens"],
+        history_stats["summary_tokens"],
+        history_stats["verbatim_tokens"],
+        history_stats["full_history_tokens"],
+        usage["input_tokens"],
+        usage["output_tokens"],
+        usage["llm_calls"],
+    )
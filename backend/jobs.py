@@ -0,0 +1,354 @@
+"""Background ingestion job queue.
+
+Uploads are written to a payload file and recorded in the ``ingestion_jobs`` table,
+then chunked, embedded and stored by a small worker pool. Jobs that were queued or
+running when the process stopped are resumed on startup.
+
+A worker that claims a job records itself as the job's owner and refreshes a heartbeat
+while it runs. Several API workers share the table, so a running job is only re-queued
+once its owner is gone: its process no longer exists, or its heartbeat is older than
+INGEST_JOB_STALE_SECONDS. Failed jobs, like finished ones, have their payload removed.
+
+A payload line holds either a document's content, or a reference to an upload spooled
+to its own file, which is read back incrementally so large files never sit in memory.
+"""
+
+import codecs
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, TypedDict
+
+from ai.vector_store import add_document_stream, add_documents
+from backend.db import get_connection
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+JOBS_DIR = Path(os.getenv("INGEST_JOBS_DIR", BASE_DIR / "ingest_jobs"))
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+# How often a worker refreshes the heartbeat of its running jobs and looks for abandoned ones
+INGEST_HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", "10"))
+# A running job whose heartbeat is older than this is re-queued
+INGEST_JOB_STALE_SECONDS = float(os.getenv("INGEST_JOB_STALE_SECONDS", "60"))
+
+# Bytes read per step when streaming a spooled upload
+UPLOAD_READ_BYTES = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_heartbeat_thread: Optional[threading.Thread] = None
+_init_lock = threading.Lock()
+# (pid, worker ID): regenerated in a forked child, which must not inherit its parent's jobs
+_worker: Optional[Tuple[int, str]] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _heartbeat_thread
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+                _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name="ingest-heartbeat", daemon=True)
+                _heartbeat_thread.start()
+    return _executor
+
+
+def _worker_id() -> str:
+    """Return the owner ID this process records on the jobs it claims."""
+    global _worker
+    pid = os.getpid()
+    if _worker is None or _worker[0] != pid:
+        _worker = (pid, f"{pid}-{uuid.uuid4().hex[:8]}")
+    return _worker[1]
+
+
+class Job(TypedDict):
+    id: str
+    state: str
+    documents: int
+    chunks: int
+    doc_hashes: list[str]
+    error: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    queue_seconds: Optional[float]
+    embed_seconds: Optional[float]
+    write_seconds: Optional[float]
+    run_seconds: Optional[float]
+    chunks_per_second: Optional[float]
+
+
+def enqueue_documents(documents: Iterable[Tuple[str, ...]]) -> str:
+    """Persist (content, file_name) documents as a job payload and queue it. Returns the job ID.
+
+    A document may carry its content hash as a third element, if the caller computed it.
+    """
+    job_id = uuid.uuid4().hex
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    payload_path = JOBS_DIR / f"{job_id}.jsonl"
+
+    count = 0
+    with payload_path.open("w", encoding="utf-8") as payload:
+        for content, file_name, *doc_hash in documents:
+            record = {"content": content, "file_name": file_name}
+            if doc_hash:
+                record["doc_hash"] = doc_hash[0]
+            payload.write(json.dumps(record) + "\n")
+            count += 1
+
+    _queue_job(job_id, payload_path, count)
+    return job_id
+
+
+def new_upload_path() -> Path:
+    """Return a fresh path to spool an upload to before it is queued with enqueue_upload."""
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    return JOBS_DIR / f"{uuid.uuid4().hex}.upload"
+
+
+def enqueue_upload(upload_path: Path, file_name: Optional[str], doc_hash: str, size_bytes: int) -> str:
+    """Queue a spooled UTF-8 upload for streaming ingestion. Returns the job ID.
+
+    doc_hash is the MD5 of the file's bytes, computed while it was received.
+    """
+    job_id = uuid.uuid4().hex
+    payload_path = JOBS_DIR / f"{job_id}.jsonl"
+    record = {
+        "upload_path": str(upload_path),
+        "file_name": file_name or f"doc_{doc_hash[:8]}.txt",
+        "doc_hash": doc_hash,
+        "size_bytes": size_bytes,
+    }
+    payload_path.write_text(json.dumps(record) + "\n", encoding="utf-8")
+    _queue_job(job_id, payload_path, 1)
+    return job_id
+
+
+def _queue_job(job_id: str, payload_path: Path, count: int) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT INTO ingestion_jobs (id, state, payload_path, documents, created_at) "
+            "VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, str(payload_path), count, time.time()),
+        )
+        conn.commit()
+
+    _get_executor().submit(_run_job, job_id)
+
+
+def _read_payload(payload_path: str) -> Iterator[dict]:
+    with open(payload_path, encoding="utf-8") as payload:
+        for line in payload:
+            yield json.loads(line)
+
+
+def _read_upload(upload_path: str) -> Iterator[str]:
+    """Yield the text of a spooled upload in pieces."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(upload_path, "rb") as upload:
+        while block := upload.read(UPLOAD_READ_BYTES):
+            yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+def _ingest_payload(payload_path: str) -> dict:
+    """Ingest every document of a payload; inline documents are batched together."""
+    totals = {"documents": 0, "chunks": 0, "embed_seconds": 0.0, "write_seconds": 0.0, "doc_hashes": []}
+    for is_upload, records in itertools.groupby(_read_payload(payload_path), key=lambda r: "upload_path" in r):
+        if is_upload:
+            results = [
+                add_document_stream(
+                    _read_upload(record["upload_path"]), record["doc_hash"], record["file_name"], record["size_bytes"]
+                )
+                for record in records
+            ]
+        else:
+            results = [
+                add_documents((record["content"], record.get("file_name"), record.get("doc_hash")) for record in records)
+            ]
+        for stats in results:
+            for key in ("documents", "chunks", "embed_seconds", "write_seconds", "doc_hashes"):
+                totals[key] += stats[key]
+    return totals
+
+
+def _cleanup_payload(payload_path: str) -> None:
+    """Remove a payload file and the uploads it references."""
+    try:
+        for record in _read_payload(payload_path):
+            if "upload_path" in record:
+                Path(record["upload_path"]).unlink(missing_ok=True)
+    except FileNotFoundError:
+        return
+    Path(payload_path).unlink(missing_ok=True)
+
+
+def _run_job(job_id: str) -> None:
+    """Ingest a queued job's payload and record the outcome."""
+    now = time.time()
+    with get_connection() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE ingestion_jobs SET state = 'running', started_at = ?, owner = ?, heartbeat_at = ?
+            WHERE id = ? AND state = 'queued'
+            """,
+            (now, _worker_id(), now, job_id),
+        )
+        conn.commit()
+        if cursor.rowcount == 0:
+            return
+        row = conn.execute("SELECT payload_path FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
+
+    try:
+        stats = _ingest_payload(row["payload_path"])
+    except Exception as e:
+        logger.exception("Ingestion job %s failed", job_id)
+        with get_connection() as conn:
+            conn.execute(
+                "UPDATE ingestion_jobs SET state = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (str(e), time.time(), job_id),
+            )
+            conn.commit()
+        # Failed jobs are not retried, so their payload and uploads would only pile up
+        _cleanup_payload(row["payload_path"])
+        return
+
+    with get_connection() as conn:
+        conn.execute(
+            """
+            UPDATE ingestion_jobs
+            SET state = 'done', documents = ?, chunks = ?, doc_hashes = ?,
+                embed_seconds = ?, write_seconds = ?, finished_at = ?
+            WHERE id = ?
+            """,
+            (
+                stats["documents"],
+                stats["chunks"],
+                json.dumps(stats["doc_hashes"]),
+                stats["embed_seconds"],
+                stats["write_seconds"],
+                time.time(),
+                job_id,
+            ),
+        )
+        conn.commit()
+
+    # The payload is no longer needed once the chunks are stored
+    _cleanup_payload(row["payload_path"])
+
+
+def _owner_alive(owner: Optional[str], heartbeat_at: Optional[float]) -> bool:
+    """Whether the worker that claimed a running job is still running it."""
+    if owner == _worker_id():
+        return True
+    if owner is None or heartbeat_at is None or time.time() - heartbeat_at > INGEST_JOB_STALE_SECONDS:
+        return False
+    pid = int(owner.split("-", 1)[0])
+    if pid == os.getpid() or os.name == "nt":
+        # An earlier process with our PID, or Windows, where only one process is supported
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _requeue_abandoned() -> List[str]:
+    """Re-queue running jobs whose owner is gone. Returns their IDs."""
+    requeued = []
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT id, owner, heartbeat_at FROM ingestion_jobs WHERE state = 'running'"
+        ).fetchall()
+        for row in rows:
+            if _owner_alive(row["owner"], row["heartbeat_at"]):
+                continue
+            # Another worker may re-queue or claim the job meanwhile; only one update wins
+            cursor = conn.execute(
+                """
+                UPDATE ingestion_jobs SET state = 'queued', started_at = NULL, owner = NULL, heartbeat_at = NULL
+                WHERE id = ? AND state = 'running' AND owner IS ?
+                """,
+                (row["id"], row["owner"]),
+            )
+            if cursor.rowcount:
+                requeued.append(row["id"])
+        conn.commit()
+    if requeued:
+        logger.warning("Re-queued %d ingestion jobs abandoned by their worker", len(requeued))
+    return requeued
+
+
+def _heartbeat_loop() -> None:
+    """Refresh the heartbeat of this worker's running jobs and pick up abandoned ones."""
+    while True:
+        time.sleep(INGEST_HEARTBEAT_SECONDS)
+        try:
+            with get_connection() as conn:
+                conn.execute(
+                    "UPDATE ingestion_jobs SET heartbeat_at = ? WHERE state = 'running' AND owner = ?",
+                    (time.time(), _worker_id()),
+                )
+                conn.commit()
+            for job_id in _requeue_abandoned():
+                _get_executor().submit(_run_job, job_id)
+        except Exception:
+            logger.exception("Ingestion job heartbeat failed")
+
+
+def resume_jobs() -> int:
+    """Queue jobs left over by a restart. Returns the number of queued jobs.
+
+    Running jobs are only re-queued when their owner is gone; a job another live worker
+    is processing is left to it.
+    """
+    _requeue_abandoned()
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT id FROM ingestion_jobs WHERE state = 'queued' ORDER BY created_at ASC"
+        ).fetchall()
+
+    for row in rows:
+        _get_executor().submit(_run_job, row["id"])
+    # Starts the heartbeat, which keeps looking for jobs of workers that stop later
+    _get_executor()
+    return len(rows)
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    """Return the state, chunk counts and timings of a job, or None if it doesn't exist."""
+    with get_connection() as conn:
+        row = conn.execute("SELECT * FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+
+    started_at, finished_at = row["started_at"], row["finished_at"]
+    run_seconds = finished_at - started_at if started_at and finished_at else None
+    return Job(
+        id=row["id"],
+        state=row["state"],
+        documents=row["documents"],
+        chunks=row["chunks"],
+        doc_hashes=json.loads(row["doc_hashes"]) if row["doc_hashes"] else [],
+        error=row["error"],
+        created_at=row["created_at"],
+        started_at=started_at,
+        finished_at=finished_at,
+        queue_seconds=started_at - row["created_at"] if started_at else None,
+        embed_seconds=row["embed_seconds"],
+        write_seconds=row["write_seconds"],
+        run_seconds=run_seconds,
+        chunks_per_second=row["chunks"] / run_seconds if run_seconds else None,
+    )
@@ -1,79 +1,254 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import asyncio
+import json
+import time
 
-from ai.agents import kb_agent
-from backend.db import add_message, delete_session, get_messages, list_sessions, session_exists
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from ai.agents import astream_answer, get_kb_agent, usage_from_messages
+from ai.answer_cache import alookup_answer, astore_answer, get_answer_cache_stats
+from ai.metrics import annotate, get_callback_handler, span, track_request
+from ai.tools import collect_retrieved_sources
+from ai.vector_store import get_kb_version
+from backend.db import (
+    add_messages,
+    create_session,
+    delete_session,
+    get_messages,
+    get_session_cache_stats,
+    list_sessions,
+    session_exists,
+)
+from backend.history import build_history, log_token_usage
 
 chat_router = APIRouter(prefix="/chat", tags=["chat"])
 
 
 class ChatRequest(BaseModel):
     chat_id: int
+    # Page size, newest messages first; before_id pages back from the oldest message seen
+    limit: int = Field(100, ge=1, le=1000)
+    before_id: Optional[int] = None
 
 
 class ChatQuestionRequest(BaseModel):
     chat_id: int
     question: str
+    # Reuse the answer to a near-identical earlier question. Only for questions that
+    # stand on their own: follow-ups that depend on the chat history must leave it off.
+    use_answer_cache: bool = False
+
+
+def _session_cursor(session: dict) -> str:
+    return f"{session['created_at']}|{session['id']}"
+
+
+def _parse_session_cursor(cursor: str) -> tuple[str, int]:
+    created_at, _, session_id = cursor.rpartition("|")
+    if not created_at or not session_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, int(session_id)
 
 
 @chat_router.get("/list")
-def list_chat_sessions():
-    """List all chat sessions."""
-    return {"sessions": list_sessions()}
+def list_chat_sessions(limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    """List chat sessions, newest first, a page at a time.
+
+    Pass the returned next_cursor as cursor to get the next page; it is null on the last one.
+    """
+    sessions = list_sessions(limit + 1, _parse_session_cursor(cursor) if cursor else None)
+    next_cursor = _session_cursor(sessions[limit - 1]) if len(sessions) > limit else None
+    return {"sessions": sessions[:limit], "next_cursor": next_cursor}
+
+
+@chat_router.post("/new")
+def create_chat_session():
+    """Start a new chat session and return its ID."""
+    return {"chat_id": create_session()}
+
+
+@chat_router.get("/answer_cache_stats")
+def get_chat_answer_cache_stats():
+    """Report hit rate and size of the semantic answer cache."""
+    return get_answer_cache_stats()
+
+
+@chat_router.get("/history_cache_stats")
+def get_chat_history_cache_stats():
+    """Report hit rate, size and write-behind lag of the in-memory session history cache."""
+    return get_session_cache_stats()
 
 
 @chat_router.post("/get_messages")
 def get_chat_messages(payload: ChatRequest):
-    """List messages for a specific chat session."""
-    messages = get_messages(payload.chat_id)
-    if not messages:
+    """List the most recent messages of a chat session, in order.
+
+    Pass the returned next_before_id as before_id to get the messages before them; it is
+    null once the first message has been returned.
+    """
+    messages = get_messages(payload.chat_id, payload.limit + 1, payload.before_id)
+    if not messages and payload.before_id is None:
         raise HTTPException(
             status_code=404,
             detail="Chat not found or has no messages"
         )
-    return {"chat_id": payload.chat_id, "messages": messages}
+    has_more = len(messages) > payload.limit
+    messages = messages[-payload.limit:]
+    return {
+        "chat_id": payload.chat_id,
+        "messages": messages,
+        "next_before_id": messages[0]["id"] if has_more else None,
+    }
 
 
 @chat_router.post("/answer")
-def answer_chat_question(payload: ChatQuestionRequest):
+async def answer_chat_question(payload: ChatQuestionRequest):
     """Load history → use KB agent (LLM decides when to use KB tool) → get answer → store messages."""
 
-    history = get_messages(payload.chat_id)
+    with track_request("chat_answer"):
+        annotate(chat_id=payload.chat_id)
+        # Both can block: building the agent waits for warm-up, the version is read from SQLite
+        agent = await asyncio.to_thread(get_kb_agent)
+        kb_version = await asyncio.to_thread(get_kb_version)
 
-    agent = kb_agent
+        try:
+            if payload.use_answer_cache:
+                with span("answer_cache"):
+                    cached_reply = await alookup_answer(payload.question)
+                if cached_reply is not None:
+                    annotate(cached=True)
+                    with span("sqlite_write"):
+                        await asyncio.to_thread(
+                            add_messages, payload.chat_id, [("user", payload.question), ("assistant", cached_reply)]
+                        )
+                    return {
+                        "chat_id": payload.chat_id,
+                        "question": payload.question,
+                        "answer": cached_reply,
+                        "cached": True,
+                    }
 
-    messages = history + [
-        {"role": "user", "content": payload.question}
-    ]
+            # Recent turns verbatim, older turns as a rolling summary
+            history, history_stats = await build_history(payload.chat_id)
 
-    try:
-        result = agent.invoke(
-            {"messages": messages},
-            context={"user_role": "expert"},
-        )
+            messages = history + [
+                {"role": "user", "content": payload.question}
+            ]
 
-        reply = result["messages"][-1].content
+            with collect_retrieved_sources() as sources:
+                result = await agent.ainvoke(
+                    {"messages": messages},
+                    config={"callbacks": [get_callback_handler()]},
+                    context={"user_role": "expert"},
+                )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+            reply = result["messages"][-1].content
 
-    # Save both messages to DB
-    add_message(payload.chat_id, "user", payload.question)
-    add_message(payload.chat_id, "assistant", reply)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-    return {
-        "chat_id": payload.chat_id,
-        "question": payload.question,
-        "answer": reply,
-    }
+        log_token_usage(payload.chat_id, history_stats, usage_from_messages(result["messages"]))
+
+        # Save both messages to DB in one transaction
+        with span("sqlite_write"):
+            await asyncio.to_thread(
+                add_messages, payload.chat_id, [("user", payload.question), ("assistant", reply)]
+            )
+
+        if payload.use_answer_cache:
+            with span("answer_cache"):
+                await astore_answer(payload.question, reply, sources, kb_version)
+
+        return {
+            "chat_id": payload.chat_id,
+            "question": payload.question,
+            "answer": reply,
+            "cached": False,
+        }
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@chat_router.post("/answer/stream")
+async def stream_chat_answer(payload: ChatQuestionRequest):
+    """Stream the answer as server-sent events: `token`, `tool_start`, `tool_end`, then `done` or `error`.
+
+    Messages are stored once the answer is complete.
+    """
+    async def event_stream():
+        with track_request("chat_answer_stream") as request_metrics:
+            annotate(chat_id=payload.chat_id)
+            try:
+                kb_version = await asyncio.to_thread(get_kb_version)
+                if payload.use_answer_cache:
+                    with span("answer_cache"):
+                        cached_reply = await alookup_answer(payload.question)
+                    if cached_reply is not None:
+                        annotate(cached=True)
+                        with span("sqlite_write"):
+                            await asyncio.to_thread(
+                                add_messages, payload.chat_id, [("user", payload.question), ("assistant", cached_reply)]
+                            )
+                        yield _sse("token", {"type": "token", "text": cached_reply})
+                        yield _sse("done", {
+                            "chat_id": payload.chat_id,
+                            "question": payload.question,
+                            "answer": cached_reply,
+                            "cached": True,
+                        })
+                        return
+
+                history, history_stats = await build_history(payload.chat_id)
+
+                messages = history + [
+                    {"role": "user", "content": payload.question}
+                ]
+
+                with collect_retrieved_sources() as sources:
+                    async for event in astream_answer(messages):
+                        if event["type"] != "answer":
+                            if event["type"] == "token" and "first_token_ms" not in request_metrics.fields:
+                                annotate(first_token_ms=round((time.perf_counter() - request_metrics.started) * 1000, 1))
+                            yield _sse(event["type"], event)
+                            continue
+
+                        reply = event["text"]
+                        log_token_usage(payload.chat_id, history_stats, event["usage"])
+                        with span("sqlite_write"):
+                            await asyncio.to_thread(
+                                add_messages, payload.chat_id, [("user", payload.question), ("assistant", reply)]
+                            )
+                        if payload.use_answer_cache:
+                            with span("answer_cache"):
+                                await astore_answer(payload.question, reply, sources, kb_version)
+                        yield _sse("done", {
+                            "chat_id": payload.chat_id,
+                            "question": payload.question,
+                            "answer": reply,
+                            "cached": False,
+                        })
+            except Exception as e:
+                annotate(error=str(e))
+                yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @chat_router.delete("/delete", status_code=204)
 def delete_chat(chat_id: int):
     """Delete a chat session and all its messages. Works even if session doesn't exist (orphaned messages)."""
     # Check if there are any messages for this chat_id
-    messages = get_messages(chat_id)
-    if not messages and not session_exists(chat_id):
+    if not session_exists(chat_id) and not get_messages(chat_id, limit=1):
         raise HTTPException(
             status_code=404,
             detail=f"Chat with ID {chat_id} not found. Use GET /chat/list to see available sessions."
@@ -1,11 +1,28 @@
 """Knowledge base API endpoints."""
 
+import asyncio
+import codecs
 import hashlib
-
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from pydantic import BaseModel
-
-from ai.vector_store import add_document, delete_document, list_documents, document_exists
+import io
+import json
+import tarfile
+import zipfile
+from typing import BinaryIO, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from pydantic import BaseModel, Field
+
+from ai.vector_store import (
+    SEARCH_MODES,
+    delete_document,
+    document_exists,
+    get_cache_stats,
+    get_ingestion_status,
+    list_document_records,
+    search_many,
+)
+from ai.registry import SORT_FIELDS
+from backend.jobs import UPLOAD_READ_BYTES, enqueue_documents, enqueue_upload, get_job, new_upload_path
 
 knowledge_router = APIRouter(prefix="/knowledge", tags=["knowledge"])
 
@@ -14,8 +31,18 @@ knowledge_router = APIRouter(prefix="/knowledge", tags=["knowledge"])
 # Request/Response Models
 # ---------------------------
 
+class DocumentRecordResponse(BaseModel):
+    doc_hash: str
+    file_name: str
+    chunk_count: int
+    size_bytes: int
+    ingested_at: float
+
+
 class DocumentListResponse(BaseModel):
     documents: list[str]
+    items: list[DocumentRecordResponse]
+    total: int
 
 
 class DeleteDocumentRequest(BaseModel):
@@ -36,6 +63,142 @@ class DocumentResponse(BaseModel):
     success: bool
     doc_hash: str
     is_duplicate: bool
+    job_id: str
+
+
+class BulkUploadResponse(BaseModel):
+    success: bool
+    documents: int
+    job_id: str
+
+
+class JobResponse(BaseModel):
+    id: str
+    state: str
+    documents: int
+    chunks: int
+    doc_hashes: list[str]
+    error: str | None
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+    queue_seconds: float | None
+    embed_seconds: float | None
+    write_seconds: float | None
+    run_seconds: float | None
+    chunks_per_second: float | None
+
+
+class IngestionStatusResponse(BaseModel):
+    state: str
+    total: int
+    processed: int
+    added: int
+    updated: int
+    unchanged: int
+    removed: int
+    errors: int
+    started_at: float | None
+    finished_at: float | None
+
+
+class SearchRequest(BaseModel):
+    queries: list[str] = Field(..., min_length=1, max_length=1000)
+    k: int = Field(3, ge=1, le=100)
+    mode: str = Field("vector", json_schema_extra={"enum": list(SEARCH_MODES)})
+    # ChromaDB metadata filter on doc_hash, file_name or chunk_index
+    where: dict | None = None
+
+
+class SearchChunkResponse(BaseModel):
+    chunk_id: str
+    content: str
+    source: str
+    score: float | None  # cosine distance, lower is closer; None for lexical-only hits
+    lexical_score: float | None = None
+    rrf_score: float | None = None
+
+
+class SearchResultResponse(BaseModel):
+    query: str
+    chunks: list[SearchChunkResponse]
+
+
+class SearchResponse(BaseModel):
+    results: list[SearchResultResponse]
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+
+def _extract_documents(filename: str, data: BinaryIO) -> List[Tuple[str, Optional[str]]]:
+    """Expand an uploaded file into (content, file_name) documents.
+
+    Supports .zip and .tar/.tar.gz/.tgz archives of text files, .jsonl files with one
+    {"content": ..., "file_name": ...} object per line, and plain text files. Archives
+    and .jsonl files are read from the file object without copying them into memory.
+    """
+    name = (filename or "").lower()
+
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(data) as archive:
+            return [
+                (archive.read(info).decode("utf-8"), info.filename.rsplit("/", 1)[-1])
+                for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".txt")
+            ]
+
+    if name.endswith((".tar", ".tar.gz", ".tgz")):
+        documents = []
+        with tarfile.open(fileobj=data, mode="r:*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(".txt"):
+                    content = archive.extractfile(member).read().decode("utf-8")
+                    documents.append((content, member.name.rsplit("/", 1)[-1]))
+        return documents
+
+    if name.endswith(".jsonl"):
+        documents = []
+        lines = io.TextIOWrapper(data, encoding="utf-8")
+        try:
+            for line in lines:
+                if line.strip():
+                    record = json.loads(line)
+                    documents.append((record["content"], record.get("file_name")))
+        finally:
+            lines.detach()  # leave the upload open for its owner
+        return documents
+
+    return [(data.read().decode("utf-8"), filename)]
+
+
+async def _spool_upload(file: UploadFile) -> Tuple[str, str, int]:
+    """Copy an upload to the jobs directory in blocks, hashing and validating UTF-8 as it goes.
+
+    Returns (upload path, MD5 of the content, size in bytes).
+    """
+    upload_path = new_upload_path()
+    md5 = hashlib.md5()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    size = 0
+
+    def process(block: bytes) -> None:
+        md5.update(block)
+        decoder.decode(block)  # raises on invalid UTF-8
+        spool.write(block)
+
+    try:
+        with upload_path.open("wb") as spool:
+            # Hashing, decoding and writing a block all take CPU or I/O; keep them off the loop
+            while block := await file.read(UPLOAD_READ_BYTES):
+                await asyncio.to_thread(process, block)
+                size += len(block)
+        decoder.decode(b"", final=True)
+    except BaseException:
+        upload_path.unlink(missing_ok=True)
+        raise
+    return str(upload_path), md5.hexdigest(), size
 
 
 # ---------------------------
@@ -43,25 +206,99 @@ class DocumentResponse(BaseModel):
 # ---------------------------
 
 @knowledge_router.get("/list", response_model=DocumentListResponse)
-def list_knowledge_documents():
-    """List all documents in the knowledge base."""
-    documents = list_documents()
-    return {"documents": documents}
+def list_knowledge_documents(
+    limit: int | None = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    sort: str = Query("ingested_at", enum=list(SORT_FIELDS)),
+    order: str = Query("desc", enum=["asc", "desc"]),
+):
+    """List documents in the knowledge base, paginated and sorted. Omit limit to list all."""
+    records, total = list_document_records(
+        limit=limit,
+        offset=offset,
+        sort_by=sort,
+        descending=order == "desc",
+    )
+    return {
+        "documents": [record["doc_hash"] for record in records],
+        "items": records,
+        "total": total,
+    }
+
+
+@knowledge_router.get("/ingestion_status", response_model=IngestionStatusResponse)
+def get_knowledge_ingestion_status():
+    """Report progress of the startup reconciliation of the knowledge directory."""
+    return get_ingestion_status()
+
+
+@knowledge_router.get("/cache_stats")
+def get_knowledge_cache_stats():
+    """Report hit/miss counters of the embedding caches."""
+    return get_cache_stats()
+
+
+@knowledge_router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_ingestion_job(job_id: str):
+    """Report state, chunk counts and timings of an ingestion job."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Ingestion job '{job_id}' not found"
+        )
+    return job
+
+
+@knowledge_router.post("/search", response_model=SearchResponse)
+async def search_knowledge(payload: SearchRequest):
+    """Retrieve the top-k chunks for many queries in one request.
+
+    All queries are embedded in batched calls and looked up with one vector store query.
+    """
+    if payload.mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown search mode '{payload.mode}', expected one of {list(SEARCH_MODES)}"
+        )
+    try:
+        results = await asyncio.to_thread(search_many, payload.queries, payload.k, payload.mode, payload.where)
+    except Exception as e:
+        from chromadb.errors import InvalidArgumentError
+
+        # Malformed where filters are rejected by ChromaDB
+        if isinstance(e, (ValueError, InvalidArgumentError)):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid search request: {str(e)}"
+            )
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error searching knowledge base: {str(e)}"
+        )
+
+    return {
+        "results": [
+            {"query": query, "chunks": chunks}
+            for query, chunks in zip(payload.queries, results)
+        ]
+    }
 
 
 @knowledge_router.post("/add", response_model=DocumentResponse)
 def add_document_endpoint(payload: AddDocumentRequest):
-    """Add a document to the knowledge base via JSON content."""
+    """Queue a document for ingestion via JSON content. Poll /knowledge/jobs/{job_id} for progress."""
     try:
         doc_hash = hashlib.md5(payload.content.encode('utf-8')).hexdigest()
         is_duplicate = document_exists(doc_hash)
 
-        add_document(payload.content, file_name=payload.file_name)
+        job_id = enqueue_documents([(payload.content, payload.file_name, doc_hash)])
 
         return {
             "success": True,
             "doc_hash": doc_hash,
-            "is_duplicate": is_duplicate
+            "is_duplicate": is_duplicate,
+            "job_id": job_id,
         }
     except Exception as e:
         raise HTTPException(
@@ -72,20 +309,30 @@ def add_document_endpoint(payload: AddDocumentRequest):
 
 @knowledge_router.post("/upload", response_model=DocumentResponse)
 async def upload_document(file: UploadFile = File(...)):
-    """Upload a document file to the knowledge base."""
+    """Upload a document file to the knowledge base. Ingestion runs as a background job.
+
+    The file is streamed to disk and ingested in windows, so memory use does not grow
+    with its size.
+    """
     try:
-        content = await file.read()
-        content_str = content.decode('utf-8')
+        upload_path, doc_hash, size = await _spool_upload(file)
+    except ValueError as e:
+        # Invalid UTF-8, caught by the incremental decoder while spooling
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file '{file.filename}': {e!r}"
+        )
 
-        doc_hash = hashlib.md5(content_str.encode('utf-8')).hexdigest()
-        is_duplicate = document_exists(doc_hash)
+    try:
+        is_duplicate = await asyncio.to_thread(document_exists, doc_hash)
 
-        add_document(content_str, file_name=file.filename)
+        job_id = await asyncio.to_thread(enqueue_upload, upload_path, file.filename, doc_hash, size)
 
         return {
             "success": True,
             "doc_hash": doc_hash,
-            "is_duplicate": is_duplicate
+            "is_duplicate": is_duplicate,
+            "job_id": job_id,
         }
     except Exception as e:
         raise HTTPException(
@@ -94,6 +341,39 @@ async def upload_document(file: UploadFile = File(...)):
         )
 
 
+@knowledge_router.post("/bulk_upload", response_model=BulkUploadResponse)
+async def bulk_upload_documents(files: List[UploadFile] = File(...)):
+    """Upload many documents at once as text files, archives (.zip/.tar/.tar.gz) or .jsonl.
+
+    All documents are ingested by one background job.
+    """
+    try:
+        documents = []
+        for file in files:
+            # Decompressing and decoding a large archive takes a while; keep it off the loop
+            documents.extend(await asyncio.to_thread(_extract_documents, file.filename, file.file))
+    except (ValueError, KeyError, TypeError, zipfile.BadZipFile, tarfile.TarError) as e:
+        # Invalid UTF-8 or JSON, a broken archive, or a .jsonl record without "content"
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file '{file.filename}': {e!r}"
+        )
+
+    try:
+        job_id = await asyncio.to_thread(enqueue_documents, documents)
+
+        return {
+            "success": True,
+            "documents": len(documents),
+            "job_id": job_id,
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error uploading documents: {str(e)}"
+        )
+
+
 @knowledge_router.delete("/delete", response_model=DeleteDocumentResponse)
 def delete_knowledge_document(payload: DeleteDocumentRequest):
     doc_hash = payload.doc_hash
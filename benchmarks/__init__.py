@@ -0,0 +1 @@
+"""Benchmarks for the question-answering agent."""
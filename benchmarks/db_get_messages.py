@@ -0,0 +1,113 @@
+"""Benchmark backend.db.get_messages latency on a large chat history.
+
+Fills a temporary database with N messages spread over many sessions and reports
+get_messages latency percentiles, with and without the session index. Also reports
+the storage cost of a chat turn (read the history, store two messages) on a set of
+hot sessions, with and without the in-memory session cache.
+
+    python -m benchmarks.db_get_messages --messages 1000000 --sessions 10000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from backend import db
+from benchmarks.stats import percentile
+
+
+def _populate(messages: int, sessions: int) -> None:
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO sessions (id) VALUES (?)", ((i,) for i in range(1, sessions + 1)))
+        conn.executemany(
+            "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+            (
+                (random.randint(1, sessions), "user" if i % 2 else "assistant", f"message {i} " * 8)
+                for i in range(messages)
+            ),
+        )
+        conn.commit()
+
+
+def _measure(sessions: int, queries: int) -> dict:
+    samples = []
+    for _ in range(queries):
+        session_id = random.randint(1, sessions)
+        started = time.perf_counter()
+        db.get_messages(session_id)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def _measure_turns(sessions: int, turns: int, hot_sessions: int) -> dict:
+    samples = []
+    for _ in range(turns):
+        session_id = random.randint(1, min(sessions, hot_sessions))
+        started = time.perf_counter()
+        db.get_summary(session_id)
+        db.get_messages_after(session_id, 0)
+        db.add_messages(session_id, [("user", "question " * 8), ("assistant", "answer " * 40)])
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--hot-sessions", type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.CHAT_CACHE_SESSIONS = 0
+        db.init_db()
+
+        started = time.perf_counter()
+        _populate(args.messages, args.sessions)
+        populate_seconds = time.perf_counter() - started
+
+        indexed = _measure(args.sessions, args.queries)
+
+        turns_uncached = _measure_turns(args.sessions, args.turns, args.hot_sessions)
+        db.CHAT_CACHE_SESSIONS = args.hot_sessions
+        turns_cached = _measure_turns(args.sessions, args.turns, args.hot_sessions)
+        cache_stats = db.get_session_cache_stats()
+        db.close_session_cache()
+        db.CHAT_CACHE_SESSIONS = 0
+
+        with db.get_connection() as conn:
+            conn.execute("DROP INDEX idx_messages_session_id")
+            conn.commit()
+        # Full scans are slow; fewer samples are enough
+        unindexed = _measure(args.sessions, max(1, args.queries // 10))
+
+    print(json.dumps({
+        "messages": args.messages,
+        "sessions": args.sessions,
+        "populate_seconds": round(populate_seconds, 2),
+        "get_messages_indexed": indexed,
+        "get_messages_unindexed": unindexed,
+        "turn_uncached": turns_uncached,
+        "turn_cached": turns_cached,
+        "session_cache": cache_stats,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Deterministic offline stand-ins for the OpenAI clients used by the benchmarks."""
+
+import asyncio
+import hashlib
+import math
+import time
+from typing import List
+
+from ai.lexical import tokenize
+
+
+class HashingEmbeddings:
+    """Bag-of-words embeddings built by feature hashing.
+
+    Texts sharing words get similar vectors, which is enough to exercise retrieval
+    realistically without a network. ``latency_ms`` simulates the per-call round trip
+    of a remote embedding API.
+    """
+
+    def __init__(self, dimensions: int = 256, latency_ms: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        self.model = f"hashing-{dimensions}"
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in tokenize(text):
+            digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimensions] += 1.0 if (digest >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,262 @@
+"""Offline microbenchmarks for the ingestion and retrieval hot paths in ai/.
+
+Runs against a temporary vector store with HashingEmbeddings in place of OpenAI, so
+results depend only on the local code and ChromaDB. Measures:
+
+- text splitter throughput (MB/s and chunks/s)
+- add_document and add_documents throughput (chunks/s)
+- at each scale (total chunks in the store): search p50/p99 per mode, search_many
+  over all queries at once per mode, list_documents, list_document_records pages and
+  delete_document latency
+
+The store grows from one scale to the next, so larger scales take proportionally
+longer to fill. Results are printed and written as JSON for comparison between runs.
+
+    python -m benchmarks.hot_paths --scales 10000,100000,1000000
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.stats import percentile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BASE_DIR / "benchmarks" / "results"
+
+# Number of words in each synthetic document; with the default splitter settings
+# this gives about ten chunks per document
+WORDS_PER_DOCUMENT = 1200
+
+
+def _latency_report(samples: list[float]) -> dict:
+    return {
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Corpus:
+    """Deterministic generator of synthetic documents with topical vocabulary."""
+
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "te", "vo", "zi", "po", "qu", "de", "fa", "gi", "ho"]
+        self.vocabulary = sorted({"".join(self.rng.choices(syllables, k=self.rng.randint(2, 4))) for _ in range(6000)})
+        self.topics: list[list[str]] = []
+        self.count = 0
+
+    def document(self) -> tuple[str, str]:
+        topic = self.rng.sample(self.vocabulary, 12)
+        self.topics.append(topic)
+        words = [
+            self.rng.choice(topic) if self.rng.random() < 0.4 else self.rng.choice(self.vocabulary)
+            for _ in range(WORDS_PER_DOCUMENT)
+        ]
+        # Sentence and paragraph breaks so the splitter takes its usual code paths
+        for i in range(15, len(words), 15):
+            words[i] += "."
+        for i in range(120, len(words), 120):
+            words[i] += "\n\n"
+        name = f"doc_{self.count}.txt"
+        self.count += 1
+        return f"Document {self.count} " + " ".join(words), name
+
+    def query(self) -> str:
+        return " ".join(self.rng.sample(self.rng.choice(self.topics), 4))
+
+
+def _bench_splitter(vector_store, corpus: Corpus, documents: int) -> dict:
+    texts = [corpus.document()[0] for _ in range(documents)]
+    splitter = vector_store.get_text_splitter()
+    started = time.perf_counter()
+    chunks = sum(len(splitter.split_text(text)) for text in texts)
+    seconds = time.perf_counter() - started
+    megabytes = sum(len(text.encode("utf-8")) for text in texts) / 1e6
+    return {
+        "documents": documents,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "mb_per_second": round(megabytes / seconds, 2),
+        "chunks_per_second": round(chunks / seconds, 1),
+    }
+
+
+def _bench_ingest(vector_store, corpus: Corpus, documents: int) -> dict:
+    registry = vector_store._get_registry()
+    started = time.perf_counter()
+    for _ in range(documents):
+        vector_store.add_document(*corpus.document())
+    seconds = time.perf_counter() - started
+    single_chunks = sum(record["chunk_count"] for record in registry.list())
+
+    stats = vector_store.add_documents(corpus.document() for _ in range(documents))
+    return {
+        "add_document": {
+            "documents": documents,
+            "chunks": single_chunks,
+            "seconds": round(seconds, 3),
+            "chunks_per_second": round(single_chunks / seconds, 1),
+        },
+        "add_documents": {
+            "documents": stats["documents"],
+            "chunks": stats["chunks"],
+            "seconds": round(stats["seconds"], 3),
+            "embed_seconds": round(stats["embed_seconds"], 3),
+            "write_seconds": round(stats["write_seconds"], 3),
+            "chunks_per_second": round(stats["chunks_per_second"], 1),
+        },
+    }
+
+
+def _fill(vector_store, corpus: Corpus, target_chunks: int, current_chunks: int) -> tuple[int, float]:
+    """Grow the store to at least target_chunks; returns (total chunks, seconds spent)."""
+    started = time.perf_counter()
+    while current_chunks < target_chunks:
+        # About ten chunks per document; add in windows to bound memory
+        batch = max(1, min(2000, (target_chunks - current_chunks) // 10))
+        current_chunks += vector_store.add_documents(corpus.document() for _ in range(batch))["chunks"]
+    return current_chunks, time.perf_counter() - started
+
+
+def _bench_scale(vector_store, corpus: Corpus, queries: int, deletes: int, k: int) -> dict:
+    report = {"search": {}}
+    sample = [corpus.query() for _ in range(queries)]
+    for mode in vector_store.SEARCH_MODES:
+        latencies = []
+        for query in sample:
+            started = time.perf_counter()
+            vector_store.search(query, k=k, mode=mode)
+            latencies.append((time.perf_counter() - started) * 1000)
+        report["search"][mode] = _latency_report(latencies)
+
+    report["search_many"] = {}
+    for mode in vector_store.SEARCH_MODES:
+        started = time.perf_counter()
+        vector_store.search_many(sample, k=k, mode=mode)
+        elapsed = time.perf_counter() - started
+        report["search_many"][mode] = {
+            "queries": len(sample),
+            "ms": round(elapsed * 1000, 3),
+            "ms_per_query": round(elapsed * 1000 / len(sample), 3),
+        }
+
+    started = time.perf_counter()
+    hashes = vector_store.list_documents()
+    report["list_documents"] = {"documents": len(hashes), "ms": round((time.perf_counter() - started) * 1000, 3)}
+
+    pages = {}
+    for name, offset in (("first", 0), ("last", max(0, len(hashes) - 50))):
+        latencies = []
+        for _ in range(20):
+            started = time.perf_counter()
+            vector_store.list_document_records(limit=50, offset=offset)
+            latencies.append((time.perf_counter() - started) * 1000)
+        pages[f"{name}_page"] = _latency_report(latencies)
+    report["list_document_records"] = pages
+
+    # Delete a sample of documents, then put them back so the next scale starts full
+    registry = vector_store._get_registry()
+    victims = random.Random(len(hashes)).sample(hashes, min(deletes, len(hashes)))
+    records = [registry.get(doc_hash) for doc_hash in victims]
+    collection = vector_store.get_collection()
+    restored = [
+        collection.get(ids=vector_store._chunk_ids(r["doc_hash"], r["chunk_count"]), include=["documents", "metadatas"])
+        for r in records
+    ]
+    latencies = []
+    for doc_hash in victims:
+        started = time.perf_counter()
+        vector_store.delete_document(doc_hash)
+        latencies.append((time.perf_counter() - started) * 1000)
+    report["delete_document"] = _latency_report(latencies)
+
+    for record, chunks in zip(records, restored):
+        vector_store._write_chunks(chunks["ids"], chunks["documents"], chunks["metadatas"])
+        vector_store._update_lexical_index(ids=chunks["ids"], documents=chunks["documents"])
+        registry.mark_pending([(record["doc_hash"], record["file_name"], record["size_bytes"])])
+        registry.mark_ready([(record["doc_hash"], record["chunk_count"])])
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="10000,100000,1000000", help="comma-separated chunk counts")
+    parser.add_argument("--splitter-documents", type=int, default=500)
+    parser.add_argument("--ingest-documents", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--deletes", type=int, default=20)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--dimensions", type=int, default=256, help="embedding dimensions")
+    parser.add_argument("--output", type=Path, help=f"JSON output path (default: {RESULTS_DIR.relative_to(BASE_DIR)}/)")
+    args = parser.parse_args()
+    scales = sorted(int(scale) for scale in args.scales.split(","))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configure the vector store before it is imported: temporary storage, no caches
+        os.environ["VECTOR_DB_DIR"] = tmp
+        os.environ["QUERY_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["EMBEDDING_CACHE_MAX_ENTRIES"] = "0"
+        os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+        from ai import config, vector_store
+        from benchmarks.fakes import HashingEmbeddings
+
+        vector_store._embeddings = HashingEmbeddings(dimensions=args.dimensions)
+        splitter = vector_store.get_text_splitter()
+        corpus = Corpus()
+
+        report = {
+            "benchmark": "hot_paths",
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {
+                "chunk_size": splitter._chunk_size,
+                "chunk_overlap": splitter._chunk_overlap,
+                "embedding_dimensions": args.dimensions,
+                "embedding_batch_size": config.EMBEDDING_BATCH_SIZE,
+                "chroma_write_batch_size": config.CHROMA_WRITE_BATCH_SIZE,
+                "ingest_window_chunks": config.INGEST_WINDOW_CHUNKS,
+                "k": args.k,
+            },
+            "splitter": _bench_splitter(vector_store, corpus, args.splitter_documents),
+            "ingest": _bench_ingest(vector_store, corpus, args.ingest_documents),
+            "scales": {},
+        }
+
+        chunks = sum(record["chunk_count"] for record in vector_store._get_registry().list())
+        for scale in scales:
+            chunks, fill_seconds = _fill(vector_store, corpus, scale, chunks)
+            scale_report = {"chunks": chunks, "fill_seconds": round(fill_seconds, 1)}
+            scale_report.update(_bench_scale(vector_store, corpus, args.queries, args.deletes, args.k))
+            report["scales"][str(scale)] = scale_report
+            print(f"scale {scale}: done ({chunks} chunks)", flush=True)
+
+    output = args.output or RESULTS_DIR / f"hot_paths_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Measure cold import time of the project's modules with ``python -X importtime``.
+
+Each module is imported in a fresh interpreter and the cumulative time reported by
+the interpreter for that module is printed, in milliseconds (median of N runs).
+
+    python -m benchmarks.import_time --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODULES = ["backend.db", "ai.vector_store", "ai.agents", "backend.app"]
+
+
+def _cumulative_ms(module: str) -> float:
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "import-time-benchmark")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    for line in reversed(result.stderr.splitlines()):
+        fields = [field.strip() for field in line.removeprefix("import time:").split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"No importtime line for {module}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    report = {
+        module: round(statistics.median(_cumulative_ms(module) for _ in range(args.runs)), 1)
+        for module in MODULES
+    }
+    print(json.dumps({"cumulative_import_ms": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Load-test /chat/answer and /knowledge/upload at increasing concurrency levels.
+
+By default starts the stub OpenAI server (benchmarks.stub_openai) and one backend.app
+instance pointed at it, each in its own process, with the chat database, vector store
+and job payloads in a temporary directory. Pass ``--backend-url`` to drive an already
+running instance instead.
+
+At each concurrency level, N workers send requests back to back for ``--duration``
+seconds; throughput and latency percentiles are reported per endpoint. Upload jobs are
+then drained and their end-to-end ingestion time reported as well. The level where
+throughput stops growing while latency climbs is where the instance saturates.
+
+    python -m benchmarks.load_test --concurrency 1,4,16,64 --duration 20 --latency-ms 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.stats import percentile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+QUESTIONS = [
+    "What does the knowledge base say about the deployment process?",
+    "Summarize the error handling guidelines.",
+    "Which configuration options affect ingestion speed?",
+    "How are documents deduplicated?",
+]
+
+
+def _random_document(rng: random.Random, words: int) -> str:
+    vocabulary = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+    return " ".join(f"{rng.choice(vocabulary)}{rng.randint(0, 999)}" for _ in range(words))
+
+
+class Scenario:
+    """One endpoint under test: builds a request per call and records the outcome."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.last_error: str | None = None
+
+    async def call(self, client: httpx.AsyncClient, worker: int, rng: random.Random) -> None:
+        raise NotImplementedError
+
+    async def run(self, client: httpx.AsyncClient, worker: int, deadline: float) -> None:
+        rng = random.Random(worker)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await self.call(client, worker, rng)
+                self.latencies.append((time.perf_counter() - started) * 1000)
+            except (httpx.HTTPError, RuntimeError) as e:
+                self.errors += 1
+                self.last_error = str(e)[:300]
+
+    def report(self, seconds: float) -> dict:
+        report = {"requests": len(self.latencies), "errors": self.errors, "rps": round(len(self.latencies) / seconds, 2)}
+        if self.latencies:
+            report.update({
+                "p50_ms": round(percentile(self.latencies, 50), 1),
+                "p90_ms": round(percentile(self.latencies, 90), 1),
+                "p99_ms": round(percentile(self.latencies, 99), 1),
+                "max_ms": round(max(self.latencies), 1),
+            })
+        if self.last_error:
+            report["last_error"] = self.last_error
+        return report
+
+
+class ChatScenario(Scenario):
+    def __init__(self, level: int):
+        super().__init__("chat_answer")
+        # One chat session per worker and level, so history grows as in a real conversation
+        self.chat_base = 1_000_000 + level * 10_000
+
+    async def call(self, client: httpx.AsyncClient, worker: int, rng: random.Random) -> None:
+        response = await client.post(
+            "/chat/answer",
+            json={"chat_id": self.chat_base + worker, "question": rng.choice(QUESTIONS)},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(response.text)
+
+
+class UploadScenario(Scenario):
+    def __init__(self, document_words: int):
+        super().__init__("knowledge_upload")
+        self.document_words = document_words
+        self.job_ids: list[str] = []
+
+    async def call(self, client: httpx.AsyncClient, worker: int, rng: random.Random) -> None:
+        content = _random_document(rng, self.document_words)
+        response = await client.post(
+            "/knowledge/upload",
+            files={"file": (f"load_{worker}_{rng.getrandbits(32)}.txt", content.encode("utf-8"), "text/plain")},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(response.text)
+        self.job_ids.append(response.json()["job_id"])
+
+    async def drain(self, client: httpx.AsyncClient, timeout: float) -> dict:
+        """Wait for all upload jobs to finish and report ingestion timings."""
+        started = time.perf_counter()
+        pending = list(self.job_ids)
+        jobs = []
+        while pending and time.perf_counter() - started < timeout:
+            still_pending = []
+            for job_id in pending:
+                job = (await client.get(f"/knowledge/jobs/{job_id}")).json()
+                if job["state"] in ("done", "failed"):
+                    jobs.append(job)
+                else:
+                    still_pending.append(job_id)
+            pending = still_pending
+            if pending:
+                await asyncio.sleep(0.5)
+
+        end_to_end = [(job["finished_at"] - job["created_at"]) * 1000 for job in jobs if job["finished_at"]]
+        report = {
+            "jobs": len(self.job_ids),
+            "failed": sum(job["state"] == "failed" for job in jobs),
+            "unfinished": len(pending),
+            "drain_seconds": round(time.perf_counter() - started, 1),
+        }
+        if end_to_end:
+            report["end_to_end_p50_ms"] = round(percentile(end_to_end, 50), 1)
+            report["end_to_end_p99_ms"] = round(percentile(end_to_end, 99), 1)
+        return report
+
+
+async def _run_level(base_url: str, level: int, args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=level * 2, max_keepalive_connections=level * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        report = {}
+        for scenario in (ChatScenario(level), UploadScenario(args.document_words)):
+            if scenario.name not in args.endpoints:
+                continue
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*(scenario.run(client, worker, deadline) for worker in range(level)))
+            report[scenario.name] = scenario.report(time.perf_counter() - started)
+            if isinstance(scenario, UploadScenario):
+                report[scenario.name]["ingestion"] = await scenario.drain(client, args.timeout * 10)
+            print(f"concurrency {level} {scenario.name}: {json.dumps(report[scenario.name])}", flush=True)
+        return report
+
+
+def _wait_until(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def _start_servers(tmp: str, args: argparse.Namespace) -> tuple[str, list[subprocess.Popen]]:
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.stub_openai",
+            "--port", str(args.stub_port),
+            "--latency-ms", str(args.latency_ms),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--tool-calls", args.tool_calls,
+            "--embed-latency-ms", str(args.embed_latency_ms),
+        ],
+        cwd=BASE_DIR,
+    )
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "VECTOR_DB_DIR": str(Path(tmp) / "vector_db"),
+        "CHAT_DB_PATH": str(Path(tmp) / "chat_history.db"),
+        "INGEST_JOBS_DIR": str(Path(tmp) / "ingest_jobs"),
+        "LOG_LEVEL": "WARNING",
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BASE_DIR,
+        env=env,
+    )
+    backend_url = f"http://127.0.0.1:{args.port}"
+    _wait_until(f"{stub_url}/stats", 30)
+    _wait_until(f"{backend_url}/ready", 120)
+    return backend_url, [backend, stub]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend-url", help="drive a running instance instead of starting one")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32,64", help="comma-separated levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per endpoint and level")
+    parser.add_argument("--endpoints", default="chat_answer,knowledge_upload")
+    parser.add_argument("--document-words", type=int, default=800)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub-port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="stub time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--tool-calls", choices=("first", "never"), default="first")
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+    args.endpoints = set(args.endpoints.split(","))
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    report = {"settings": {k: v for k, v in vars(args).items() if k not in ("output", "endpoints")}, "levels": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        processes = []
+        try:
+            base_url = args.backend_url
+            if base_url is None:
+                base_url, processes = _start_servers(tmp, args)
+            for level in levels:
+                report["levels"][str(level)] = asyncio.run(_run_level(base_url, level, args))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=30)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
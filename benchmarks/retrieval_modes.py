@@ -0,0 +1,86 @@
+"""Compare recall and latency of the vector, lexical, hybrid and auto search modes.
+
+Runs fully offline against a temporary collection filled with a synthetic corpus and
+embedded with HashingEmbeddings. Each document carries an error code and a product
+name; identifier queries ask for those, and topical queries use a handful of the
+document's words.
+
+    python -m benchmarks.retrieval_modes --documents 2000 --embed-latency-ms 100
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.stats import percentile
+
+
+def _make_corpus(documents: int, rng: random.Random) -> tuple[list[str], list[tuple[str, int]], list[tuple[str, int]]]:
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "te", "vo", "zi", "po", "qu", "de", "fa", "gi", "ho"]
+    vocabulary = sorted({"".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(6000)})
+
+    texts, identifier_queries, topical_queries = [], [], []
+    for i in range(documents):
+        topic = rng.sample(vocabulary, 12)
+        words = [rng.choice(topic) if rng.random() < 0.4 else rng.choice(vocabulary) for _ in range(220)]
+        code, product = f"ERR-{i:05d}", f"PRD{i}X"
+        words.insert(rng.randrange(len(words)), f"error {code} affects {product}")
+        texts.append(" ".join(words))
+        identifier_queries.append((f"What does {code} mean?", i))
+        topical_queries.append((" ".join(rng.sample(topic, 5)), i))
+    return texts, identifier_queries, topical_queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-latency-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configure the vector store before it is imported: temporary storage, no caches
+        os.environ["VECTOR_DB_DIR"] = tmp
+        os.environ["QUERY_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["EMBEDDING_CACHE_MAX_ENTRIES"] = "0"
+        os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+        from ai import vector_store
+        from benchmarks.fakes import HashingEmbeddings
+
+        rng = random.Random(0)
+        texts, identifier_queries, topical_queries = _make_corpus(args.documents, rng)
+
+        vector_store._embeddings = HashingEmbeddings()
+        doc_hashes = vector_store.add_documents((text, f"doc_{i}.txt") for i, text in enumerate(texts))["doc_hashes"]
+        vector_store._embeddings = HashingEmbeddings(latency_ms=args.embed_latency_ms)
+        # Build the BM25 index up front so the first lexical query isn't charged for it
+        vector_store._get_lexical_index()
+
+        report = {"documents": args.documents, "k": args.k, "embed_latency_ms": args.embed_latency_ms, "modes": {}}
+        for mode in vector_store.SEARCH_MODES:
+            mode_report = {}
+            for name, queries in (("identifier", identifier_queries), ("topical", topical_queries)):
+                sample = rng.sample(queries, min(args.queries, len(queries)))
+                hits, latencies = 0, []
+                for query, expected in sample:
+                    started = time.perf_counter()
+                    results = vector_store.search(query, k=args.k, mode=mode)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    hits += any(chunk["source"] == doc_hashes[expected] for chunk in results)
+                mode_report[name] = {
+                    f"recall_at_{args.k}": round(hits / len(sample), 3),
+                    "p50_ms": round(percentile(latencies, 50), 2),
+                    "p99_ms": round(percentile(latencies, 99), 2),
+                }
+            report["modes"][mode] = mode_report
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
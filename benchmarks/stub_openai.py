@@ -0,0 +1,220 @@
+"""Local OpenAI-compatible stub server for offline load tests.
+
+Implements the two endpoints the app uses, ``POST /v1/chat/completions`` (plain and
+streamed, with tool calls) and ``POST /v1/embeddings`` (text or token-array input,
+float or base64 encoding). Replies are synthetic; only their timing is realistic:
+
+- ``--latency-ms``: delay before the first token of a chat completion
+- ``--tokens-per-second``: generation rate of the reply that follows
+- ``--tool-calls``: ``first`` calls the first offered tool once per question (until a
+  tool result is in the conversation), ``never`` always answers directly
+- ``--embed-latency-ms``: delay per embeddings request
+
+Point the app at it with ``OPENAI_BASE_URL=http://127.0.0.1:8100/v1``.
+
+    python -m benchmarks.stub_openai --port 8100 --latency-ms 300 --tokens-per-second 50
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import struct
+import time
+import uuid
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the knowledge base says that this answer is synthetic and generated by the local "
+    "stub server so that latency and throughput can be measured without a network"
+).split()
+
+
+@dataclass
+class StubSettings:
+    latency_ms: float = 300.0
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 60
+    tool_calls: str = "first"
+    embed_latency_ms: float = 50.0
+    dimensions: int = 256
+
+
+def _estimate_tokens(messages: list) -> int:
+    return sum(len(json.dumps(message.get("content") or "")) // 4 + 4 for message in messages)
+
+
+def _feature_vector(features: list, dimensions: int) -> list[float]:
+    """Feature-hash words or token IDs into a unit vector; equal inputs give equal vectors."""
+    vector = [0.0] * dimensions
+    for feature in features:
+        digest = int.from_bytes(hashlib.blake2b(str(feature).encode("utf-8"), digest_size=8).digest(), "little")
+        vector[digest % dimensions] += 1.0 if (digest >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def _embedding_inputs(raw) -> list[list]:
+    """Normalize the ``input`` field: a string, a token array, or a list of either."""
+    if isinstance(raw, str):
+        return [raw.lower().split()]
+    if raw and isinstance(raw[0], int):
+        return [raw]
+    return [item.lower().split() if isinstance(item, str) else item for item in raw]
+
+
+def _tool_call(body: dict) -> dict | None:
+    """Return the tool call to make for this request, or None to answer directly."""
+    tools = body.get("tools") or []
+    messages = body.get("messages") or []
+    if not tools or not messages:
+        return None
+    # Only the messages after the latest user turn belong to the current question
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+    if any(m.get("role") == "tool" for m in messages[last_user + 1:]):
+        return None
+    question = messages[last_user]["content"] if last_user >= 0 else ""
+    # Pass the question as the tool's first parameter, whatever it is called
+    function = tools[0]["function"]
+    parameters = function.get("parameters", {})
+    argument = (parameters.get("required") or list(parameters.get("properties", {})) or ["query"])[0]
+    return {
+        "id": f"call_{uuid.uuid4().hex[:24]}",
+        "type": "function",
+        "function": {
+            "name": function["name"],
+            "arguments": json.dumps({argument: question if isinstance(question, str) else json.dumps(question)}),
+        },
+    }
+
+
+def create_app(settings: StubSettings) -> FastAPI:
+    app = FastAPI(title="OpenAI stub")
+    stats = {"chat_completions": 0, "tool_calls": 0, "embedding_requests": 0, "embedded_inputs": 0}
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = _embedding_inputs(body["input"])
+        stats["embedding_requests"] += 1
+        stats["embedded_inputs"] += len(inputs)
+        await asyncio.sleep(settings.embed_latency_ms / 1000)
+
+        data = []
+        for index, features in enumerate(inputs):
+            vector = _feature_vector(features, settings.dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            else:
+                embedding = vector
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(features) for features in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat_completions"] += 1
+        call = _tool_call(body) if settings.tool_calls == "first" else None
+        if call:
+            stats["tool_calls"] += 1
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "stub")
+        tokens = [] if call else [WORDS[i % len(WORDS)] + " " for i in range(settings.answer_tokens)]
+        usage = {
+            "prompt_tokens": _estimate_tokens(body.get("messages", [])),
+            "completion_tokens": len(tokens) or 20,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        token_delay = 1 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+
+        if not body.get("stream"):
+            await asyncio.sleep(settings.latency_ms / 1000 + token_delay * len(tokens))
+            message = {"role": "assistant", "content": None if call else "".join(tokens)}
+            if call:
+                message["tool_calls"] = [call]
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if call else "stop",
+                }],
+                "usage": usage,
+            })
+
+        def chunk(delta: dict, finish_reason: str | None = None, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(settings.latency_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            if call:
+                yield chunk({"tool_calls": [{"index": 0, **call}]})
+            for token in tokens:
+                yield chunk({"content": token})
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+            yield chunk({}, "tool_calls" if call else "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=StubSettings.latency_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=StubSettings.tokens_per_second)
+    parser.add_argument("--answer-tokens", type=int, default=StubSettings.answer_tokens)
+    parser.add_argument("--tool-calls", choices=("first", "never"), default=StubSettings.tool_calls)
+    parser.add_argument("--embed-latency-ms", type=float, default=StubSettings.embed_latency_ms)
+    parser.add_argument("--dimensions", type=int, default=StubSettings.dimensions)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    settings = StubSettings(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        tool_calls=args.tool_calls,
+        embed_latency_ms=args.embed_latency_ms,
+        dimensions=args.dimensions,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare peak memory of streaming and whole-document ingestion of one large file.
+
+Writes a synthetic text file of the given size, then ingests it in a fresh interpreter
+per mode, offline with HashingEmbeddings: ``stream`` reads it incrementally like
+/knowledge/upload does (add_document_stream), ``whole`` reads and passes the whole
+string to add_document. Reports peak RSS and time per mode.
+
+    python -m benchmarks.upload_memory --mb 200
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def _write_file(path: Path, megabytes: int) -> None:
+    rng = random.Random(0)
+    with path.open("w", encoding="utf-8") as out:
+        written = 0
+        while written < megabytes * 1_000_000:
+            paragraph = " ".join(f"w{rng.randint(0, 99999)}" for _ in range(rng.randint(5, 200))) + "\n\n"
+            out.write(paragraph)
+            written += len(paragraph)
+
+
+def _ingest(path: Path, mode: str) -> dict:
+    from ai import vector_store
+    from backend.jobs import _read_upload
+    from benchmarks.fakes import HashingEmbeddings
+
+    vector_store._embeddings = HashingEmbeddings(dimensions=64)
+    started = time.perf_counter()
+    if mode == "stream":
+        md5 = hashlib.md5()
+        with path.open("rb") as source:
+            while block := source.read(1 << 20):
+                md5.update(block)
+        stats = vector_store.add_document_stream(
+            _read_upload(str(path)), md5.hexdigest(), path.name, path.stat().st_size
+        )
+        chunks = stats["chunks"]
+    else:
+        content = path.read_text(encoding="utf-8")
+        doc_hash = vector_store.add_document(content, path.name)
+        chunks = vector_store._get_registry().get(doc_hash)["chunk_count"]
+    return {
+        "mode": mode,
+        "chunks": chunks,
+        "seconds": round(time.perf_counter() - started, 1),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=int, default=200, help="file size in MB")
+    parser.add_argument("--modes", default="stream,whole")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_ingest(args.path, args.child)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "upload.txt"
+        _write_file(path, args.mb)
+        results = []
+        for mode in args.modes.split(","):
+            env = {
+                **os.environ,
+                "VECTOR_DB_DIR": str(Path(tmp) / f"vector_db_{mode}"),
+                "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+                "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "offline-benchmark"),
+            }
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.upload_memory", "--child", mode, "--path", str(path)],
+                cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps({"file_mb": args.mb, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
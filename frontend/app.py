@@ -1,28 +1,28 @@
-"""Streamlit UI for the Question-Answering Agent."""
+"""Streamlit UI for the Question-Answering Agent.
 
-import sys
-from pathlib import Path
+A thin client of the FastAPI backend: chats, documents and answers all go through
+its HTTP API, so the UI process loads no LLM client, embeddings or vector index.
+"""
 
-# Add project root to Python path
-project_root = Path(__file__).resolve().parent.parent
-sys.path.insert(0, str(project_root))
+import json
+import os
+from datetime import datetime
+from typing import Iterator
 
+import httpx
 import streamlit as st
-from datetime import datetime
 
-from ai.agents import kb_agent
-from backend.db import (
-    init_db,
-    create_session,
-    get_messages,
-    list_sessions,
-    delete_session,
-    add_message,
-)
-from ai.vector_store import add_document, list_documents, delete_document
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
-# Initialize database
-init_db()
+# Lists are refreshed at least this often, to pick up changes made outside this UI
+LIST_CACHE_TTL_SECONDS = 30
+
+# Documents shown in the sidebar
+DOCUMENT_LIST_LIMIT = 100
+
+# Chats per sidebar page, and messages per page of a chat
+SESSION_PAGE_SIZE = 50
+MESSAGE_PAGE_SIZE = 100
 
 # Page configuration
 st.set_page_config(
@@ -32,25 +32,94 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+
+@st.cache_resource
+def get_client() -> httpx.Client:
+    """Return the HTTP client shared by all sessions, with pooled keep-alive connections."""
+    return httpx.Client(
+        base_url=BACKEND_URL,
+        # Answers can take a while; only connecting should fail fast
+        timeout=httpx.Timeout(120.0, connect=5.0),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+
+
+@st.cache_data(ttl=LIST_CACHE_TTL_SECONDS, show_spinner=False)
+def fetch_sessions(cursor: str | None = None) -> dict:
+    params = {"limit": SESSION_PAGE_SIZE}
+    if cursor:
+        params["cursor"] = cursor
+    response = get_client().get("/chat/list", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=LIST_CACHE_TTL_SECONDS, show_spinner=False)
+def fetch_documents() -> dict:
+    response = get_client().get("/knowledge/list", params={"limit": DOCUMENT_LIST_LIMIT})
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_messages(chat_id: int, before_id: int | None = None) -> dict:
+    response = get_client().post(
+        "/chat/get_messages", json={"chat_id": chat_id, "limit": MESSAGE_PAGE_SIZE, "before_id": before_id}
+    )
+    if response.status_code == 404:
+        return {"messages": [], "next_before_id": None}  # new chat without messages yet
+    response.raise_for_status()
+    return response.json()
+
+
+def stream_answer(chat_id: int, question: str) -> Iterator[tuple[str, dict]]:
+    """Yield the (event, data) server-sent events of an answer; the backend stores the messages."""
+    with get_client().stream(
+        "POST", "/chat/answer/stream", json={"chat_id": chat_id, "question": question}
+    ) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
+
+
 # Initialize session state
 if "current_chat_id" not in st.session_state:
     st.session_state.current_chat_id = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "older_messages_before_id" not in st.session_state:
+    st.session_state.older_messages_before_id = None
+if "session_pages" not in st.session_state:
+    st.session_state.session_pages = 1
 
 
 def load_chat_messages(chat_id: int):
-    """Load messages for a chat and update session state."""
-    messages = get_messages(chat_id)
-    st.session_state.messages = messages
+    """Load the most recent messages of a chat and update session state."""
+    page = fetch_messages(chat_id)
+    st.session_state.messages = page["messages"]
+    st.session_state.older_messages_before_id = page["next_before_id"]
     st.session_state.current_chat_id = chat_id
 
 
+def load_older_messages():
+    """Prepend the page of messages before the oldest one shown."""
+    page = fetch_messages(st.session_state.current_chat_id, st.session_state.older_messages_before_id)
+    st.session_state.messages = page["messages"] + st.session_state.messages
+    st.session_state.older_messages_before_id = page["next_before_id"]
+
+
 def create_new_chat():
     """Create a new chat session."""
-    chat_id = create_session()
+    response = get_client().post("/chat/new")
+    response.raise_for_status()
+    chat_id = response.json()["chat_id"]
+    fetch_sessions.clear()
     st.session_state.current_chat_id = chat_id
     st.session_state.messages = []
+    st.session_state.older_messages_before_id = None
     return chat_id
 
 
@@ -67,20 +136,30 @@ def format_timestamp(timestamp_str: str) -> str:
 with st.sidebar:
     st.title("💬 Q&A Agent")
     st.markdown("---")
-    
+
     # Chat Management
     st.subheader("Chat Management")
-    
+
     if st.button("➕ New Chat", use_container_width=True):
         create_new_chat()
         st.rerun()
-    
+
     st.markdown("---")
-    
+
     # List of chats
     st.subheader("Chat History")
-    sessions = list_sessions()
-    
+    sessions, sessions_cursor = [], None
+    try:
+        # Pages already shown, following the cursors from the first page
+        for _ in range(st.session_state.session_pages):
+            page = fetch_sessions(sessions_cursor)
+            sessions += page["sessions"]
+            sessions_cursor = page["next_cursor"]
+            if sessions_cursor is None:
+                break
+    except httpx.HTTPError as e:
+        st.error(f"Backend unavailable at {BACKEND_URL}: {e}")
+
     if not sessions:
         st.info("No chats yet. Create a new chat to get started!")
     else:
@@ -95,49 +174,72 @@ with st.sidebar:
                 if is_selected:
                     load_chat_messages(session["id"])
                     st.rerun()
-            
+
             with col2:
                 if st.button("🗑️", key=f"delete_{session['id']}"):
-                    delete_session(session["id"])
+                    get_client().delete("/chat/delete", params={"chat_id": session["id"]})
+                    fetch_sessions.clear()
                     if st.session_state.current_chat_id == session["id"]:
                         st.session_state.current_chat_id = None
                         st.session_state.messages = []
+                        st.session_state.older_messages_before_id = None
                     st.rerun()
-    
+
+        if sessions_cursor is not None and st.button("Load more chats", use_container_width=True):
+            st.session_state.session_pages += 1
+            st.rerun()
+
     st.markdown("---")
-    
+
     # Knowledge Base Management
     st.subheader("📚 Knowledge Base")
-    
+
     # Upload document
     uploaded_file = st.file_uploader(
         "Upload Document",
         type=["txt"],
         help="Upload a .txt file to add to the knowledge base",
     )
-    
+
     if uploaded_file is not None:
         if st.button("Upload to Knowledge Base", use_container_width=True):
             try:
-                content = uploaded_file.read().decode("utf-8")
-                doc_hash = add_document(content, file_name=uploaded_file.name)
+                response = get_client().post(
+                    "/knowledge/upload",
+                    files={"file": (uploaded_file.name, uploaded_file.getvalue(), "text/plain")},
+                )
+                response.raise_for_status()
+                result = response.json()
+                fetch_documents.clear()
                 st.success(f"✅ Document uploaded successfully!")
-                st.info(f"Document hash: {doc_hash[:16]}...")
+                st.info(f"Document hash: {result['doc_hash'][:16]}... (ingesting in the background)")
             except Exception as e:
                 st.error(f"Error uploading document: {str(e)}")
-    
+
     # List documents
-    st.markdown("**Documents in Knowledge Base:**")
-    documents = list_documents()
-    if documents:
-        for doc_hash in documents:
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.markdown("**Documents in Knowledge Base:**")
+    with col2:
+        # Ingestion runs in the background; documents appear once it has finished
+        if st.button("🔄", key="refresh_documents", help="Refresh the document list"):
+            fetch_documents.clear()
+    try:
+        documents = fetch_documents()
+    except httpx.HTTPError:
+        documents = {"items": [], "total": 0}
+    if documents["items"]:
+        for record in documents["items"]:
             col1, col2 = st.columns([4, 1])
             with col1:
-                st.text(f"📄 {doc_hash[:16]}...")
+                st.text(f"📄 {record['file_name']}")
             with col2:
-                if st.button("🗑️", key=f"del_doc_{doc_hash}"):
-                    delete_document(doc_hash)
+                if st.button("🗑️", key=f"del_doc_{record['doc_hash']}"):
+                    get_client().request("DELETE", "/knowledge/delete", json={"doc_hash": record["doc_hash"]})
+                    fetch_documents.clear()
                     st.rerun()
+        if documents["total"] > len(documents["items"]):
+            st.caption(f"Showing the {len(documents['items'])} most recent of {documents['total']} documents")
     else:
         st.info("No documents in knowledge base")
 
@@ -155,10 +257,14 @@ else:
 # Display chat messages
 chat_container = st.container()
 with chat_container:
+    if st.session_state.older_messages_before_id is not None:
+        if st.button("Load older messages"):
+            load_older_messages()
+            st.rerun()
     for message in st.session_state.messages:
         role = message["role"]
         content = message["content"]
-        
+
         with st.chat_message(role):
             st.markdown(content)
 
@@ -167,44 +273,45 @@ if prompt := st.chat_input("Ask a question..."):
     # Ensure we have a chat session
     if st.session_state.current_chat_id is None:
         create_new_chat()
-    
+
     # Display user message
     with st.chat_message("user"):
         st.markdown(prompt)
-    
+
     # Add user message to session state
     st.session_state.messages.append({"role": "user", "content": prompt})
-    
+
     # Get agent response
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                # Prepare messages for agent
-                agent_messages = [
-                    {"role": msg["role"], "content": msg["content"]}
-                    for msg in st.session_state.messages
-                ]
-                
-                # Invoke agent
-                result = kb_agent.invoke(
-                    {"messages": agent_messages},
-                    context={"user_role": "expert"},
-                )
-                
-                reply = result["messages"][-1].content
-                
-                # Display response
-                st.markdown(reply)
-                
-                # Add assistant message to session state
-                st.session_state.messages.append({"role": "assistant", "content": reply})
-                
-                # Save messages to database
-                add_message(st.session_state.current_chat_id, "user", prompt)
-                add_message(st.session_state.current_chat_id, "assistant", reply)
-                
-            except Exception as e:
-                error_msg = f"❌ Error: {str(e)}"
-                st.error(error_msg)
-                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+        try:
+            # Render the reply progressively as tokens arrive; the backend builds the
+            # history from the stored chat and saves both messages when it is done
+            tool_area = st.container()
+            reply_area = st.empty()
+            reply, text, tool_status = None, "", None
+            for event, data in stream_answer(st.session_state.current_chat_id, prompt):
+                if event == "token":
+                    text += data["text"]
+                    reply_area.markdown(text + "▌")
+                elif event == "tool_start":
+                    tool_status = tool_area.status(data["message"], state="running")
+                    # Text generated alongside the tool call is not part of the reply
+                    text = ""
+                    reply_area.empty()
+                elif event == "tool_end" and tool_status is not None:
+                    tool_status.update(state="complete")
+                elif event == "done":
+                    reply = data["answer"]
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+            if reply is None:
+                raise RuntimeError("The answer stream ended early")
+
+            # Show and keep the reply exactly as the backend stored it
+            reply_area.markdown(reply)
+            st.session_state.messages.append({"role": "assistant", "content": reply})
 
+        except Exception as e:
+            error_msg = f"❌ Error: {str(e)}"
+            st.error(error_msg)
+            st.session_state.messages.append({"role": "assistant", "content": error_msg})
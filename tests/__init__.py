@@ -0,0 +1,15 @@
+"""Tests run offline against temporary storage.
+
+The vector store, chat database and job queue read their locations when first imported,
+so they are configured here, before any test module imports them.
+"""
+
+import os
+import tempfile
+
+_TMP = tempfile.TemporaryDirectory()
+os.environ["VECTOR_DB_DIR"] = os.path.join(_TMP.name, "vector_db")
+os.environ["CHAT_DB_PATH"] = os.path.join(_TMP.name, "chat_history.db")
+os.environ["INGEST_JOBS_DIR"] = os.path.join(_TMP.name, "ingest_jobs")
+os.environ["QUERY_CACHE_MAX_ENTRIES"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "offline-test")
@@ -0,0 +1,75 @@
+"""Knowledge base writes evict only the cached answers built on the changed documents."""
+
+import unittest
+from unittest import mock
+
+from ai import answer_cache
+from ai.answer_cache import SemanticAnswerCache
+
+
+class FakeChangeLog:
+    """In-memory stand-in for the registry's change log."""
+
+    def __init__(self):
+        self.changes = []
+        self.pruned_before = 0
+
+    def record(self, doc_hash):
+        self.changes.append((len(self.changes) + 1, doc_hash))
+
+    def version(self):
+        return len(self.changes)
+
+    def since(self, version):
+        if version < self.pruned_before:
+            return None
+        return [change for change in self.changes if change[0] > version]
+
+
+class SemanticAnswerCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.log = FakeChangeLog()
+        for target, fake in (("get_kb_version", self.log.version), ("get_kb_changes_since", self.log.since)):
+            patcher = mock.patch.object(answer_cache, target, side_effect=fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = SemanticAnswerCache(max_entries=4, threshold=0.95)
+        self.cache.put([1.0, 0.0, 0.0], "about alpha", {"alpha"}, self.log.version())
+        self.cache.put([0.0, 1.0, 0.0], "about beta", {"beta"}, self.log.version())
+        self.cache.put([0.0, 0.0, 1.0], "general knowledge", set(), self.log.version())
+
+    def _answers(self):
+        return [self.cache.get(vector) for vector in ([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])]
+
+    def test_change_evicts_only_answers_using_the_document(self):
+        self.log.record("alpha")
+        self.log.record("gamma")
+
+        self.assertEqual(self._answers(), [None, "about beta", "general knowledge"])
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_pruned_change_log_flushes_everything(self):
+        self.log.record("gamma")
+        self.log.pruned_before = self.log.version()
+        self.log.record("delta")
+
+        self.assertEqual(self._answers(), [None, None, None])
+
+    def test_change_of_unknown_documents_flushes_everything(self):
+        self.log.record(None)
+
+        self.assertEqual(self._answers(), [None, None, None])
+
+    def test_answer_whose_source_changed_during_generation_is_not_stored(self):
+        answered_at = self.log.version()
+        self.log.record("epsilon")
+
+        self.cache.put([1.0, 1.0, 0.0], "about epsilon", {"epsilon"}, answered_at)
+        self.cache.put([1.0, -1.0, 0.0], "about zeta", {"zeta"}, answered_at)
+
+        self.assertIsNone(self.cache.get([1.0, 1.0, 0.0]))
+        self.assertEqual(self.cache.get([1.0, -1.0, 0.0]), "about zeta")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Archived sessions come back with their original message IDs and rolling summary."""
+
+import unittest
+from unittest import mock
+
+from backend import db
+
+
+class ArchiveRestoreTest:
+    """Cases run with and without the session cache; subclasses set CACHE_SESSIONS."""
+
+    CACHE_SESSIONS = 0
+
+    def setUp(self):
+        db.init_db()
+        patcher = mock.patch.object(db, "CHAT_CACHE_SESSIONS", self.CACHE_SESSIONS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(db.close_session_cache)
+        db.close_session_cache()
+
+        self.session_id = db.create_session()
+        db.add_messages(self.session_id, [("user", "first question"), ("assistant", "first answer")])
+        db.add_messages(self.session_id, [("user", "second question"), ("assistant", "second answer")])
+        self.messages = db.get_messages(self.session_id)
+        db.save_summary(self.session_id, "asked twice", self.messages[1]["id"], 12)
+
+    def _archive(self) -> None:
+        # Flush first: the idle clock must be moved back after the writer touched it
+        cache = db._get_session_cache()
+        if cache is not None:
+            cache.flush()
+        with db.get_connection() as conn:
+            conn.execute(
+                "UPDATE sessions SET last_active_at = datetime('now', '-60 days') WHERE id = ?", (self.session_id,)
+            )
+            conn.commit()
+        self.assertGreaterEqual(db.archive_idle_sessions(idle_days=30), 1)
+        with db.get_connection() as conn:
+            self.assertIsNone(conn.execute("SELECT 1 FROM messages WHERE session_id = ?", (self.session_id,)).fetchone())
+            self.assertIsNotNone(
+                conn.execute("SELECT 1 FROM archived_sessions WHERE session_id = ?", (self.session_id,)).fetchone()
+            )
+
+    def test_restored_session_keeps_message_ids_and_summary(self):
+        self._archive()
+
+        self.assertEqual(db.get_messages(self.session_id), self.messages)
+        self.assertEqual(
+            db.get_summary(self.session_id),
+            db.Summary(summary="asked twice", summarized_upto_id=self.messages[1]["id"], summarized_tokens=12),
+        )
+        self.assertEqual(db.get_messages_after(self.session_id, self.messages[1]["id"]), self.messages[2:])
+
+    def test_new_message_restores_the_archive_before_it(self):
+        self._archive()
+
+        db.add_messages(self.session_id, [("user", "third question")])
+        cache = db._get_session_cache()
+        if cache is not None:
+            cache.flush()
+
+        messages = db.get_messages(self.session_id)
+        self.assertEqual(messages[:-1], self.messages)
+        self.assertEqual(messages[-1]["content"], "third question")
+        self.assertGreater(messages[-1]["id"], self.messages[-1]["id"])
+        self.assertEqual(db.get_summary(self.session_id)["summary"], "asked twice")
+
+
+class ArchiveRestoreWithoutCacheTest(ArchiveRestoreTest, unittest.TestCase):
+    CACHE_SESSIONS = 0
+
+
+class ArchiveRestoreWithCacheTest(ArchiveRestoreTest, unittest.TestCase):
+    CACHE_SESSIONS = 10
+
+
+if __name__ == "__main__":
+    unittest.main()
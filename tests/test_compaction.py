@@ -0,0 +1,106 @@
+"""Retrieved chunks are filtered by distance, merged with their neighbours, de-duplicated and trimmed."""
+
+import unittest
+from unittest import mock
+
+from ai import compaction, tools
+from ai.compaction import compact
+from ai.tokens import count_tokens
+
+
+def _chunk(doc: str, index: int, content: str, score=None) -> dict:
+    return {"chunk_id": f"{doc}_{index}", "content": content, "source": doc, "score": score}
+
+
+def _words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+class CompactTest(unittest.TestCase):
+    def setUp(self):
+        # Count whitespace-separated words as tokens, so budgets don't depend on the tokenizer
+        for target, fake in (
+            ("count_tokens", lambda text: len(text.split())),
+            ("truncate_tokens", lambda text, n: " ".join(text.split()[:n])),
+        ):
+            patcher = mock.patch.object(compaction, target, side_effect=fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_distance_cutoff_keeps_lexical_hits(self):
+        chunks = [
+            _chunk("near", 0, "close match", score=0.2),
+            _chunk("far", 0, "distant match", score=0.9),
+            _chunk("lexical", 0, "keyword match", score=None),
+        ]
+
+        kept = compact(chunks, k=5, max_distance=0.5, lambda_mult=1.0, token_budget=None)
+        self.assertEqual([block["source"] for block in kept], ["near", "lexical"])
+        no_cutoff = compact(chunks, k=5, max_distance=None, lambda_mult=1.0, token_budget=None)
+        self.assertEqual(len(no_cutoff), 3)
+
+    def test_neighbours_merge_without_repeating_the_overlap(self):
+        words = _words("word", 30).split()
+        # Chunks overlap by their last/first five words, as the splitter would produce
+        first, second, third = " ".join(words[:12]), " ".join(words[7:22]), " ".join(words[17:])
+        unrelated = _chunk("other", 4, "unrelated text", score=0.3)
+        chunks = [_chunk("doc", 2, third, 0.25), unrelated, _chunk("doc", 0, first, 0.4), _chunk("doc", 1, second, 0.1)]
+
+        blocks = compact(chunks, k=5, max_distance=None, lambda_mult=1.0, token_budget=None)
+
+        self.assertEqual([block["source"] for block in blocks], ["doc", "other"])
+        merged = blocks[0]
+        self.assertEqual(merged["content"], " ".join(words))
+        self.assertEqual(merged["chunk_ids"], ["doc_0", "doc_1", "doc_2"])
+        self.assertEqual((merged["chunk_id"], merged["score"]), ("doc_0", 0.1))
+        self.assertEqual(blocks[1]["chunk_ids"], ["other_4"])
+
+    def test_neighbours_without_overlap_are_joined_as_paragraphs(self):
+        chunks = [_chunk("doc", 0, _words("a", 10)), _chunk("doc", 1, _words("b", 10)), _chunk("doc", 3, "gap")]
+
+        blocks = compact(chunks, k=5, max_distance=None, lambda_mult=1.0, token_budget=None)
+
+        self.assertEqual([block["content"] for block in blocks], [_words("a", 10) + "\n\n" + _words("b", 10), "gap"])
+
+    def test_mmr_skips_near_duplicates(self):
+        chunks = [
+            _chunk("manual", 0, "reset the router by holding the power button for ten seconds"),
+            _chunk("faq", 5, "reset the router by holding the power button for ten seconds then wait"),
+            _chunk("notes", 9, "firmware updates are published every quarter on the support site"),
+        ]
+
+        picked = compact(chunks, k=2, max_distance=None, lambda_mult=0.5, token_budget=None)
+        self.assertEqual([block["source"] for block in picked], ["manual", "notes"])
+        # Relevance only: the rank order is kept
+        picked = compact(chunks, k=2, max_distance=None, lambda_mult=1.0, token_budget=None)
+        self.assertEqual([block["source"] for block in picked], ["manual", "faq"])
+
+    def test_token_budget_truncates_the_overflowing_block(self):
+        chunks = [_chunk(f"doc{i}", 0, _words(f"d{i}w", 100)) for i in range(3)]
+
+        blocks = compact(chunks, k=5, max_distance=None, lambda_mult=1.0, token_budget=260)
+        self.assertEqual([len(block["content"].split()) for block in blocks], [100, 100, 60])
+        self.assertEqual([block.get("truncated", False) for block in blocks], [False, False, True])
+
+        # Too little left for a useful piece of the third block
+        blocks = compact(chunks, k=5, max_distance=None, lambda_mult=1.0, token_budget=220)
+        self.assertEqual([len(block["content"].split()) for block in blocks], [100, 100])
+
+        # The best block is kept, truncated, even if it alone exceeds the budget
+        blocks = compact(chunks, k=5, max_distance=None, lambda_mult=1.0, token_budget=30)
+        self.assertEqual([(len(block["content"].split()), block["truncated"]) for block in blocks], [(30, True)])
+
+
+class RetrievalSizeLogTest(unittest.TestCase):
+    def test_before_size_is_the_uncompacted_top_k(self):
+        candidates = [_chunk(f"doc{i}", 0, _words(f"d{i}w", 20)) for i in range(tools.RETRIEVAL_CANDIDATES)]
+
+        with mock.patch.object(tools, "annotate") as annotate, mock.patch.object(tools, "compact", return_value=[]):
+            tools._compacted_output(candidates)
+
+        expected = count_tokens(tools._format_results(candidates[:tools.RETRIEVAL_K]))
+        self.assertEqual(annotate.call_args.kwargs["retrieval_tokens_before"], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Several workers can write to one embedding cache file, and its size is bounded across them."""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from ai.cache import EmbeddingCache
+
+
+class SharedEmbeddingCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "embedding_cache.sqlite3"
+
+    def test_concurrent_writers_do_not_fail(self):
+        # One cache object per simulated worker, each with its own connection
+        caches = [EmbeddingCache(self.path, max_entries=100_000) for _ in range(4)]
+        errors = []
+
+        def write(cache: EmbeddingCache, worker: int) -> None:
+            try:
+                for batch in range(20):
+                    texts = [f"worker {worker} batch {batch} chunk {i}" for i in range(50)]
+                    cache.put_many("model", texts, [[float(i)] * 8 for i in range(50)])
+                    cache.get_many("model", texts)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(cache, i)) for i, cache in enumerate(caches)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(caches[0].stats()["entries"], 4 * 20 * 50)
+
+    def test_entries_and_eviction_count_other_workers_writes(self):
+        first = EmbeddingCache(self.path, max_entries=10)
+        second = EmbeddingCache(self.path, max_entries=10)
+        first.put_many("model", [f"first {i}" for i in range(8)], [[1.0]] * 8)
+        second.put_many("model", [f"second {i}" for i in range(8)], [[2.0]] * 8)
+
+        self.assertLessEqual(second.stats()["entries"], 10)
+        self.assertEqual(first.stats()["entries"], second.stats()["entries"])
+        # The first worker's entries were the least recently used, so they were evicted
+        self.assertEqual(first.get_many("model", ["first 0"]), [None])
+        self.assertEqual(second.get_many("model", ["second 7"]), [[2.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Deleting a document waits for an in-flight ingest of it, and an ingest waiting on a delete still stores it."""
+
+import hashlib
+import threading
+import unittest
+from unittest import mock
+
+from ai import vector_store
+from benchmarks.fakes import HashingEmbeddings
+
+
+def _doc_hash(content: str) -> str:
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+class IngestDeleteClaimTest(unittest.TestCase):
+    def setUp(self):
+        vector_store._embeddings = HashingEmbeddings()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        write_chunks = vector_store._write_chunks
+
+        def blocking_write(ids, chunks, metadatas):
+            self.writing.set()
+            self.release.wait(10)
+            return write_chunks(ids, chunks, metadatas)
+
+        patcher = mock.patch.object(vector_store, "_write_chunks", side_effect=blocking_write)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _stored_chunk_ids(self, doc_hash: str) -> list:
+        return vector_store.get_collection().get(where={"doc_hash": doc_hash})["ids"]
+
+    def test_delete_waits_for_inflight_ingest(self):
+        content = "quokka census results for the northern islands"
+        doc_hash = _doc_hash(content)
+        ingest = threading.Thread(target=vector_store.add_documents, args=([(content, "quokka.txt")],))
+        ingest.start()
+        self.assertTrue(self.writing.wait(10))
+
+        deleted = []
+        delete = threading.Thread(target=lambda: deleted.append(vector_store.delete_document(doc_hash)))
+        delete.start()
+        delete.join(0.2)
+        self.assertTrue(delete.is_alive(), "delete must wait for the ingest's writes")
+
+        self.release.set()
+        ingest.join(10)
+        delete.join(10)
+
+        self.assertEqual(deleted, [True])
+        self.assertFalse(vector_store.document_exists(doc_hash))
+        self.assertEqual(self._stored_chunk_ids(doc_hash), [])
+
+    def test_ingest_waiting_on_delete_stores_the_document(self):
+        content = "wombat burrow survey for the southern ridge"
+        doc_hash = _doc_hash(content)
+        self.release.set()
+        vector_store.add_documents([(content, "wombat.txt")])
+
+        # Hold the delete inside its claim until the ingest is waiting on it
+        delete_ids = vector_store._delete_ids
+        deleting, finish_delete = threading.Event(), threading.Event()
+
+        def blocking_delete(ids):
+            deleting.set()
+            finish_delete.wait(10)
+            delete_ids(ids)
+
+        with mock.patch.object(vector_store, "_delete_ids", side_effect=blocking_delete):
+            delete = threading.Thread(target=vector_store.delete_document, args=(doc_hash,))
+            delete.start()
+            self.assertTrue(deleting.wait(10))
+
+            results = []
+            ingest = threading.Thread(
+                target=lambda: results.append(vector_store.add_documents([(content, "wombat.txt")]))
+            )
+            ingest.start()
+            ingest.join(0.2)
+            finish_delete.set()
+            delete.join(10)
+            ingest.join(10)
+
+        self.assertEqual(results[0]["unchanged"], 0)
+        self.assertTrue(vector_store.document_exists(doc_hash))
+        self.assertNotEqual(self._stored_chunk_ids(doc_hash), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Interrupted ingestion jobs are resumed only when their worker is gone, and failed jobs clean up."""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import unittest
+from unittest import mock
+
+from backend import db, jobs
+
+
+class ResumeJobsTest(unittest.TestCase):
+    def setUp(self):
+        db.init_db()
+        with db.get_connection() as conn:
+            conn.execute("DELETE FROM ingestion_jobs")
+            conn.commit()
+        executor = mock.patch.object(jobs, "_get_executor")
+        self.submit = executor.start().return_value.submit
+        self.addCleanup(executor.stop)
+
+    def _insert_running(self, job_id: str, owner, heartbeat_at) -> None:
+        with db.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO ingestion_jobs (id, state, payload_path, created_at, started_at, owner, heartbeat_at) "
+                "VALUES (?, 'running', 'unused.jsonl', ?, ?, ?, ?)",
+                (job_id, time.time(), time.time(), owner, heartbeat_at),
+            )
+            conn.commit()
+
+    def _state(self, job_id: str) -> str:
+        return jobs.get_job(job_id)["state"]
+
+    def test_jobs_of_live_workers_are_left_running(self):
+        other_worker = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        self.addCleanup(other_worker.wait)
+        self.addCleanup(other_worker.kill)
+        self._insert_running("live", f"{other_worker.pid}-aaaaaaaa", time.time())
+        self._insert_running("mine", jobs._worker_id(), time.time() - 3600)
+
+        self.assertEqual(jobs.resume_jobs(), 0)
+
+        self.assertEqual(self._state("live"), "running")
+        self.assertEqual(self._state("mine"), "running")
+        self.submit.assert_not_called()
+
+    def test_jobs_of_gone_workers_are_requeued(self):
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        self._insert_running("exited", f"{exited.pid}-bbbbbbbb", time.time())
+        # The process is alive but its heartbeat stopped
+        self._insert_running("stale", f"{os.getppid()}-cccccccc", time.time() - jobs.INGEST_JOB_STALE_SECONDS - 1)
+        self._insert_running("legacy", None, None)
+
+        with self.assertLogs(jobs.logger, "WARNING"):
+            self.assertEqual(jobs.resume_jobs(), 3)
+
+        for job_id in ("exited", "stale", "legacy"):
+            self.assertEqual(self._state(job_id), "queued")
+        self.assertEqual(sorted(call.args[1] for call in self.submit.call_args_list), ["exited", "legacy", "stale"])
+
+
+class FailedJobTest(unittest.TestCase):
+    def setUp(self):
+        db.init_db()
+
+    def test_failed_job_removes_payload_and_upload(self):
+        upload_path = jobs.new_upload_path()
+        upload_path.write_bytes(b"some text")
+        with mock.patch.object(jobs, "_get_executor"):
+            job_id = jobs.enqueue_upload(upload_path, "doc.txt", "0" * 32, 9)
+        payload_path = jobs.JOBS_DIR / f"{job_id}.jsonl"
+        self.assertEqual(json.loads(payload_path.read_text())["upload_path"], str(upload_path))
+
+        with mock.patch.object(jobs, "add_document_stream", side_effect=RuntimeError("embedding failed")), \
+                self.assertLogs(jobs.logger, "ERROR"):
+            jobs._run_job(job_id)
+
+        job = jobs.get_job(job_id)
+        self.assertEqual((job["state"], job["error"]), ("failed", "embedding failed"))
+        self.assertFalse(payload_path.exists())
+        self.assertFalse(upload_path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+"""The BM25 index of a worker sharing the store catches up with other workers' writes."""
+
+import hashlib
+import unittest
+from unittest import mock
+
+from ai import registry, vector_store
+from benchmarks.fakes import HashingEmbeddings
+
+
+class LexicalResyncTest(unittest.TestCase):
+    def setUp(self):
+        vector_store._embeddings = HashingEmbeddings()
+        vector_store._get_lexical_index()
+
+    def _add_in_other_worker(self, content: str, file_name: str) -> str:
+        # In shared mode a write only reaches the change log, not this worker's index
+        with mock.patch.object(vector_store, "_update_lexical_index"):
+            vector_store.add_documents([(content, file_name)])
+        return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+    def test_resync_after_change_log_was_pruned(self):
+        with mock.patch.object(vector_store, "is_shared_store", return_value=True), \
+                mock.patch.object(registry, "CHANGE_LOG_RETAIN", 2):
+            doc_hashes = [
+                self._add_in_other_worker(f"zebracorn{i} grazes in the meadow", f"pruned{i}.txt") for i in range(5)
+            ]
+            self.assertIsNone(vector_store._registry.changes_since(vector_store._lexical_version))
+
+            hits = vector_store.search("zebracorn4", k=3, mode="lexical")
+
+            self.assertEqual([hit["source"] for hit in hits], [doc_hashes[4]])
+            self.assertEqual(vector_store._lexical_version, vector_store._registry.get_version())
+
+    def test_resync_replays_logged_changes(self):
+        with mock.patch.object(vector_store, "is_shared_store", return_value=True):
+            doc_hash = self._add_in_other_worker("quokkasaurus naps under a tree", "logged.txt")
+
+            hits = vector_store.search("quokkasaurus", k=3, mode="lexical")
+
+            self.assertEqual([hit["source"] for hit in hits], [doc_hash])
+
+
+if __name__ == "__main__":
+    unittest.main()
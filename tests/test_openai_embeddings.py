@@ -0,0 +1,41 @@
+"""The OpenAI embeddings client sends raw text while tiktoken can't load its encoding."""
+
+import unittest
+from unittest import mock
+
+from langchain_openai import OpenAIEmbeddings
+
+from ai import tokens
+from ai.openai_embeddings import TiktokenTolerantOpenAIEmbeddings
+
+
+class TiktokenTolerantOpenAIEmbeddingsTest(unittest.TestCase):
+    def setUp(self):
+        tokens._encodings.clear()
+        tokens._retry_at.clear()
+        self.addCleanup(tokens._encodings.clear)
+        self.addCleanup(tokens._retry_at.clear)
+        self.embeddings = TiktokenTolerantOpenAIEmbeddings(
+            model="text-embedding-ada-002", openai_api_key="offline-test", embedding_ctx_length=3
+        )
+
+    def test_offline_texts_are_split_as_raw_text(self):
+        with mock.patch.object(tokens.tiktoken, "get_encoding", side_effect=ConnectionError("offline")), \
+                self.assertLogs(tokens.logger, "WARNING"):
+            batches, pieces, indices, counts = self.embeddings._tokenize(["alpha bravo charlie", "delta"], 2)
+
+        # Windows of three approximate tokens: "alph" "a" " brav" | "o" " char" "lie" | "delt" "a"
+        self.assertEqual(pieces, ["alpha brav", "o charlie", "delta"])
+        self.assertEqual(indices, [0, 0, 1])
+        self.assertEqual(counts, [3, 3, 2])
+        self.assertEqual(list(batches), [0, 2])
+
+    def test_uses_tiktoken_once_the_encoding_loads(self):
+        with mock.patch.object(OpenAIEmbeddings, "_tokenize", return_value="exact") as exact, \
+                mock.patch.object(tokens.tiktoken, "get_encoding", return_value=object()):
+            self.assertEqual(self.embeddings._tokenize(["text"], 2), "exact")
+        exact.assert_called_once_with(["text"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
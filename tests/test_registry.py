@@ -0,0 +1,98 @@
+"""Document states in the registry, startup repair of interrupted writes, and the change log."""
+
+import hashlib
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from ai import registry, vector_store
+from ai.registry import DocumentRegistry
+from benchmarks.fakes import HashingEmbeddings
+
+
+class DocumentRegistryTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.registry = DocumentRegistry(Path(tmp.name) / "registry.sqlite3")
+
+    def test_pending_ready_deleting(self):
+        self.registry.mark_pending([("a" * 32, "a.txt", 10)])
+        # A pending document is not visible yet and can't be deleted
+        self.assertIsNone(self.registry.get("a" * 32))
+        self.assertEqual((self.registry.count(), self.registry.list()), (0, []))
+        self.assertIsNone(self.registry.mark_deleting("a" * 32))
+        self.assertEqual(self.registry.unfinished(), ["a" * 32])
+
+        self.registry.mark_ready([("a" * 32, 3)], fingerprint="config-1")
+        record = self.registry.get("a" * 32)
+        self.assertEqual((record["file_name"], record["chunk_count"], record["size_bytes"]), ("a.txt", 3, 10))
+        self.assertTrue(self.registry.is_current("a" * 32, "config-1"))
+        self.assertFalse(self.registry.is_current("a" * 32, "config-2"))
+        self.assertEqual((self.registry.count(), self.registry.unfinished()), (1, []))
+
+        self.assertEqual(self.registry.mark_deleting("a" * 32), record)
+        self.assertFalse(self.registry.exists("a" * 32))
+        self.assertEqual(self.registry.unfinished(), ["a" * 32])
+        self.assertIsNone(self.registry.mark_deleting("a" * 32))
+
+        self.registry.remove("a" * 32)
+        self.assertEqual(self.registry.unfinished(), [])
+        self.assertTrue(self.registry.is_empty())
+
+    def test_changes_since(self):
+        self.assertEqual((self.registry.get_version(), self.registry.changes_since(0)), (0, []))
+        self.assertEqual(self.registry.record_changes(["a", "b"]), 2)
+        self.assertEqual(self.registry.record_changes([None]), 3)
+
+        self.assertEqual(self.registry.changes_since(0), [(1, "a"), (2, "b"), (3, None)])
+        self.assertEqual(self.registry.changes_since(2), [(3, None)])
+        self.assertEqual(self.registry.changes_since(3), [])
+
+    def test_changes_since_returns_none_once_pruned(self):
+        with mock.patch.object(registry, "CHANGE_LOG_RETAIN", 3):
+            self.assertEqual(self.registry.record_changes(["a", "b", "c", "d", "e"]), 5)
+
+        self.assertIsNone(self.registry.changes_since(0))
+        self.assertIsNone(self.registry.changes_since(1))
+        self.assertEqual(self.registry.changes_since(2), [(3, "c"), (4, "d"), (5, "e")])
+        self.assertEqual(self.registry.changes_since(5), [])
+
+
+class StartupRepairTest(unittest.TestCase):
+    def setUp(self):
+        vector_store._embeddings = HashingEmbeddings()
+        self.addCleanup(setattr, vector_store, "_registry_synced", True)
+
+    def _ingest(self, content: str, file_name: str) -> str:
+        vector_store.add_documents([(content, file_name)])
+        return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+    def _chunk_ids(self, doc_hash: str) -> list:
+        return vector_store.get_collection().get(where={"doc_hash": doc_hash})["ids"]
+
+    def test_unfinished_documents_are_removed_on_startup(self):
+        kept = self._ingest("platypus feeding schedule for the river enclosure", "platypus.txt")
+        interrupted = self._ingest("echidna spine count from the autumn survey", "echidna.txt")
+        deleting = self._ingest("bilby tracking notes from the western plains", "bilby.txt")
+        # Simulate a crash mid-ingest and mid-delete: rows left unfinished, chunks still stored
+        vector_store._registry.mark_pending([(interrupted, "echidna.txt", 42)])
+        vector_store._registry.mark_deleting(deleting)
+        version = vector_store.get_kb_version()
+
+        vector_store._registry_synced = False
+        vector_store._get_registry()
+
+        self.assertEqual(vector_store._registry.unfinished(), [])
+        self.assertTrue(vector_store.document_exists(kept))
+        self.assertNotEqual(self._chunk_ids(kept), [])
+        for doc_hash in (interrupted, deleting):
+            self.assertFalse(vector_store.document_exists(doc_hash))
+            self.assertEqual(self._chunk_ids(doc_hash), [])
+        changed = {doc_hash for _, doc_hash in vector_store.get_kb_changes_since(version)}
+        self.assertEqual(changed, {interrupted, deleting})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Messages added through the session cache keep their order and are readable before they are written."""
+
+import threading
+import unittest
+from unittest import mock
+
+from backend import db
+
+
+def _stored(session_id: int) -> list:
+    """Return the (id, role, content) rows of a session that are in SQLite."""
+    with db.get_connection() as conn:
+        rows = conn.execute(
+            "SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def _as_rows(messages: list) -> list:
+    return [(message["id"], message["role"], message["content"]) for message in messages]
+
+
+class SessionCacheTest(unittest.TestCase):
+    def setUp(self):
+        db.init_db()
+        # Long enough that only explicit flushes write
+        self.cache = db.SessionCache(max_sessions=10, flush_interval=60)
+        self.addCleanup(self.cache.close)
+        self.session_id = db.create_session()
+
+    def _block_writes(self):
+        """Make the next flush wait inside its write until the returned event is set."""
+        writing, release = threading.Event(), threading.Event()
+        write_messages = db._write_messages
+
+        def blocking_write(pending):
+            writing.set()
+            release.wait(10)
+            write_messages(pending)
+
+        patcher = mock.patch.object(db, "_write_messages", side_effect=blocking_write)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return writing, release
+
+    def test_ids_follow_append_order_across_flushes(self):
+        self.cache.append(self.session_id, [("user", "first"), ("assistant", "second")])
+        writing, release = self._block_writes()
+        flush = threading.Thread(target=self.cache.flush)
+        flush.start()
+        self.assertTrue(writing.wait(10))
+
+        # Added while the first batch is being written
+        self.cache.append(self.session_id, [("user", "third")])
+        release.set()
+        flush.join(10)
+        self.assertEqual([row[2] for row in _stored(self.session_id)], ["first", "second"])
+        self.assertEqual(self.cache.flush(), 1)
+
+        messages = self.cache.get_messages(self.session_id)
+        self.assertEqual([message["content"] for message in messages], ["first", "second", "third"])
+        self.assertEqual(_stored(self.session_id), _as_rows(messages))
+        ids = [message["id"] for message in messages]
+        self.assertEqual(ids, sorted(ids))
+
+        # Inserts that don't go through the cache continue after the reserved IDs
+        with db.get_connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO messages (session_id, role, content) VALUES (?, 'user', 'elsewhere')", (self.session_id,)
+            )
+            conn.commit()
+        self.cache.append(self.session_id, [("assistant", "fourth")])
+        self.assertGreater(cursor.lastrowid, self.cache.get_messages(self.session_id)[-1]["id"])
+
+    def test_reads_see_messages_before_they_are_written(self):
+        # One session already cached, one loaded only after its messages were queued
+        self.assertEqual(self.cache.get_messages(self.session_id), [])
+        other_id = db.create_session()
+        self.cache.append(self.session_id, [("user", "hello"), ("assistant", "hi")])
+        self.cache.append(other_id, [("user", "queued")])
+
+        self.assertEqual(_stored(self.session_id), [])
+        cached = self.cache.get_messages(self.session_id)
+        self.assertEqual([message["content"] for message in cached], ["hello", "hi"])
+        self.assertEqual(self.cache.get_messages_after(self.session_id, cached[0]["id"]), cached[1:])
+        self.assertEqual(self.cache.get_messages(self.session_id, limit=1), cached[1:])
+        self.assertEqual([message["content"] for message in self.cache.get_messages(other_id)], ["queued"])
+
+    def test_discard_waits_for_a_running_flush(self):
+        other_id = db.create_session()
+        self.cache.append(self.session_id, [("user", "being written")])
+        writing, release = self._block_writes()
+        flush = threading.Thread(target=self.cache.flush)
+        flush.start()
+        self.assertTrue(writing.wait(10))
+
+        self.cache.append(self.session_id, [("user", "still pending")])
+        self.cache.append(other_id, [("user", "other session")])
+        discarded = []
+        discard = threading.Thread(target=lambda: discarded.append(self.cache.discard(self.session_id)))
+        discard.start()
+        discard.join(0.2)
+        self.assertTrue(discard.is_alive(), "discard must wait for the batch being written")
+
+        release.set()
+        flush.join(10)
+        discard.join(10)
+
+        self.assertEqual(discarded, [True])
+        # The written batch stays (the caller deletes it from SQLite); only the other session is left pending
+        self.assertEqual([row[2] for row in _stored(self.session_id)], ["being written"])
+        self.assertEqual(self.cache.stats()["pending_messages"], 1)
+        self.assertEqual(self.cache.flush(), 1)
+        self.assertEqual([row[2] for row in _stored(self.session_id)], ["being written"])
+        self.assertEqual([row[2] for row in _stored(other_id)], ["other session"])
+
+
+class CloseSessionCacheTest(unittest.TestCase):
+    def setUp(self):
+        db.init_db()
+        patcher = mock.patch.object(db, "CHAT_CACHE_SESSIONS", 10)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(db.close_session_cache)
+        db.close_session_cache()
+
+    def test_close_writes_pending_messages_and_later_writes_still_land(self):
+        session_id = db.create_session()
+        db.add_messages(session_id, [("user", "before close"), ("assistant", "reply")])
+        cache = db._get_session_cache()
+
+        db.close_session_cache()
+        db.close_session_cache()  # safe to call again
+        self.assertEqual([row[2] for row in _stored(session_id)], ["before close", "reply"])
+
+        # A closed cache writes right away
+        cache.append(session_id, [("user", "after close")])
+        self.assertEqual(_stored(session_id)[-1][2], "after close")
+        self.assertEqual(cache.stats()["pending_messages"], 0)
+
+        # The next access starts a new cache, whose IDs continue after the earlier ones
+        db.add_messages(session_id, [("assistant", "new cache")])
+        self.assertIsNot(db._get_session_cache(), cache)
+        messages = db.get_messages(session_id)
+        self.assertEqual(
+            [message["content"] for message in messages], ["before close", "reply", "after close", "new cache"]
+        )
+        ids = [message["id"] for message in messages]
+        self.assertEqual(ids, sorted(ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Splitting a streamed document loses no text and keeps chunks within the chunk size across seams."""
+
+import random
+import unittest
+from unittest import mock
+
+from ai import vector_store
+
+
+def _document(seed: int = 7) -> str:
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(1, 12))) for _ in range(500)]
+    paragraphs = []
+    for _ in range(120):
+        sentences = [" ".join(rng.choices(words, k=rng.randint(3, 40))) + "." for _ in range(rng.randint(1, 8))]
+        paragraphs.append(" ".join(sentences))
+    # A run without any separator, which the splitter has to cut mid-word
+    paragraphs.insert(60, "".join(rng.choices("xyz", k=2500)))
+    return "\n\n".join(paragraphs)
+
+
+def _pieces(text: str, seed: int = 11):
+    rng = random.Random(seed)
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 900)
+        yield text[position:position + size]
+        position += size
+
+
+class SplitStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.text = _document()
+        self.splitter = vector_store.get_text_splitter()
+        self.expected = self.splitter.split_text(self.text)
+
+    def _split_stream(self, buffer_chars: int) -> list:
+        with mock.patch.object(vector_store, "STREAM_SPLIT_BUFFER_CHARS", buffer_chars):
+            return list(vector_store.split_stream(_pieces(self.text)))
+
+    def _assert_covers_text(self, chunks: list) -> None:
+        """Chunks appear in order and only whitespace falls between them."""
+        covered_until = start = 0
+        for chunk in chunks:
+            start = self.text.find(chunk, start)
+            self.assertGreaterEqual(start, 0, "chunk is not a piece of the text")
+            self.assertEqual(self.text[covered_until:start].strip(), "", f"text lost before offset {start}")
+            covered_until = max(covered_until, start + len(chunk))
+            start += 1
+        self.assertEqual(self.text[covered_until:].strip(), "")
+
+    def test_without_seams_matches_split_text(self):
+        self.assertEqual(self._split_stream(len(self.text) + 1), self.expected)
+
+    def test_seams_lose_no_text_and_respect_chunk_size(self):
+        for buffer_chars in (2500, 3001, 7919):
+            with self.subTest(buffer_chars=buffer_chars):
+                chunks = self._split_stream(buffer_chars)
+
+                self.assertLessEqual(max(map(len, chunks)), self.splitter._chunk_size)
+                self._assert_covers_text(chunks)
+                # Boundaries only move near the seams, so most chunks are unchanged
+                unchanged = len(set(chunks) & set(self.expected))
+                seams = len(self.text) // buffer_chars + 1
+                self.assertGreaterEqual(unchanged, len(self.expected) - 3 * seams)
+                self.assertLessEqual(abs(len(chunks) - len(self.expected)), seams)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Token counting keeps working, and recovers, when the tiktoken encoding can't be downloaded."""
+
+import unittest
+from unittest import mock
+
+from ai import tokens
+
+
+class FakeEncoding:
+    """One token per character."""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+class OfflineTokensTest(unittest.TestCase):
+    def setUp(self):
+        self._reset()
+        self.addCleanup(self._reset)
+        patcher = mock.patch.object(tokens.tiktoken, "get_encoding", side_effect=ConnectionError("offline"))
+        self.get_encoding = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _reset():
+        tokens._encodings.clear()
+        tokens._retry_at.clear()
+
+    def test_counts_are_approximated(self):
+        with self.assertLogs(tokens.logger, "WARNING"):
+            self.assertEqual(tokens.count_tokens("deployment guide"), 5)
+        self.assertEqual(tokens.count_tokens(""), 0)
+
+    def test_truncate_returns_a_prefix(self):
+        text = "Summarize the error handling guidelines."
+        with self.assertLogs(tokens.logger, "WARNING"):
+            truncated = tokens.truncate_tokens(text, 3)
+        self.assertEqual(truncated, "Summarize")
+        self.assertEqual(tokens.truncate_tokens(text, 100), text)
+        self.assertEqual(tokens.truncate_tokens(text, 0), "")
+
+    def test_failed_load_is_retried_after_the_interval(self):
+        with mock.patch.object(tokens.time, "monotonic", return_value=1000.0):
+            with self.assertLogs(tokens.logger, "WARNING"):
+                tokens.count_tokens("first")
+            tokens.count_tokens("within the retry interval")
+        self.assertEqual(self.get_encoding.call_count, 1)
+
+        self.get_encoding.side_effect = None
+        self.get_encoding.return_value = FakeEncoding()
+        with mock.patch.object(tokens.time, "monotonic", return_value=1000.0 + tokens.TIKTOKEN_RETRY_SECONDS):
+            self.assertEqual(tokens.count_tokens("exact"), 5)
+        self.assertEqual(self.get_encoding.call_count, 2)
+        # Once loaded, the encoding is kept
+        self.assertEqual(tokens.count_tokens("again"), 5)
+        self.assertEqual(self.get_encoding.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()